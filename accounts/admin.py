@@ -6,3 +6,4 @@ class ProfileAdmin(admin.ModelAdmin):
     list_display = ('user', 'location', 'created_at')
     search_fields = ('user__username', 'location', )
     list_filter = ('created_at', 'updated_at')
+    readonly_fields = ('avatar_width', 'avatar_height', 'avatar_size')
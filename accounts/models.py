@@ -1,11 +1,20 @@
 from django.db import models
 from django.contrib.auth.models import User
+from core.images import image_metadata
 
 # Create your models here.
 class Profile(models.Model):
+    # Recorded from a new upload on save so nothing asks storage for them
+    AVATAR_METADATA_FIELDS = ('avatar_width', 'avatar_height', 'avatar_size')
+
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     bio = models.TextField(blank=True)
     avatar = models.ImageField(upload_to='avatars/', blank=True, null=True)
+    # Resized copies of avatar for srcset (see core.images)
+    avatar_variants = models.JSONField(default=dict, blank=True, editable=False)
+    avatar_width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    avatar_height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    avatar_size = models.PositiveBigIntegerField(null=True, blank=True, editable=False)
     location = models.CharField(max_length=100, blank=True)
     email_verified = models.BooleanField(default=False)
     website = models.URLField(blank=True)
@@ -13,6 +22,18 @@ class Profile(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
 
+    def save(self, *args, **kwargs):
+        # Record a new avatar's size while the upload is still local
+        update_fields = kwargs.get('update_fields')
+        avatar_loaded = 'avatar' not in self.get_deferred_fields()
+        if avatar_loaded and (update_fields is None or 'avatar' in update_fields):
+            metadata = image_metadata(self.avatar)
+            if metadata is not None:
+                self.avatar_width, self.avatar_height, self.avatar_size = metadata
+                if update_fields is not None:
+                    kwargs['update_fields'] = {*update_fields, *self.AVATAR_METADATA_FIELDS}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.user.username}'s Profile"
     
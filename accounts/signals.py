@@ -1,6 +1,7 @@
 from django.db.models.signals import post_save
 from django.contrib.auth.models import User
 from django.dispatch import receiver
+from core.images import AVATAR_WIDTHS, refresh_variants
 from . models import Profile
 
 
@@ -16,4 +17,11 @@ def save_user_profile(sender, instance, **kwargs):
     """Save Profile when User is saved"""
     # Only save if profile exists (prevents crash on new users)
     if hasattr(instance, 'profile'):
-        instance.profile.save()
\ No newline at end of file
+        instance.profile.save()
+
+@receiver(post_save, sender=Profile)
+def refresh_avatar_variants(sender, instance, update_fields=None, **kwargs):
+    """Build square resized copies of a newly uploaded or replaced avatar"""
+    if update_fields is not None and 'avatar' not in update_fields:
+        return
+    refresh_variants(instance, 'avatar', 'avatar_variants', AVATAR_WIDTHS, square=True)
@@ -1,3 +1,58 @@
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
-# Create your tests here.
+from blog.models import Post
+
+
+class UserPostsQueryCountTests(TestCase):
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        self.author = User.objects.create_user('author', password='pw')
+        self.url = reverse('accounts:user_posts', args=[self.author.username])
+
+    def create_posts(self, count):
+        for number in range(count):
+            Post.objects.create(title=f'Post {number}', author=self.author, content='<p>Body</p>', status='published')
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_posts(self):
+        self.create_posts(2)
+        few = self.count_queries()
+        self.create_posts(25)
+        many = self.count_queries()
+        self.assertEqual(many, few)
+        # The user, then the page's COUNT and rows
+        self.assertLessEqual(many, 3)
+
+
+class UserPostsConditionalGetTests(TestCase):
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        self.author = User.objects.create_user('author', password='pw')
+        self.reader = User.objects.create_user('reader', password='pw')
+        self.post = Post.objects.create(title='Post', author=self.author, content='<p>Body</p>', status='published')
+        self.url = reverse('accounts:user_posts', args=[self.author.username])
+
+    def test_unchanged_page_is_not_modified(self):
+        response = self.client.get(self.url)
+        revalidated = self.client.get(self.url, headers={'if-none-match': response['ETag']})
+        self.assertEqual(revalidated.status_code, 304)
+
+        self.post.toggle_like(self.reader)
+        revalidated = self.client.get(self.url, headers={'if-none-match': response['ETag']})
+        self.assertEqual(revalidated.status_code, 200)
+
+        Post.objects.create(title='Another', author=self.author, content='<p>Body</p>', status='published')
+        response = self.client.get(self.url, headers={'if-none-match': revalidated['ETag']})
+        self.assertEqual(response.status_code, 200)
@@ -5,8 +5,11 @@ from django.contrib.auth.models import User
 from django.contrib import messages
 from django.utils.http import urlsafe_base64_decode  # ← NEW
 from django.utils.encoding import force_str  # ← NEW
-from django.core.paginator import Paginator
 from blog.models import Post
+from blog.conditional import conditional_page, user_posts_validators
+from blog.pagination import LISTING_ORDERING, listing_page
+from core.upload_handlers import limit_image_uploads, reject_skipped_uploads
+from core.uploads import queue_upload, take_upload
 from . forms import SignUpForm, LoginForm, ProfileUpdateForm, UserUpdateForm
 from . models import Profile
 from . tokens import account_activation_token  # ← NEW
@@ -129,8 +132,8 @@ def profile_view(request, username):
     user = get_object_or_404(User, username=username)
     profile = user.profile
     # Show only 6 recent posts on profile page
-    posts = user.post_set.filter(status='published').select_related('author', 'category').prefetch_related('tags').order_by('-created_at')[:6]
-    total_posts_count = user.post_set.filter(status='published').count()
+    posts = user.post_set.published().cards().order_by('-created_at')[:6]
+    total_posts_count = user.post_set.published().count()
     
     context = {
         'profile_user': user,
@@ -141,18 +144,16 @@ def profile_view(request, username):
     return render(request, 'accounts/profile.html', context)
 
 
+@conditional_page(user_posts_validators)
 def user_posts_view(request, username):
     """Display all posts by a specific user with pagination"""
     user = get_object_or_404(User, username=username)
-    posts = Post.objects.filter(
-        author=user,
-        status='published'
-    ).select_related('author', 'category').prefetch_related('tags').order_by('-created_at')
+    posts = Post.objects.published().filter(
+        author=user
+    ).cards().order_by(*LISTING_ORDERING)
     
-    # Pagination
-    paginator = Paginator(posts, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Keyset pagination; the page is usually built by the view's validators
+    page_obj = listing_page(request, posts, LISTING_ORDERING)
     
     context = {
         'profile_user': user,
@@ -163,6 +164,7 @@ def user_posts_view(request, username):
 
 
 @login_required
+@limit_image_uploads
 def profile_edit_view(request):
     """Edit logged-in user's profile"""
     if request.method == 'POST':
@@ -172,11 +174,18 @@ def profile_edit_view(request):
             request.FILES,  # For avatar upload
             instance=request.user.profile
         )
+        reject_skipped_uploads(request, profile_form)
         
         if user_form.is_valid() and profile_form.is_valid():
+            # A new avatar is stored by the job worker, not in this request.
+            # Staged first: saving the user also saves its profile
+            profile = profile_form.save(commit=False)
+            upload = take_upload(profile, 'avatar')
             user_form.save()
-            profile_form.save()
-            messages.success(request, 'Your profile has been updated!')
+            profile.save()
+            if upload:
+                queue_upload(profile, 'avatar', upload)
+            messages.success(request, 'Your profile has been updated!' + (' Your new avatar will appear shortly.' if upload else ''))
             return redirect('accounts:profile', username=request.user.username)
     else:
         user_form = UserUpdateForm(instance=request.user)
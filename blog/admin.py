@@ -15,13 +15,14 @@ class TagAdmin(admin.ModelAdmin):
 
 @admin.register(Post)
 class PostAdmin(admin.ModelAdmin):
-    list_display = ('title', 'author', 'category', 'status', 'is_featured', 'like_count', 'created_at')
+    list_display = ('title', 'author', 'category', 'status', 'is_featured', 'like_count', 'comment_count', 'created_at')
     prepopulated_fields = {'slug': ('title',)}
     search_fields = ('title', 'author__username', 'content')
     list_filter = ('status', 'is_featured', 'category', 'tags', 'created_at', 'updated_at')
     date_hierarchy = 'created_at'
     list_editable = ('is_featured', 'status')
     filter_horizontal = ('tags',)
+    readonly_fields = ('image_width', 'image_height', 'image_size')
 
 @admin.register(Like)
 class LikeAdmin(admin.ModelAdmin):
@@ -0,0 +1,94 @@
+"""
+Comment threads for the post detail page
+
+post_detail renders the first page of top-level comments, and further pages
+and each comment's replies are fetched on demand from the comment_list JSON
+endpoint. A page of top-level comments is one keyset query with authors
+joined and the number of direct replies annotated. A comment's replies are
+its whole thread, to any depth: load_comment_thread() fetches every
+descendant with its author in one query and build_comment_tree() links them
+in memory. Neither costs more queries as a thread grows.
+"""
+from django.db.models import Count
+from django.db.models.expressions import RawSQL
+
+from . models import Comment
+from . pagination import CursorPaginator
+
+COMMENTS_PER_PAGE = 20
+
+# Top-level comments newest first, replies in conversation order
+COMMENT_ORDERING = ('-created_at', '-id')
+REPLY_ORDERING = ('created_at', 'id')
+
+
+def comment_page(post, cursor=None):
+    """A CursorPage of the post's top-level comments"""
+    comments = Comment.objects.filter(post=post, parent__isnull=True).select_related('author').annotate(
+        reply_count=Count('replies')
+    )
+    paginator = CursorPaginator(comments.order_by(*COMMENT_ORDERING), COMMENTS_PER_PAGE, COMMENT_ORDERING)
+    return paginator.get_page(cursor)
+
+
+def _walk(comment):
+    for child in comment.children:
+        yield child
+        yield from _walk(child)
+
+
+def build_comment_tree(comments):
+    """
+    Link an iterable of comments into a tree.
+
+    Every comment gets `children` (direct replies, oldest first) and every
+    root gets `thread` (all of its descendants, depth-first). Returns the
+    roots, newest first.
+    """
+    comments = list(comments)
+    by_id = {comment.id: comment for comment in comments}
+    roots = []
+    for comment in comments:
+        comment.children = []
+    for comment in comments:
+        parent = by_id.get(comment.parent_id)
+        if parent is None:
+            roots.append(comment)
+        else:
+            parent.children.append(comment)
+    for root in roots:
+        root.thread = list(_walk(root))
+    roots.reverse()
+    return roots
+
+
+def _descendant_ids(comment):
+    table = Comment._meta.db_table
+    return RawSQL(
+        f'WITH RECURSIVE thread(id) AS ('
+        f'SELECT id FROM {table} WHERE parent_id = %s '
+        f'UNION ALL SELECT c.id FROM {table} c JOIN thread t ON c.parent_id = t.id'
+        f') SELECT id FROM thread',
+        [comment.id],
+    )
+
+
+def load_comment_thread(comment):
+    """Every reply under comment at any depth, depth-first in conversation order, in one query"""
+    descendants = Comment.objects.filter(id__in=_descendant_ids(comment)).select_related('author')
+    # Every descendant links up to comment, so it is the tree's only root
+    build_comment_tree([comment, *descendants.order_by(*REPLY_ORDERING)])
+    return comment.thread
+
+
+def comment_payload(comment):
+    """JSON shape of a comment, shared with the comment_create AJAX response"""
+    return {
+        'comment_id': comment.id,
+        'author': comment.author.username,
+        'content': comment.content,
+        'created_at': comment.created_at.strftime('%B %d, %Y'),
+        'is_reply': comment.parent_id is not None,
+        'parent_id': comment.parent_id,
+        'reply_count': getattr(comment, 'reply_count', 0),
+    }
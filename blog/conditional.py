@@ -0,0 +1,173 @@
+"""
+Conditional GET for post and listing pages
+
+Views wrapped in conditional_page get an ETag header, and a request whose
+If-None-Match still matches is answered with 304 Not Modified before the view
+runs, so nothing is rendered. The ETag comes from lean queries covering
+everything the page shows:
+
+- post_detail: the post's updated_at, like and comment counts, its latest
+  comment and like timestamps, its author and category names (one query), its
+  tags (one query), then the id, updated_at, counts, author and category of
+  the published posts in its related index with their kind and score (one
+  query).
+- listings: the id, updated_at, counts, author and category of every post on
+  the requested page, whether a next page exists and the total shown in the
+  pager, plus the category or tag row for those pages. The page is built by
+  listing_page() with the view's own queryset, and the category or tag by
+  listing_subject(), so the view reuses them instead of querying again.
+
+Every ETag is mixed with the viewer shown in the navbar and with
+build_version(), so a deploy never leaves browsers on HTML linking old
+bundles. There is no Last-Modified: deleting a like or comment changes a
+count but no timestamp, so a date could not tell clients the page changed.
+Requests with flash messages waiting to be shown always get a full response.
+"""
+import functools
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+from django.views.decorators.http import condition
+
+from . models import Category, Comment, Like, Post, Tag
+from . pagination import LISTING_ORDERING, MOST_LIKED_ORDERING, listing_page
+
+
+@functools.cache
+def build_version():
+    """RELEASE_VERSION and the static manifest's hashed names, fixed for the process's lifetime"""
+    hashed_files = getattr(staticfiles_storage, 'hashed_files', {})
+    parts = [settings.RELEASE_VERSION, *(f'{name}={hashed}' for name, hashed in sorted(hashed_files.items()))]
+    return hashlib.md5(':'.join(parts).encode()).hexdigest()
+
+
+def _etag(request, *parts):
+    user = request.user
+    viewer = (user.pk, user.username, user.first_name, user.last_name) if user.is_authenticated else 'anon'
+    return hashlib.md5(':'.join(str(part) for part in (build_version(), viewer, *parts)).encode()).hexdigest()
+
+
+def _card(post):
+    """The parts of a listing card that can change without touching the post's updated_at"""
+    category = post.category
+    return (
+        post.id, post.updated_at.isoformat(), post.like_count, post.comment_count, post.author.username,
+        category and (category.name, category.slug),
+    )
+
+
+def conditional_page(validators):
+    """
+    condition() fed by validators(request, *args, **kwargs), which returns
+    the ETag or None to skip conditional handling.
+    """
+    def compute(request, *args, **kwargs):
+        if not hasattr(request, '_page_etag'):
+            if len(get_messages(request)):
+                request._page_etag = None
+            else:
+                request._page_etag = validators(request, *args, **kwargs)
+        return request._page_etag
+
+    return condition(etag_func=compute)
+
+
+def post_validators(request, slug):
+    """ETag for post_detail"""
+    latest_comment = Comment.objects.filter(post=OuterRef('pk')).order_by('-updated_at').values('updated_at')[:1]
+    latest_like = Like.objects.filter(post=OuterRef('pk')).order_by('-created_at').values('created_at')[:1]
+    post = Post.objects.filter(slug=slug).annotate(
+        latest_comment=Subquery(latest_comment),
+        latest_like=Subquery(latest_like),
+    ).values(
+        'id', 'status', 'author_id', 'updated_at', 'like_count', 'comment_count',
+        'latest_comment', 'latest_like', 'author__username', 'category__name', 'category__slug',
+    ).first()
+
+    # Missing posts and drafts hidden from this viewer are left to the view
+    if post is None or (post['status'] != 'published' and post['author_id'] != request.user.pk):
+        return None
+
+    tags = list(Tag.objects.filter(posts__id=post['id']).order_by('name').values_list('id', 'name', 'slug'))
+
+    # Cards of related posts show their own counts and can be re-ranked
+    related = list(Post.objects.published().filter(related_to__post_id=post['id']).order_by(
+        'related_to__kind', '-related_to__score', '-id',
+    ).values_list(
+        'id', 'updated_at', 'like_count', 'comment_count', 'author__username', 'category__name',
+        'category__slug', 'related_to__kind', 'related_to__score',
+    ))
+
+    return _etag(
+        request, post['id'], post['updated_at'].isoformat(), post['like_count'], post['comment_count'],
+        post['latest_comment'] and post['latest_comment'].isoformat(),
+        post['latest_like'] and post['latest_like'].isoformat(),
+        post['author__username'], post['category__name'], post['category__slug'], tags,
+        [(related_id, updated_at.isoformat(), *rest) for related_id, updated_at, *rest in related],
+    )
+
+
+def listing_validators(request, posts, ordering, *parts, per_page=12):
+    """
+    ETag for one page of a listing of posts, whose page is shared with the
+    view; parts are whatever else the page shows, like its category
+    """
+    page = listing_page(request, posts.cards().order_by(*ordering), ordering, per_page)
+    rows = [_card(post) for post in page]
+    return _etag(request, request.GET.get('cursor', ''), page.paginator.count, page.has_next(), rows, *parts)
+
+
+# Per-listing validators; each filters exactly like its view
+
+def listing_subject(request, model, slug):
+    """
+    The Category or Tag a listing page is about, or None; like listing_page()
+    it is fetched once and shared by the validators and the view
+    """
+    if not hasattr(request, '_listing_subject'):
+        request._listing_subject = model.objects.filter(slug=slug).first()
+    return request._listing_subject
+
+
+def category_validators(request, slug):
+    category = listing_subject(request, Category, slug)
+    if category is None:
+        return None
+    posts = Post.objects.published().filter(category=category)
+    return listing_validators(
+        request, posts, LISTING_ORDERING, category.id, category.name, category.slug, category.description,
+    )
+
+
+def tag_validators(request, slug):
+    tag = listing_subject(request, Tag, slug)
+    if tag is None:
+        return None
+    posts = Post.objects.published().filter(tags=tag)
+    return listing_validators(request, posts, LISTING_ORDERING, tag.id, tag.name, tag.slug)
+
+
+def latest_validators(request):
+    posts = Post.objects.published().exclude(is_featured=True)
+    return listing_validators(request, posts, LISTING_ORDERING)
+
+
+def recent_validators(request):
+    seven_days_ago = timezone.now() - timedelta(days=7)
+    posts = Post.objects.published().filter(created_at__gte=seven_days_ago).exclude(is_featured=True)
+    return listing_validators(request, posts, LISTING_ORDERING)
+
+
+def most_liked_validators(request):
+    posts = Post.objects.published().exclude(is_featured=True)
+    return listing_validators(request, posts, MOST_LIKED_ORDERING)
+
+
+def user_posts_validators(request, username):
+    posts = Post.objects.published().filter(author__username=username)
+    return listing_validators(request, posts, LISTING_ORDERING)
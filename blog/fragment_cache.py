@@ -0,0 +1,81 @@
+"""
+Fragment cache for post cards
+
+Rendered card HTML is cached under a key built from the card variant, the
+post's id and updated_at, its like and comment counts, the source of its
+image variants, the author and category names it shows and any extra values
+the template varies on. Editing a post bumps updated_at, likes and comments
+change the counts and renaming the author or category changes the names, so
+a stale card is never looked up again and simply ages out; nothing has to be
+deleted. Cards are rendered from QuerySet.cards(), which joins the author and
+category, so reading their names costs no query.
+
+Hits and misses are counted per process and reported by the cache_stats view.
+"""
+import hashlib
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class FragmentStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def snapshot(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / total, 4) if total else None,
+        }
+
+
+card_stats = FragmentStats()
+
+
+def card_cache():
+    return caches[getattr(settings, 'CARD_CACHE_ALIAS', 'default')]
+
+
+def card_cache_key(variant, post, vary_on=()):
+    parts = [
+        variant,
+        post.pk,
+        post.updated_at.isoformat() if post.updated_at else '',
+        post.like_count,
+        post.comment_count,
+        # Variants can be (re)built without touching updated_at
+        post.image_variants.get('source', '') if post.image_variants else '',
+        post.author.username,
+        post.category_id or '',
+        post.category.name if post.category_id else '',
+        post.category.slug if post.category_id else '',
+        *vary_on,
+    ]
+    digest = hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest()
+    return f'card:{digest}'
+
+
+def render_card(variant, post, vary_on, render):
+    """Cached card HTML, calling render() to build it on a miss"""
+    cache = card_cache()
+    key = card_cache_key(variant, post, vary_on)
+    html = cache.get(key)
+    card_stats.record(hit=html is not None)
+    if html is None:
+        html = render()
+        cache.set(key, html, getattr(settings, 'CARD_CACHE_SECONDS', 86400))
+    return html
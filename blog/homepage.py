@@ -0,0 +1,71 @@
+"""
+Homepage section builder
+
+Builds every section and counter shown on the homepage with a fixed number of
+queries (three, plus the site counters when their cache is cold), no matter
+how many posts exist.
+"""
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import Post
+from .site_stats import RECENT_DAYS, site_stats
+
+FEATURED_LIMIT = 5
+SECTION_LIMIT = 6
+
+
+def build_homepage_context():
+    """Return the template context for blog/post_list.html"""
+    published = Post.objects.published().cards()
+    seven_days_ago = timezone.now() - timedelta(days=RECENT_DAYS)
+
+    # Featured posts (admin selected)
+    featured_posts = list(
+        published.filter(is_featured=True).order_by('-created_at')[:FEATURED_LIMIT]
+    )
+    has_explicit_featured = bool(featured_posts)
+
+    # Most liked posts. The same ordering backs the featured fallback, so a
+    # single query serves both sections.
+    top_liked = list(
+        published.order_by('-like_count', '-created_at')[:SECTION_LIMIT]
+    )
+    most_liked_posts = [post for post in top_liked if post.like_count > 0]
+
+    if has_explicit_featured:
+        featured_ids = [post.id for post in featured_posts]
+    else:
+        # Auto-selected featured posts are not excluded from other sections
+        featured_posts = top_liked[:FEATURED_LIMIT]
+        featured_ids = []
+
+    # Latest posts. Recent posts are the subset of the same ordering created in
+    # the last 7 days, and they always sort first, so they are a prefix of it.
+    latest_posts = list(
+        published.exclude(id__in=featured_ids).order_by('-created_at')[:SECTION_LIMIT]
+    )
+    recent_posts = [post for post in latest_posts if post.created_at >= seven_days_ago]
+
+    # Site-wide counters come from one cached row
+    stats = site_stats.get()
+
+    recent_featured = sum(
+        1 for post in featured_posts
+        if post.id in featured_ids and post.created_at >= seven_days_ago
+    )
+
+    return {
+        'featured_posts': featured_posts,
+        'has_explicit_featured': has_explicit_featured,
+        'latest_posts': latest_posts,
+        'latest_posts_count': stats['total_posts'] - len(featured_ids),
+        'recent_posts': recent_posts,
+        'recent_posts_count': stats['recent_posts'] - recent_featured,
+        'most_liked_posts': most_liked_posts,
+        'most_liked_posts_count': stats['liked_posts'],
+        'total_posts': stats['total_posts'],
+        'total_authors': stats['total_authors'],
+        'total_likes': stats['total_likes'],
+    }
@@ -0,0 +1,135 @@
+"""
+Write-behind buffer for Post.like_count
+
+With LIKE_BUFFER_ENABLED, like toggles still insert or delete their Like row
+immediately, but the posts they touch are collected in process memory and
+their like_count is written in one UPDATE every LIKE_BUFFER_FLUSH_MS
+milliseconds or LIKE_BUFFER_MAX_EVENTS toggles, whichever comes first. A viral
+post then takes one row lock per batch instead of one per click.
+
+A flush sets each touched post's like_count to its number of Like rows rather
+than adding the buffered deltas, so a flush from any process, in any order,
+leaves exact counts. Posts whose flush never happened (for example a killed
+worker) are repaired by the reconcile_like_counts management command, which
+is safe to run while web processes still hold buffers for the same reason.
+The deltas are kept only to show the liker an up-to-date count.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+logger = logging.getLogger(__name__)
+
+
+def counted_likes():
+    """like_count recounted from the Like table, for Post UPDATEs"""
+    from . models import Like
+
+    totals = Like.objects.filter(post=OuterRef('pk')).order_by().values('post').annotate(total=Count('pk'))
+    return Coalesce(Subquery(totals.values('total')), 0)
+
+
+class LikeBuffer:
+    """Per-process accumulator of pending like_count deltas keyed by post id"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = defaultdict(int)
+        self._events = 0
+        self._last_flush = time.monotonic()
+        self._timer = None
+
+    @property
+    def enabled(self):
+        return getattr(settings, 'LIKE_BUFFER_ENABLED', False)
+
+    @property
+    def flush_interval(self):
+        return getattr(settings, 'LIKE_BUFFER_FLUSH_MS', 500) / 1000
+
+    @property
+    def max_events(self):
+        return getattr(settings, 'LIKE_BUFFER_MAX_EVENTS', 100)
+
+    def add(self, post_id, delta):
+        """Record a like (+1) or unlike (-1) and flush if a threshold is hit"""
+        with self._lock:
+            self._pending[post_id] += delta
+            self._events += 1
+            due = (
+                self._events >= self.max_events
+                or time.monotonic() - self._last_flush >= self.flush_interval
+            )
+            if not due and self._timer is None:
+                # Make sure a quiet post still gets flushed on time
+                self._timer = threading.Timer(self.flush_interval, self._flush_from_timer)
+                self._timer.daemon = True
+                self._timer.start()
+        if due:
+            self.flush()
+
+    def pending(self, post_id):
+        """Delta not yet written to the database for post_id"""
+        with self._lock:
+            return self._pending.get(post_id, 0)
+
+    def flush(self):
+        """Recount every pending post's likes in a single UPDATE; return posts touched"""
+        from . models import Post
+        from . page_cache import purge_post_pages
+        from . site_stats import site_stats
+
+        with self._lock:
+            pending = {post_id: delta for post_id, delta in self._pending.items() if delta}
+            self._pending.clear()
+            self._events = 0
+            self._last_flush = time.monotonic()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+        if not pending:
+            return 0
+
+        try:
+            with transaction.atomic():
+                Post.objects.filter(pk__in=pending).update(like_count=counted_likes())
+        except Exception:
+            # Put the posts back so the next flush retries them
+            with self._lock:
+                for post_id, value in pending.items():
+                    self._pending[post_id] += value
+            raise
+        # The UPDATE sends no signals, so drop cached pages and counters here
+        purge_post_pages(pending)
+        site_stats.invalidate()
+        return len(pending)
+
+    def _flush_from_timer(self):
+        with self._lock:
+            self._timer = None
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Failed to flush buffered like counts')
+        finally:
+            # This thread opened its own connection; don't leak it
+            connection.close()
+
+    def flush_at_exit(self):
+        close_old_connections()
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Failed to flush buffered like counts at exit')
+
+
+like_buffer = LikeBuffer()
+atexit.register(like_buffer.flush_at_exit)
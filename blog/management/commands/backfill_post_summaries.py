@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from blog.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Recalculate stored word count, read time and excerpt for existing posts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='Number of posts loaded and updated per batch (default: 500)',
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        processed = 0
+        last_pk = 0
+
+        # Walk the table by primary key so only one chunk of bodies is in memory
+        while True:
+            chunk = list(
+                Post.objects.filter(pk__gt=last_pk)
+                .order_by('pk')
+                .only('pk', 'content')[:chunk_size]
+            )
+            if not chunk:
+                break
+
+            for post in chunk:
+                post.update_summary_fields()
+            Post.objects.bulk_update(chunk, Post.SUMMARY_FIELDS)
+
+            processed += len(chunk)
+            last_pk = chunk[-1].pk
+            self.stdout.write(f'Processed {processed} posts...')
+
+        self.stdout.write(self.style.SUCCESS(f'Updated summaries for {processed} posts.'))
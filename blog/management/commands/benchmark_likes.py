@@ -0,0 +1,83 @@
+import threading
+import time
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from blog.like_buffer import like_buffer
+from blog.models import Post, Like
+
+
+class Command(BaseCommand):
+    help = 'Compare concurrent like toggles on one post with and without the like buffer'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=8,
+            help='Concurrent togglers, one user each (default: 8)',
+        )
+        parser.add_argument(
+            '--toggles',
+            type=int,
+            default=200,
+            help='Toggles made by each thread per run (default: 200)',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite':
+            raise CommandError('SQLite serializes all writers; run this against PostgreSQL.')
+
+        # Throwaway users and a draft post, removed again at the end
+        prefix = f'like-benchmark-{uuid.uuid4().hex[:8]}'
+        users = [User.objects.create_user(f'{prefix}-{number}') for number in range(options['threads'])]
+        post = Post.objects.create(title=prefix, author=users[0], content='<p>Benchmark</p>', status='draft')
+        try:
+            for buffered in (False, True):
+                with override_settings(LIKE_BUFFER_ENABLED=buffered):
+                    elapsed = self._run(post, users, options['toggles'])
+                    like_buffer.flush()
+                total = len(users) * options['toggles']
+                post.refresh_from_db()
+                exact = post.like_count == Like.objects.filter(post=post).count()
+                self.stdout.write(
+                    f'{"Buffered" if buffered else "Direct":<10}{total} toggles in {elapsed:.2f}s: '
+                    f'{total / elapsed:,.0f} toggles/s, like_count {"exact" if exact else "DRIFTED"}'
+                )
+        finally:
+            post.delete()
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+
+    def _run(self, post, users, toggles):
+        barrier = threading.Barrier(len(users) + 1)
+        errors = []
+
+        def toggle(user):
+            try:
+                own_post = Post.objects.get(pk=post.pk)
+                barrier.wait()
+                for _ in range(toggles):
+                    own_post.toggle_like(user)
+            except Exception as exc:
+                errors.append(exc)
+                barrier.abort()
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=toggle, args=[user]) for user in users]
+        for thread in threads:
+            thread.start()
+        try:
+            barrier.wait()
+        except threading.BrokenBarrierError:
+            pass
+        start = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        if errors:
+            raise CommandError(f'{len(errors)} toggling threads failed: {errors[0]!r}')
+        return elapsed
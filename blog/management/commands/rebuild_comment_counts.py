@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Max, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from blog.models import Post, Comment
+
+
+class Command(BaseCommand):
+    help = 'Recalculate Post.comment_count from the Comment table in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of post ids updated per UPDATE statement (default: 1000)',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        bounds = Post.objects.aggregate(low=Min('pk'), high=Max('pk'))
+        if bounds['low'] is None:
+            self.stdout.write('No posts found.')
+            return
+
+        comment_totals = (
+            Comment.objects.filter(post=OuterRef('pk'))
+            .order_by()
+            .values('post')
+            .annotate(total=Count('pk'))
+            .values('total')
+        )
+
+        updated = 0
+        start = bounds['low']
+        while start <= bounds['high']:
+            end = start + batch_size
+            # One UPDATE ... SET comment_count = (SELECT COUNT(*) ...) per id range
+            updated += Post.objects.filter(pk__gte=start, pk__lt=end).update(
+                comment_count=Coalesce(Subquery(comment_totals), 0)
+            )
+            start = end
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt comment counts for {updated} posts.'))
@@ -0,0 +1,113 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Min
+from blog.models import Post, RelatedPost
+from blog.related import CONTENT, RELATED_POSTS_STORED, trim_related
+from blog.similarity import build_tfidf, nearest_neighbours
+
+
+class Command(BaseCommand):
+    help = (
+        'Store TF-IDF content-similarity neighbours of published posts in the '
+        'related posts index'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--new',
+            action='store_true',
+            help='Only compute neighbours for published posts that have none stored yet, '
+                 'and add them to existing posts\' lists',
+        )
+        parser.add_argument(
+            '--top-k',
+            type=int,
+            default=RELATED_POSTS_STORED,
+            help=f'Neighbours stored per post (default: {RELATED_POSTS_STORED})',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=256,
+            help='Posts per similarity matrix product (default: 256)',
+        )
+
+    def handle(self, *args, **options):
+        top_k = options['top_k']
+        started = time.monotonic()
+
+        # Vectors always cover every published post so idf reflects the corpus
+        ids = []
+
+        def documents():
+            posts = Post.objects.published().order_by('pk').values_list('pk', 'title', 'content')
+            for pk, title, content in posts.iterator(chunk_size=2000):
+                ids.append(pk)
+                yield title, content
+
+        matrix, terms = build_tfidf(documents())
+        vectorized = time.monotonic()
+        if not ids:
+            self.stdout.write('No published posts found.')
+            return
+
+        if options['new']:
+            # Current size and weakest score of each stored list
+            lists = {
+                item['post_id']: (item['size'], item['weakest'])
+                for item in RelatedPost.objects.filter(kind=CONTENT).values('post_id').annotate(
+                    size=Count('id'), weakest=Min('score')
+                )
+            }
+            rows = [row for row, pk in enumerate(ids) if pk not in lists]
+        else:
+            rows = list(range(len(ids)))
+
+        created = 0
+        affected = set()
+        with transaction.atomic():
+            if not options['new']:
+                RelatedPost.objects.filter(kind=CONTENT).delete()
+
+            batch = []
+            for row, top_rows, top_scores, similar_rows, similar_scores in nearest_neighbours(
+                matrix, rows, top_k, options['batch_size']
+            ):
+                post_id = ids[row]
+                batch.extend(
+                    RelatedPost(post_id=post_id, related_post_id=ids[other], kind=CONTENT, score=float(score))
+                    for other, score in zip(top_rows, top_scores)
+                )
+                if options['new']:
+                    # Existing lists take the new post if it beats their weakest entry
+                    for other, score in zip(similar_rows, similar_scores):
+                        other_id = ids[other]
+                        if other_id not in lists:
+                            continue
+                        size, weakest = lists[other_id]
+                        if size < top_k or score > weakest:
+                            batch.append(RelatedPost(
+                                post_id=other_id, related_post_id=post_id, kind=CONTENT, score=float(score)
+                            ))
+                            affected.add(other_id)
+                if len(batch) >= 5000:
+                    RelatedPost.objects.bulk_create(batch)
+                    created += len(batch)
+                    batch = []
+            RelatedPost.objects.bulk_create(batch)
+            created += len(batch)
+
+            if affected:
+                trim_related(list(affected), kind=CONTENT, limit=top_k)
+        stored = time.monotonic()
+
+        self.stdout.write(
+            f'Vectorized {len(ids)} posts over {terms} terms in {vectorized - started:.1f}s; '
+            f'neighbours for {len(rows)} posts computed and stored ({created} rows) '
+            f'in {stored - vectorized:.1f}s.'
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Content similarity updated for {len(rows)} posts.'
+        ))
@@ -0,0 +1,59 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from blog.models import Post, RelatedPost
+from blog.related import TAXONOMY, score_related, top_related
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the shared tags and category rows of the related posts index'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of index rows per INSERT (default: 1000)',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        posts = list(Post.objects.values_list('id', 'category_id', 'status'))
+        published = {post_id for post_id, _, status in posts if status == 'published'}
+
+        # Inverted indexes over published posts; tags of every post
+        tags_by_post = defaultdict(list)
+        posts_by_tag = defaultdict(list)
+        for post_id, tag_id in Post.tags.through.objects.values_list('post_id', 'tag_id'):
+            tags_by_post[post_id].append(tag_id)
+            if post_id in published:
+                posts_by_tag[tag_id].append(post_id)
+        posts_by_category = defaultdict(list)
+        for post_id, category_id, status in posts:
+            if category_id is not None and post_id in published:
+                posts_by_category[category_id].append(post_id)
+
+        created = 0
+        with transaction.atomic():
+            RelatedPost.objects.filter(kind=TAXONOMY).delete()
+            rows = []
+            for post_id, category_id, _ in posts:
+                scores = score_related(
+                    post_id, tags_by_post[post_id], category_id, posts_by_tag, posts_by_category
+                )
+                rows.extend(
+                    RelatedPost(post_id=post_id, related_post_id=other_id, kind=TAXONOMY, score=score)
+                    for other_id, score in top_related(scores)
+                )
+                if len(rows) >= batch_size:
+                    RelatedPost.objects.bulk_create(rows)
+                    created += len(rows)
+                    rows = []
+            RelatedPost.objects.bulk_create(rows)
+            created += len(rows)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt related posts index: {created} rows for {len(posts)} posts.'
+        ))
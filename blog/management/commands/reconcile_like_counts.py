@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F, Max, Min
+from blog.like_buffer import counted_likes, like_buffer
+from blog.models import Post
+from blog.page_cache import purge_post_pages
+from blog.site_stats import site_stats
+
+
+class Command(BaseCommand):
+    help = 'Repair Post.like_count drift against the Like table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of post ids checked per batch (default: 1000)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report drifted posts without updating them',
+        )
+
+    def handle(self, *args, **options):
+        # Buffered flushes recount from the Like table too, so web processes
+        # may keep buffering while this runs; write this process's own first
+        if like_buffer.enabled and not options['dry_run']:
+            like_buffer.flush()
+
+        batch_size = options['batch_size']
+        bounds = Post.objects.aggregate(low=Min('pk'), high=Max('pk'))
+        if bounds['low'] is None:
+            self.stdout.write('No posts found.')
+            return
+
+        drifted = 0
+        start = bounds['low']
+        while start <= bounds['high']:
+            end = start + batch_size
+            drifted_ids = list(
+                Post.objects.filter(pk__gte=start, pk__lt=end)
+                .annotate(actual=counted_likes())
+                .exclude(like_count=F('actual'))
+                .values_list('pk', flat=True)
+            )
+            if drifted_ids and not options['dry_run']:
+                Post.objects.filter(pk__in=drifted_ids).update(like_count=counted_likes())
+                purge_post_pages(drifted_ids)
+            drifted += len(drifted_ids)
+            start = end
+
+        if drifted and not options['dry_run']:
+            site_stats.invalidate()
+
+        verb = 'Found' if options['dry_run'] else 'Repaired'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {drifted} posts with a drifted like count.'))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Min
+from blog.models import Post
+from blog.search import full_text_enabled, update_search_vectors
+
+
+class Command(BaseCommand):
+    help = 'Rebuild stored full-text search vectors for all posts (PostgreSQL only)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of post ids updated per UPDATE statement (default: 1000)',
+        )
+
+    def handle(self, *args, **options):
+        if not full_text_enabled():
+            self.stdout.write('Full-text search needs PostgreSQL; nothing to do.')
+            return
+
+        batch_size = options['batch_size']
+        bounds = Post.objects.aggregate(low=Min('pk'), high=Max('pk'))
+        if bounds['low'] is None:
+            self.stdout.write('No posts found.')
+            return
+
+        updated = 0
+        start = bounds['low']
+        while start <= bounds['high']:
+            end = start + batch_size
+            updated += update_search_vectors(Post.objects.filter(pk__gte=start, pk__lt=end))
+            start = end
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt search vectors for {updated} posts.'))
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.9 on 2026-10-18 05:22
+
+import html
+import re
+
+from django.db import migrations, models
+from django.utils.html import strip_tags
+
+# Copy of blog.utils.summarize_html at the time of this migration, so that
+# later edits to that helper cannot change what the migration writes
+WORDS_PER_MINUTE = 220
+EXCERPT_WORDS = 50
+TAG_RE = re.compile(r"<[^>]+>")
+
+
+def summarize_html(content):
+    words = len(TAG_RE.sub("", content or "").split())
+    read_time = max(1, round(words / WORDS_PER_MINUTE))
+    text = " ".join(strip_tags(html.unescape(str(content))).split()) if content else ""
+    excerpt = " ".join(text.split()[:EXCERPT_WORDS])
+    return words, read_time, excerpt
+
+
+def populate_summary_fields(apps, schema_editor):
+    Post = apps.get_model("blog", "Post")
+    batch = []
+    for post in Post.objects.only("pk", "content").iterator(chunk_size=500):
+        post.word_count, post.read_time_minutes, post.excerpt = summarize_html(post.content)
+        batch.append(post)
+        if len(batch) >= 500:
+            Post.objects.bulk_update(batch, ["word_count", "read_time_minutes", "excerpt"])
+            batch = []
+    if batch:
+        Post.objects.bulk_update(batch, ["word_count", "read_time_minutes", "excerpt"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0006_post_comment_count"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="excerpt",
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="read_time_minutes",
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="word_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_summary_fields, migrations.RunPython.noop),
+    ]
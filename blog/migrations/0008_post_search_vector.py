@@ -0,0 +1,57 @@
+# Generated by Django 5.2.9 on 2026-10-18 05:25
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def populate_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    Post = apps.get_model("blog", "Post")
+    Category = apps.get_model("blog", "Category")
+    Tag = apps.get_model("blog", "Tag")
+    config = getattr(settings, "SEARCH_CONFIG", "english")
+    category_name = Subquery(
+        Category.objects.filter(pk=OuterRef("category_id")).values("name")[:1]
+    )
+    tag_names = Subquery(
+        Tag.objects.filter(posts=OuterRef("pk"))
+        .order_by()
+        .values("posts")
+        .annotate(names=StringAgg("name", delimiter=" "))
+        .values("names")
+    )
+    Post.objects.update(
+        search_vector=(
+            SearchVector("title", weight="A", config=config)
+            + SearchVector(category_name, weight="B", config=config)
+            + SearchVector(tag_names, weight="B", config=config)
+            + SearchVector("content", weight="C", config=config)
+        )
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0007_post_summary_fields"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="blog_post_search_gin"
+            ),
+        ),
+        migrations.RunPython(populate_search_vector, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.9 on 2026-10-18 05:27
+
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+from django.db.models.functions import Upper
+
+TRIGRAM_INDEXES = [
+    ("category", GinIndex(OpClass(Upper("name"), name="gin_trgm_ops"), name="blog_category_name_trgm")),
+    ("post", GinIndex(OpClass(Upper("title"), name="gin_trgm_ops"), name="blog_post_title_trgm")),
+    ("tag", GinIndex(OpClass(Upper("name"), name="gin_trgm_ops"), name="blog_tag_name_trgm")),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # Operator classes only exist on PostgreSQL
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for model_name, index in TRIGRAM_INDEXES:
+        schema_editor.add_index(apps.get_model("blog", model_name), index)
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for model_name, index in TRIGRAM_INDEXES:
+        schema_editor.remove_index(apps.get_model("blog", model_name), index)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0008_post_search_vector"),
+    ]
+
+    operations = [
+        # No-op on databases other than PostgreSQL
+        TrigramExtension(),
+        # Database only: operator-class indexes stay out of model state so that
+        # SQLite table rebuilds in later migrations never try to recreate them
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
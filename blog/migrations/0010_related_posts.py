@@ -0,0 +1,79 @@
+# Generated by Django 5.2.9 on 2026-10-18 05:36
+
+import heapq
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Scoring as blog.related had it when this index was introduced; kept here
+# because migrations must not depend on app code that may change or move
+RELATED_POSTS_STORED = 12
+TAG_WEIGHT = 1.0
+CATEGORY_WEIGHT = 1.0
+
+
+def score_related(post_id, tag_ids, category_id, posts_by_tag, posts_by_category):
+    scores = defaultdict(float)
+    for tag_id in tag_ids:
+        for other_id in posts_by_tag.get(tag_id, ()):
+            scores[other_id] += TAG_WEIGHT
+    if category_id is not None:
+        for other_id in posts_by_category.get(category_id, ()):
+            scores[other_id] += CATEGORY_WEIGHT
+    scores.pop(post_id, None)
+    return scores
+
+
+def top_related(scores, limit=RELATED_POSTS_STORED):
+    return heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], item[0]))
+
+
+def populate_related_posts(apps, schema_editor):
+    Post = apps.get_model("blog", "Post")
+    RelatedPost = apps.get_model("blog", "RelatedPost")
+
+    posts = list(Post.objects.values_list("id", "category_id", "status"))
+    published = {post_id for post_id, _, status in posts if status == "published"}
+    tags_by_post = defaultdict(list)
+    posts_by_tag = defaultdict(list)
+    for post_id, tag_id in Post.tags.through.objects.values_list("post_id", "tag_id"):
+        tags_by_post[post_id].append(tag_id)
+        if post_id in published:
+            posts_by_tag[tag_id].append(post_id)
+    posts_by_category = defaultdict(list)
+    for post_id, category_id, _ in posts:
+        if category_id is not None and post_id in published:
+            posts_by_category[category_id].append(post_id)
+
+    rows = []
+    for post_id, category_id, _ in posts:
+        scores = score_related(post_id, tags_by_post[post_id], category_id, posts_by_tag, posts_by_category)
+        rows.extend(
+            RelatedPost(post_id=post_id, related_post_id=other_id, score=score)
+            for other_id, score in top_related(scores)
+        )
+    RelatedPost.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0009_trigram_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RelatedPost",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("score", models.FloatField()),
+                ("post", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="related_index", to="blog.post")),
+                ("related_post", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="related_to", to="blog.post")),
+            ],
+            options={
+                "indexes": [models.Index(fields=["post", "-score"], name="blog_related_post_score")],
+                "unique_together": {("post", "related_post")},
+            },
+        ),
+        migrations.RunPython(populate_related_posts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.9 on 2026-10-18 05:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0010_related_posts"),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name="relatedpost",
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name="relatedpost",
+            name="kind",
+            field=models.CharField(
+                choices=[("taxonomy", "Shared tags and category"), ("content", "Similar content")],
+                default="taxonomy",
+                max_length=20,
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="relatedpost",
+            unique_together={("post", "related_post", "kind")},
+        ),
+    ]
@@ -1,7 +1,13 @@
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, Window
+from django.db.models.functions import Greatest, RowNumber
 from django.contrib.auth.models import User
 from django.utils.text import slugify
-import re
+from core.images import image_metadata
+from . like_buffer import like_buffer
+from . utils import summarize_html
 
 # Category Model
 class Category(models.Model):
@@ -55,24 +61,70 @@ class Tag(models.Model):
     class Meta:
         ordering = ['name']
 
+class PostQuerySet(models.QuerySet):
+    # Columns rendered by post cards; the full content body is never loaded
+    CARD_FIELDS = (
+        'title', 'slug', 'image', 'image_variants', 'status', 'is_featured', 'like_count',
+        'comment_count', 'read_time_minutes', 'excerpt', 'created_at', 'updated_at',
+        'author__username', 'category__name', 'category__slug',
+    )
+
+    def published(self):
+        return self.filter(status='published')
+
+    def cards(self):
+        """Select only what listing cards need, with author and category joined"""
+        return self.select_related('author', 'category').only(*self.CARD_FIELDS)
+
+    def latest_per_category(self, limit):
+        """
+        The `limit` newest posts of every category in a single query, using
+        ROW_NUMBER() OVER (PARTITION BY category_id ORDER BY created_at DESC)
+        """
+        return self.filter(category__isnull=False).annotate(
+            category_rank=Window(
+                RowNumber(),
+                partition_by=F('category_id'),
+                order_by=[F('created_at').desc(), F('id').desc()],
+            )
+        ).filter(category_rank__lte=limit).order_by('category_id', 'category_rank')
+
+
 class Post(models.Model):
     STATUS_CHOICES = [
         ('draft', 'Draft'), 
         ('published', 'Published'),
     ]
+    # Derived from content on save so listings never need the full body
+    SUMMARY_FIELDS = ('word_count', 'read_time_minutes', 'excerpt')
+    # Recorded from a new upload on save so nothing asks storage for them
+    IMAGE_METADATA_FIELDS = ('image_width', 'image_height', 'image_size')
+
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True, blank=True, max_length=100)
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     content = models.TextField()
     image = models.ImageField(upload_to='posts/', blank=True, null=True)
+    # Resized copies of image for srcset (see core.images)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+    image_width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    image_height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    image_size = models.PositiveBigIntegerField(null=True, blank=True, editable=False)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='draft')
     is_featured = models.BooleanField(default=False, db_index=True, help_text='Mark this post as featured to display it in the featured section')
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, related_name='posts')
     tags = models.ManyToManyField(Tag, blank=True, related_name='posts')
     like_count = models.PositiveIntegerField(default=0, db_index=True)
+    comment_count = models.PositiveIntegerField(default=0)
+    word_count = models.PositiveIntegerField(default=0, editable=False)
+    read_time_minutes = models.PositiveIntegerField(default=1, editable=False)
+    excerpt = models.TextField(blank=True, editable=False)
+    search_vector = SearchVectorField(null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = PostQuerySet.as_manager()
+
     def save(self, *args, **kwargs):
         if not self.slug:
             base_slug = slugify(self.title)
@@ -92,21 +144,68 @@ class Post(models.Model):
                     queryset = queryset.exclude(pk=self.pk)
             
             self.slug = slug
+
+        # Refresh stored summary fields whenever the body may have changed
+        update_fields = kwargs.get('update_fields')
+        content_loaded = 'content' not in self.get_deferred_fields()
+        if content_loaded and (update_fields is None or 'content' in update_fields):
+            self.update_summary_fields()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, *self.SUMMARY_FIELDS}
+
+        # Record a new image's size while the upload is still local
+        image_loaded = 'image' not in self.get_deferred_fields()
+        if image_loaded and (update_fields is None or 'image' in update_fields):
+            metadata = image_metadata(self.image)
+            if metadata is not None:
+                self.image_width, self.image_height, self.image_size = metadata
+                if update_fields is not None:
+                    kwargs['update_fields'] = {*kwargs['update_fields'], *self.IMAGE_METADATA_FIELDS}
         super().save(*args, **kwargs)
 
     def __str__(self):
         return self.title
 
-    @property
-    def read_time_minutes(self):
-        """Calculate estimated reading time in minutes (assuming 220 words per minute)"""
-        # Strip HTML tags for accurate word count
-        text = re.sub(r'<[^>]+>', '', self.content)
-        # Count words
-        words = len(text.split())
-        # Calculate minutes (minimum 1 minute)
-        minutes = max(1, round(words / 220))
-        return minutes
+    def update_summary_fields(self):
+        """Recalculate word count, reading time and excerpt from content"""
+        self.word_count, self.read_time_minutes, self.excerpt = summarize_html(self.content)
+
+    def toggle_like(self, user):
+        """
+        Like or unlike this post for user and return (liked, like_count).
+        The Like row and the counter change commit in one transaction, and the
+        counter is only ever changed with an F() expression, so concurrent
+        toggles cannot lose updates.
+        """
+        with transaction.atomic():
+            deleted, _ = Like.objects.filter(user=user, post=self).delete()
+            if deleted:
+                liked, delta = False, -1
+            else:
+                try:
+                    with transaction.atomic():
+                        Like.objects.create(user=user, post=self)
+                except IntegrityError:
+                    # A concurrent request from the same user already liked it
+                    liked, delta = True, 0
+                else:
+                    liked, delta = True, 1
+
+            queryset = Post.objects.filter(pk=self.pk)
+            if like_buffer.enabled:
+                # Leave the post row unlocked; the counter is written in batches
+                stored = queryset.values_list('like_count', flat=True).get()
+                self.like_count = max(0, stored + like_buffer.pending(self.pk) + delta)
+                if delta:
+                    transaction.on_commit(lambda: like_buffer.add(self.pk, delta))
+                return liked, self.like_count
+
+            if delta:
+                queryset.update(like_count=Greatest(F('like_count') + delta, 0))
+            # The row stays locked by the UPDATE until commit, so this read
+            # returns exactly the value this toggle produced
+            self.like_count = queryset.values_list('like_count', flat=True).get()
+        return liked, self.like_count
 
     @property
     def likes_count(self):
@@ -115,6 +214,9 @@ class Post(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            GinIndex(fields=['search_vector'], name='blog_post_search_gin'),
+        ]
 
 #Comment model
 class Comment(models.Model):
@@ -142,4 +244,25 @@ class Like(models.Model):
         ordering = ['-created_at']
 
     def __str__(self):
-        return f'{self.user.username} likes {self.post.title}'
\ No newline at end of file
+        return f'{self.user.username} likes {self.post.title}'
+
+# Related posts index, maintained by blog.related
+class RelatedPost(models.Model):
+    KIND_CHOICES = [
+        ('taxonomy', 'Shared tags and category'),
+        ('content', 'Similar content'),
+    ]
+
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='related_index')
+    related_post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='related_to')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default='taxonomy')
+    score = models.FloatField()
+
+    class Meta:
+        unique_together = [['post', 'related_post', 'kind']]
+        indexes = [
+            models.Index(fields=['post', '-score'], name='blog_related_post_score'),
+        ]
+
+    def __str__(self):
+        return f'{self.related_post_id} related to {self.post_id} ({self.score})'
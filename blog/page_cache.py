@@ -0,0 +1,197 @@
+"""
+Full-page cache for anonymous visitors
+
+Views wrapped in cache_anonymous_page store the whole response for anonymous
+GET requests, keyed by absolute URL. While rendering, a view declares the
+tags its page depends on with add_page_tags ("post:12", "category:3", or
+SITE for pages built from site-wide figures), and the entry records the
+current version of each tag. purge_page_tags drops those versions, so any
+page depending on a purged tag misses on its next lookup while everything
+else stays cached; blog.signals purges exactly the tags touched by Post,
+Comment, Like, Category and Tag changes. Versions are always read from the
+shared tier (version_cache), so a purge takes effect in every worker at once
+even while a worker still holds a local copy of the entry itself.
+
+A purge can land while a view is rendering from data read before it. So the
+versions an entry records are snapshotted before the view runs: those of
+the tags the URL's previous entry declared, which a page usually declares
+again, plus a count of purges. A purged snapshot tag then no longer matches
+the stored version, and a tag first declared during the render is only
+trusted if no purge happened meanwhile; otherwise the page is not stored,
+but its tags are remembered so the next render snapshots them.
+
+Entries also expire after PAGE_CACHE_SECONDS, which bounds staleness for
+changes no signal covers (e.g. an author renaming their account).
+
+Logged-in visitors, requests with flash messages waiting to be shown and
+anything but GET/HEAD always reach the view. Pages embed a CSRF token, so it
+is stored as a placeholder and every hit gets the visitor's own token.
+
+Hits and misses are counted per process and reported by the cache_stats view.
+"""
+import hashlib
+import re
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+
+from . fragment_cache import FragmentStats
+
+# Tag for pages showing site-wide figures (homepage, about)
+SITE = 'site'
+
+CSRF_TOKEN_RE = re.compile(rb'(name="csrfmiddlewaretoken" value=")[A-Za-z0-9]{64}(")')
+CSRF_PLACEHOLDER = b'__page_cache_csrf_token__'
+
+page_stats = FragmentStats()
+
+
+def page_cache():
+    return caches[getattr(settings, 'PAGE_CACHE_ALIAS', 'default')]
+
+
+def version_cache():
+    """
+    Where tag versions and the purge count live: the page cache's shared tier
+    when it has one, so no worker judges an entry by a local copy of them
+    """
+    cache = page_cache()
+    return getattr(cache, 'shared', cache)
+
+
+def page_tag(kind, pk):
+    """Tag for one object, e.g. page_tag('post', 12) -> 'post:12'"""
+    return f'{kind}:{pk}'
+
+
+PURGE_COUNT_KEY = 'page-purges'
+
+
+def _version_key(tag):
+    return f'page-tag:{tag}'
+
+
+def _page_key(request):
+    digest = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    return f'page:{digest}'
+
+
+def _tags_key(page_key):
+    return f'{page_key}:tags'
+
+
+def _tag_versions(tags):
+    keys = {_version_key(tag): tag for tag in tags}
+    return {keys[key]: version for key, version in version_cache().get_many(keys).items()}
+
+
+def _ensure_versions(tags):
+    """Current versions of tags, giving new ones to those without"""
+    versions = _tag_versions(tags)
+    for tag in tags:
+        if tag not in versions:
+            # add() keeps a version another process set meanwhile
+            version_cache().add(_version_key(tag), uuid.uuid4().hex, None)
+    if len(versions) != len(tags):
+        versions = _tag_versions(tags)
+    return versions
+
+
+def _purge_count():
+    cache = version_cache()
+    cache.add(PURGE_COUNT_KEY, 0, None)
+    return cache.get(PURGE_COUNT_KEY)
+
+
+def _is_cacheable(request):
+    return (
+        request.method in ('GET', 'HEAD')
+        and not request.user.is_authenticated
+        and not len(get_messages(request))
+    )
+
+
+def add_page_tags(request, *tags):
+    """Declare tags the page being rendered depends on (no-op when not caching)"""
+    page_tags = getattr(request, '_page_cache_tags', None)
+    if page_tags is not None:
+        page_tags.update(tags)
+
+
+def purge_page_tags(*tags):
+    """Invalidate every cached page that depends on any of tags"""
+    if tags:
+        cache = version_cache()
+        # Counted before the versions go, so a render that read a tag's
+        # version after this purge still sees the count change
+        try:
+            cache.incr(PURGE_COUNT_KEY)
+        except ValueError:
+            cache.add(PURGE_COUNT_KEY, 1, None)
+        cache.delete_many([_version_key(tag) for tag in tags])
+
+
+def purge_post_pages(post_ids):
+    """Invalidate pages showing any of the given posts, and site-wide pages"""
+    purge_page_tags(SITE, *(page_tag('post', post_id) for post_id in post_ids))
+
+
+def _store(cache, key, request, response):
+    tags = request._page_cache_tags
+    if not tags:
+        return
+    purges_before, snapshot = request._page_cache_snapshot
+    versions = {tag: snapshot[tag] for tag in tags if tag in snapshot}
+    new_tags = tags - versions.keys()
+    if new_tags:
+        versions.update(_ensure_versions(new_tags))
+        # Read after the versions above, so a later purge still drops them
+        if len(versions) != len(tags) or purges_before is None or _purge_count() != purges_before:
+            cache.set(_tags_key(key), sorted(tags), None)
+            return
+
+    cache.set(key, {
+        'content': CSRF_TOKEN_RE.sub(rb'\1' + CSRF_PLACEHOLDER + rb'\2', response.content),
+        'content_type': response['Content-Type'],
+        'versions': versions,
+    }, getattr(settings, 'PAGE_CACHE_SECONDS', 300))
+
+
+def _cached_response(request, entry):
+    content = entry['content']
+    if CSRF_PLACEHOLDER in content:
+        content = content.replace(CSRF_PLACEHOLDER, get_token(request).encode())
+    return HttpResponse(content, content_type=entry['content_type'])
+
+
+def cache_anonymous_page(view):
+    """Serve anonymous GETs of the view from the page cache"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not _is_cacheable(request):
+            return view(request, *args, **kwargs)
+
+        cache = page_cache()
+        key = _page_key(request)
+        entry = cache.get(key)
+        hit = entry is not None and _tag_versions(entry['versions']) == entry['versions']
+        page_stats.record(hit=hit)
+        if hit:
+            return _cached_response(request, entry)
+
+        # Taken before the view reads anything (see module docstring)
+        purges_before = _purge_count()
+        known_tags = entry['versions'] if entry is not None else cache.get(_tags_key(key), ())
+        snapshot = _ensure_versions(known_tags)
+        request._page_cache_snapshot = (purges_before, snapshot)
+        request._page_cache_tags = set()
+        response = view(request, *args, **kwargs)
+        if response.status_code == 200 and not response.streaming and not response.cookies:
+            _store(cache, key, request, response)
+        return response
+    return wrapper
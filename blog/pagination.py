@@ -0,0 +1,244 @@
+"""
+Keyset (cursor) pagination for post listings
+
+Pages are fetched with a WHERE clause on the ordering key instead of OFFSET,
+so page 1000 costs the same as page 1. Cursors are opaque URL-safe tokens that
+carry the boundary key and the page number. Anything in a cursor may have been
+edited by the client, so the total shown in the pager is always counted by the
+server (once per request, and only if the page shows it), and the page number
+is kept within the page count.
+
+CursorPage mirrors the parts of django.core.paginator.Page the templates use
+(iteration, has_next/has_previous, number, start_index/end_index and
+paginator.count/num_pages); links use next_cursor, previous_cursor and
+last_cursor instead of page numbers. listing_page() builds a request's page
+once, so conditional GET validators and the view share it.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+# Orderings used by the post listings; each ends in the primary key so the
+# cursor key is unique
+LISTING_ORDERING = ('-created_at', '-id')
+MOST_LIKED_ORDERING = ('-like_count', '-created_at', '-id')
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict) and set(value) == {'dt'} and isinstance(value['dt'], str):
+        return datetime.fromisoformat(value['dt'])
+    if isinstance(value, (dict, list)):
+        raise ValueError('Cursor key parts must be scalars')
+    return value
+
+
+def _is_count(value):
+    # bool is an int subclass, so rule it out explicitly
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def encode_cursor(payload):
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Return the cursor payload, or None for a missing or malformed token"""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json.loads(raw)
+    except (binascii.Error, ValueError, RecursionError):
+        return None
+    if not isinstance(payload, dict) or payload.get('d') not in ('next', 'prev', 'last'):
+        return None
+    if 'n' in payload and not (_is_count(payload['n']) and payload['n'] > 0):
+        return None
+    return payload
+
+
+class CursorPaginator:
+    """
+    Paginate queryset by the unique ordering in `ordering`, e.g.
+    ('-created_at', '-id') or ('-like_count', '-created_at', '-id').
+    The last field must be unique so every row has a distinct key.
+    """
+
+    def __init__(self, queryset, per_page, ordering):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.fields = [(name.lstrip('-'), name.startswith('-')) for name in ordering]
+        self._count = None
+
+    @property
+    def count(self):
+        if self._count is None:
+            self._count = self.queryset.count()
+        return self._count
+
+    @property
+    def num_pages(self):
+        return max(1, -(-self.count // self.per_page))
+
+    def _ordering(self, forward):
+        # Reading backwards flips every field's direction
+        return [
+            ('-' if descending == forward else '') + name
+            for name, descending in self.fields
+        ]
+
+    def _after(self, values, forward):
+        """Rows strictly after `values` in the (possibly reversed) ordering"""
+        condition = Q()
+        for index, (name, descending) in enumerate(self.fields):
+            lookup = 'lt' if descending == forward else 'gt'
+            clause = Q(**{f'{name}__{lookup}': values[index]})
+            # ...with every earlier ordering field tied
+            for prev_index in range(index):
+                clause &= Q(**{self.fields[prev_index][0]: values[prev_index]})
+            condition |= clause
+        return condition
+
+    def key(self, obj):
+        return [_encode_value(getattr(obj, name)) for name, _ in self.fields]
+
+    def _field(self, name):
+        annotation = self.queryset.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        return self.queryset.model._meta.get_field(name)
+
+    def _decode_key(self, key):
+        """The cursor's key values converted to their ordering fields' types, or None if invalid"""
+        if not isinstance(key, list) or len(key) != len(self.fields):
+            return None
+        try:
+            return [
+                self._field(name).to_python(_decode_value(value))
+                for (name, _), value in zip(self.fields, key)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            return None
+
+    def _first_page(self):
+        rows = list(self.queryset.order_by(*self._ordering(True))[:self.per_page + 1])
+        return CursorPage(self, rows[:self.per_page], 1,
+                          has_next=len(rows) > self.per_page, has_previous=False)
+
+    def get_page(self, cursor):
+        """Return the CursorPage for a cursor token (first page if invalid)"""
+        payload = decode_cursor(cursor)
+        if payload is None:
+            return self._first_page()
+
+        number = min(payload.get('n', 1), self.num_pages)
+
+        if payload['d'] == 'last':
+            number = self.num_pages
+            size = min(max(self.count - (number - 1) * self.per_page, 0), self.per_page)
+            rows = list(self.queryset.order_by(*self._ordering(False))[:size])
+            rows.reverse()
+            return CursorPage(self, rows, number, has_next=False, has_previous=number > 1)
+
+        values = self._decode_key(payload.get('k'))
+        if values is None or None in values:
+            return self._first_page()
+
+        forward = payload['d'] == 'next'
+        rows = list(
+            self.queryset.filter(self._after(values, forward))
+            .order_by(*self._ordering(forward))[:self.per_page + 1]
+        )
+        if not rows:
+            # Everything past a stale cursor's boundary has gone
+            return self._first_page()
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if forward:
+            return CursorPage(self, rows, number, has_next=has_more, has_previous=True)
+        rows.reverse()
+        return CursorPage(self, rows, number, has_next=True, has_previous=has_more)
+
+
+class CursorPage:
+    def __init__(self, paginator, object_list, number, has_next, has_previous):
+        self.paginator = paginator
+        self.object_list = object_list
+        self.number = number
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return f'<CursorPage {self.number}>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    def start_index(self):
+        if not self.object_list:
+            return 0
+        return (self.number - 1) * self.paginator.per_page + 1
+
+    def end_index(self):
+        return self.start_index() + len(self.object_list) - 1 if self.object_list else 0
+
+    def _cursor(self, direction, obj, number):
+        payload = {'d': direction, 'n': number}
+        if obj is not None:
+            payload['k'] = self.paginator.key(obj)
+        return encode_cursor(payload)
+
+    @property
+    def next_cursor(self):
+        if not self._has_next:
+            return None
+        return self._cursor('next', self.object_list[-1], self.number + 1)
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous:
+            return None
+        return self._cursor('prev', self.object_list[0], self.number - 1)
+
+    @property
+    def last_cursor(self):
+        return self._cursor('last', None, self.paginator.num_pages)
+
+
+def listing_page(request, queryset, ordering, per_page=12):
+    """
+    The page of queryset the request's cursor asks for, built on the first
+    call and reused by later ones in the same request (a view's conditional
+    GET validators, then the view itself)
+    """
+    page = getattr(request, '_listing_page', None)
+    if page is None:
+        paginator = CursorPaginator(queryset, per_page, ordering)
+        page = request._listing_page = paginator.get_page(request.GET.get('cursor'))
+    return page
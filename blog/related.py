@@ -0,0 +1,159 @@
+"""
+Related posts index
+
+Each post keeps its RELATED_POSTS_STORED best matches among published posts in
+RelatedPost, so post_detail reads them with one indexed lookup instead of
+joining tags on every view. Two kinds of rows are stored: "taxonomy" rows,
+scored by shared tags and a shared category and maintained here, and
+"content" rows, TF-IDF cosine similarities written by the
+rebuild_content_similarity command (see blog.similarity). Content matches
+are shown first, topped up with taxonomy matches.
+
+The rest of this module maintains taxonomy rows.
+
+Scores are symmetric, so when a post's tags, category or status change only
+its own list and its entries in other posts' lists are touched. Its own list
+is rewritten at once; its entries elsewhere are left to an
+update_related_neighbours job, or run after the save commits where no job
+worker is deployed (see core.jobs.run_later): neighbours it now ranks in get
+it inserted and trimmed, and neighbours it dropped out of or fell in are
+recomputed. The rebuild_related_posts command recomputes every list, e.g.
+after tags or categories are deleted.
+"""
+import heapq
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When, Window
+from django.db.models.functions import RowNumber
+from core.jobs import job, run_later
+
+from . models import Post, RelatedPost
+
+TAXONOMY = 'taxonomy'
+CONTENT = 'content'
+
+RELATED_POSTS_STORED = 12
+TAG_WEIGHT = 1.0
+CATEGORY_WEIGHT = 1.0
+
+
+def score_related(post_id, tag_ids, category_id, posts_by_tag, posts_by_category):
+    """Scores of every post sharing a tag or the category with post_id"""
+    scores = defaultdict(float)
+    for tag_id in tag_ids:
+        for other_id in posts_by_tag.get(tag_id, ()):
+            scores[other_id] += TAG_WEIGHT
+    if category_id is not None:
+        for other_id in posts_by_category.get(category_id, ()):
+            scores[other_id] += CATEGORY_WEIGHT
+    scores.pop(post_id, None)
+    return scores
+
+
+def top_related(scores, limit=RELATED_POSTS_STORED):
+    """Best (post_id, score) pairs; ties go to the newer post"""
+    return heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], item[0]))
+
+
+def trim_related(post_ids, kind=TAXONOMY, limit=RELATED_POSTS_STORED):
+    """Drop index rows of `kind` beyond the top `limit` of each given post"""
+    extra = RelatedPost.objects.filter(post_id__in=post_ids, kind=kind).annotate(
+        position=Window(
+            RowNumber(),
+            partition_by=F('post_id'),
+            order_by=[F('score').desc(), F('related_post_id').desc()],
+        )
+    ).filter(position__gt=limit).values_list('id', flat=True)
+    RelatedPost.objects.filter(id__in=list(extra)).delete()
+
+
+def _neighbours(post_id, category_id):
+    """Scores against every post sharing a tag or the category, and which are published"""
+    tag_ids = list(Post.tags.through.objects.filter(post_id=post_id).values_list('tag_id', flat=True))
+    published = set()
+
+    posts_by_tag = defaultdict(list)
+    for other_id, tag_id, status in Post.tags.through.objects.filter(
+        tag_id__in=tag_ids
+    ).values_list('post_id', 'tag_id', 'post__status'):
+        posts_by_tag[tag_id].append(other_id)
+        if status == 'published':
+            published.add(other_id)
+
+    posts_by_category = {}
+    if category_id is not None:
+        posts_by_category[category_id] = []
+        for other_id, status in Post.objects.filter(category_id=category_id).values_list('id', 'status'):
+            posts_by_category[category_id].append(other_id)
+            if status == 'published':
+                published.add(other_id)
+
+    scores = score_related(post_id, tag_ids, category_id, posts_by_tag, posts_by_category)
+    return scores, published
+
+
+def _replace_list(post_id, scores, published):
+    RelatedPost.objects.filter(post_id=post_id, kind=TAXONOMY).delete()
+    candidates = {other_id: score for other_id, score in scores.items() if other_id in published}
+    RelatedPost.objects.bulk_create([
+        RelatedPost(post_id=post_id, related_post_id=other_id, kind=TAXONOMY, score=score)
+        for other_id, score in top_related(candidates)
+    ])
+
+
+def update_related_posts(post):
+    """Recompute one post's related list and schedule its place in other posts' lists"""
+    with transaction.atomic():
+        _replace_list(post.id, *_neighbours(post.id, post.category_id))
+        run_later('update_related_neighbours', post_id=post.id)
+
+
+@job('update_related_neighbours')
+def update_related_neighbours(post_id):
+    """Insert, drop or re-score a post in the lists of the posts it shares tags or a category with"""
+    post = Post.objects.filter(pk=post_id).values('category_id', 'status').first()
+    if post is None:
+        # Deleted while queued; its rows went with it
+        return
+    scores, published = _neighbours(post_id, post['category_id'])
+    is_published = post['status'] == 'published'
+    previous = dict(
+        RelatedPost.objects.filter(related_post_id=post_id, kind=TAXONOMY).values_list('post_id', 'score')
+    )
+    # Lists this post left or fell in may have lost rows to an earlier trim
+    stale = [
+        other_id for other_id, score in previous.items()
+        if not is_published or scores.get(other_id, 0) < score
+    ]
+
+    with transaction.atomic():
+        RelatedPost.objects.filter(related_post_id=post_id, kind=TAXONOMY).delete()
+        # Drafts are never shown as related, so only published posts join other lists
+        if is_published and scores:
+            RelatedPost.objects.bulk_create([
+                RelatedPost(post_id=other_id, related_post_id=post_id, kind=TAXONOMY, score=score)
+                for other_id, score in scores.items()
+            ], batch_size=1000)
+            trim_related(list(scores))
+        for other_id, category_id in Post.objects.filter(id__in=stale).values_list('id', 'category_id'):
+            _replace_list(other_id, *_neighbours(other_id, category_id))
+
+
+def related_posts(post, limit=6):
+    """Top related published posts for post_detail, in one query"""
+    rows = Post.objects.published().filter(
+        related_to__post=post
+    ).cards().order_by(
+        Case(When(related_to__kind=CONTENT, then=Value(0)), default=Value(1), output_field=IntegerField()),
+        '-related_to__score',
+        '-id',
+    )[:limit * 2]
+
+    # A post can be matched by both kinds; keep its first (best) appearance
+    related, seen = [], set()
+    for related_post in rows:
+        if related_post.id not in seen:
+            seen.add(related_post.id)
+            related.append(related_post)
+    return related[:limit]
@@ -0,0 +1,164 @@
+"""
+Post search
+
+On PostgreSQL, posts carry a stored, weighted tsvector (title A, category and
+tags B, body C) backed by a GIN index, and results are ranked by relevance with
+highlighted snippets. Title, tag and category names also have pg_trgm indexes
+that serve prefix and typo-tolerant suggestions. Other databases (SQLite in
+local development) fall back to icontains search and prefix-only suggestions.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (
+    SearchHeadline, SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity,
+)
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F, FloatField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Cast, Upper
+from django.urls import reverse
+
+# Markers wrapped around matches by ts_headline; the highlight_snippet filter
+# turns them into <mark> tags after escaping the snippet.
+HIGHLIGHT_START = '[[['
+HIGHLIGHT_STOP = ']]]'
+
+# Fields whose change makes a stored search vector stale
+SEARCH_FIELDS = {'title', 'content', 'category'}
+
+SUGGESTION_LIMIT = 8
+SUGGESTION_MIN_LENGTH = 2
+
+
+def full_text_enabled():
+    return connection.vendor == 'postgresql'
+
+
+def search_config():
+    return getattr(settings, 'SEARCH_CONFIG', 'english')
+
+
+def search_vector_expression():
+    """Weighted tsvector for a post row, usable in Post.objects.update()"""
+    from . models import Category, Tag
+
+    config = search_config()
+    category_name = Subquery(
+        Category.objects.filter(pk=OuterRef('category_id')).values('name')[:1]
+    )
+    tag_names = Subquery(
+        Tag.objects.filter(posts=OuterRef('pk'))
+        .order_by()
+        .values('posts')
+        .annotate(names=StringAgg('name', delimiter=' '))
+        .values('names')
+    )
+    return (
+        SearchVector('title', weight='A', config=config)
+        + SearchVector(category_name, weight='B', config=config)
+        + SearchVector(tag_names, weight='B', config=config)
+        + SearchVector('content', weight='C', config=config)
+    )
+
+
+def update_search_vectors(queryset):
+    """Recompute stored search vectors for every post in queryset"""
+    if not full_text_enabled():
+        return 0
+    return queryset.update(search_vector=search_vector_expression())
+
+
+def search_ordering():
+    """Unique ordering of search_posts() results, used as the pagination key"""
+    if full_text_enabled():
+        return ('-rank', '-created_at', '-id')
+    return ('-created_at', '-id')
+
+
+def search_posts(query):
+    """Published posts matching query, best matches first"""
+    from . models import Post
+
+    posts = Post.objects.published()
+
+    if not full_text_enabled():
+        return posts.filter(
+            Q(title__icontains=query) |
+            Q(content__icontains=query) |
+            Q(category__name__icontains=query) |
+            Q(tags__name__icontains=query)
+        ).cards().distinct().order_by(*search_ordering())
+
+    search_query = SearchQuery(query, search_type='websearch', config=search_config())
+    return posts.filter(search_vector=search_query).annotate(
+        # ts_rank returns a real; as a double it survives the round trip
+        # through a pagination cursor exactly
+        rank=Cast(SearchRank(F('search_vector'), search_query), FloatField()),
+        headline=SearchHeadline(
+            'content',
+            search_query,
+            config=search_config(),
+            start_sel=HIGHLIGHT_START,
+            stop_sel=HIGHLIGHT_STOP,
+            max_words=35,
+            min_words=15,
+        ),
+    ).cards().order_by(*search_ordering())
+
+
+def _normalize(query):
+    return ' '.join(query.lower().split())
+
+
+def suggest(query, limit=SUGGESTION_LIMIT):
+    """
+    Autocomplete and "did you mean" candidates for query: post titles, tag
+    names and category names that start with it or, on PostgreSQL, are
+    trigram-similar to it. Results are cached per normalized prefix.
+    """
+    from . models import Category, Post, Tag
+
+    query = _normalize(query)
+    if len(query) < SUGGESTION_MIN_LENGTH:
+        return []
+
+    cache_key = 'search-suggest:' + hashlib.md5(query.encode()).hexdigest()
+    suggestions = cache.get(cache_key)
+    if suggestions is not None:
+        return suggestions
+
+    sources = [
+        ('post', Post.objects.published(), 'title', lambda obj: reverse('blog:post_detail', args=[obj['slug']])),
+        ('tag', Tag.objects.all(), 'name', lambda obj: reverse('blog:tag_detail', args=[obj['slug']])),
+        ('category', Category.objects.all(), 'name', lambda obj: reverse('blog:category_detail', args=[obj['slug']])),
+    ]
+
+    suggestions = []
+    for kind, queryset, field, url in sources:
+        # Match on UPPER(field), the expression the trigram indexes cover
+        queryset = queryset.alias(match_text=Upper(field))
+        prefix = Q(match_text__startswith=query.upper())
+        if full_text_enabled():
+            # Both lookups are served by the gin_trgm_ops index; word
+            # similarity also matches a mistyped word inside a longer title
+            matches = queryset.filter(
+                prefix | Q(match_text__trigram_word_similar=query)
+            ).annotate(
+                score=TrigramWordSimilarity(query, 'match_text')
+            ).order_by('-score', field)
+        else:
+            matches = queryset.filter(prefix).annotate(score=Value(1.0)).order_by(field)
+        for obj in matches.values(field, 'slug', 'score')[:limit]:
+            suggestions.append({
+                'type': kind,
+                'label': obj[field],
+                'url': url(obj),
+                'score': round(obj['score'], 3),
+            })
+
+    suggestions.sort(key=lambda item: item['score'], reverse=True)
+    suggestions = suggestions[:limit]
+    cache.set(cache_key, suggestions, getattr(settings, 'SEARCH_SUGGEST_CACHE_SECONDS', 300))
+    return suggestions
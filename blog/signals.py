@@ -0,0 +1,182 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_delete, pre_save
+from django.dispatch import receiver
+from core.images import POST_IMAGE_WIDTHS, delete_variants, refresh_variants
+from . models import Post, Comment, Category, Tag, Like
+from . page_cache import SITE, page_tag, purge_page_tags
+from . related import update_related_posts
+from . search import SEARCH_FIELDS, update_search_vectors
+from . site_stats import site_stats
+
+# Fields whose change moves a post in the related posts index
+RELATED_FIELDS = {'status', 'category'}
+
+
+@receiver(post_save, sender=Comment)
+def increment_comment_count(sender, instance, created, **kwargs):
+    """Keep Post.comment_count in step when a comment is added"""
+    if created:
+        Post.objects.filter(pk=instance.post_id).update(comment_count=F('comment_count') + 1)
+
+
+@receiver(post_delete, sender=Comment)
+def decrement_comment_count(sender, instance, **kwargs):
+    """Keep Post.comment_count in step when a comment (or reply) is removed"""
+    Post.objects.filter(pk=instance.post_id).update(
+        comment_count=Greatest(F('comment_count') - 1, 0)
+    )
+
+
+@receiver(post_save, sender=Post)
+def refresh_search_vector(sender, instance, update_fields=None, **kwargs):
+    """Rebuild the stored search vector when searchable fields change"""
+    if update_fields is not None and not SEARCH_FIELDS.intersection(update_fields):
+        return
+    update_search_vectors(Post.objects.filter(pk=instance.pk))
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def refresh_search_vector_on_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    """Tag names are part of the vector, so re-index when tags are (un)assigned"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        update_search_vectors(Post.objects.filter(pk=instance.pk))
+    elif pk_set:
+        update_search_vectors(Post.objects.filter(pk__in=pk_set))
+
+
+@receiver(post_save, sender=Category)
+def refresh_search_vector_on_category(sender, instance, created, **kwargs):
+    """Keep vectors in step when a category is renamed"""
+    if not created:
+        update_search_vectors(instance.posts.all())
+
+
+@receiver(post_save, sender=Tag)
+def refresh_search_vector_on_tag(sender, instance, created, **kwargs):
+    """Keep vectors in step when a tag is renamed"""
+    if not created:
+        update_search_vectors(instance.posts.all())
+
+
+@receiver(pre_save, sender=Post)
+def remember_stored_fields(sender, instance, update_fields=None, **kwargs):
+    """Note the stored status and category so post_save receivers can tell whether they change"""
+    instance._stored_before = None
+    if instance._state.adding:
+        return
+    if update_fields is not None and not RELATED_FIELDS.intersection(update_fields):
+        return
+    instance._stored_before = Post.objects.filter(pk=instance.pk).values_list('status', 'category_id').first()
+
+
+@receiver(post_save, sender=Post)
+def refresh_related_posts(sender, instance, created, update_fields=None, **kwargs):
+    """Re-score a post's related posts when its category or status changed"""
+    if update_fields is not None and not RELATED_FIELDS.intersection(update_fields):
+        return
+    if not created and getattr(instance, '_stored_before', None) == (instance.status, instance.category_id):
+        return
+    update_related_posts(instance)
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def refresh_related_posts_on_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    """Shared tags drive the related score, so re-score on (un)assignment"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    # add() and remove() report only the tags that actually changed
+    if action != 'post_clear' and not pk_set:
+        return
+    if not reverse:
+        update_related_posts(instance)
+    elif pk_set:
+        for post in Post.objects.filter(pk__in=pk_set):
+            update_related_posts(post)
+
+
+def _purge_on_commit(*tags):
+    transaction.on_commit(lambda: purge_page_tags(*tags))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def purge_post_pages_on_change(sender, instance, **kwargs):
+    """Drop cached pages showing the post, its category and its tags"""
+    tag_ids = Post.tags.through.objects.filter(post_id=instance.pk).values_list('tag_id', flat=True)
+    tags = [page_tag('post', instance.pk), SITE, *(page_tag('tag', tag_id) for tag_id in tag_ids)]
+    if instance.category_id is not None:
+        tags.append(page_tag('category', instance.category_id))
+    _purge_on_commit(*tags)
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def purge_post_pages_on_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    """Drop cached pages of the post and of the tags it gained or lost"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    # On clear, tag pages that listed the post depend on its own tag
+    if not reverse:
+        tags = [page_tag('post', instance.pk), *(page_tag('tag', pk) for pk in pk_set or ())]
+    else:
+        tags = [page_tag('tag', instance.pk), *(page_tag('post', pk) for pk in pk_set or ())]
+    _purge_on_commit(SITE, *tags)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_save, sender=Like)
+@receiver(post_delete, sender=Like)
+def purge_post_pages_on_activity(sender, instance, **kwargs):
+    """Comments and likes change the post's page and the counts on its cards"""
+    _purge_on_commit(SITE, page_tag('post', instance.post_id))
+
+
+@receiver(post_save, sender=Category)
+@receiver(pre_delete, sender=Category)
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def purge_taxonomy_pages(sender, instance, **kwargs):
+    """Drop cached pages of a category or tag and of the posts showing its name"""
+    # Read before a delete detaches the posts
+    post_ids = list(instance.posts.values_list('id', flat=True))
+    kind = 'category' if sender is Category else 'tag'
+    _purge_on_commit(SITE, page_tag(kind, instance.pk), *(page_tag('post', pk) for pk in post_ids))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Like)
+@receiver(post_delete, sender=Like)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_site_stats(sender, instance, created=None, **kwargs):
+    """Mark the cached site counters as behind when something they count changes"""
+    # Renaming a category or tag changes no count
+    if sender in (Category, Tag) and created is False:
+        return
+    # Post counts only change when a post is (un)published (see remember_stored_fields)
+    if sender is Post and created is False:
+        stored = getattr(instance, '_stored_before', None)
+        if stored is None or stored[0] == instance.status:
+            return
+    transaction.on_commit(site_stats.invalidate)
+
+
+@receiver(post_save, sender=Post)
+def refresh_image_variants(sender, instance, update_fields=None, **kwargs):
+    """Build resized copies of a newly uploaded or replaced post image"""
+    if update_fields is not None and 'image' not in update_fields:
+        return
+    refresh_variants(instance, 'image', 'image_variants', POST_IMAGE_WIDTHS)
+
+
+@receiver(post_delete, sender=Post)
+def delete_image_variants(sender, instance, **kwargs):
+    """Resized copies belong to the post; the original is left alone as before"""
+    delete_variants(instance.image.storage, instance.image_variants)
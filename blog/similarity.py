@@ -0,0 +1,118 @@
+"""
+Content similarity for related posts
+
+Posts are turned into L2-normalised TF-IDF vectors over their title and body,
+and each post's nearest neighbours by cosine similarity are found with batched
+sparse matrix products with NumPy and SciPy. Only the
+rebuild_content_similarity command imports this module, so web processes
+never load them.
+"""
+import re
+from array import array
+from collections import Counter
+
+import numpy as np
+from scipy import sparse
+
+from . utils import html_to_text
+
+TOKEN_RE = re.compile(r'[a-z][a-z0-9]+')
+
+# A title term counts as this many body occurrences
+TITLE_WEIGHT = 3
+
+# Vocabulary pruning: drop terms in fewer than MIN_DF posts or in more than
+# MAX_DF of them, then keep the MAX_FEATURES most common
+MIN_DF = 2
+MAX_DF = 0.5
+MAX_FEATURES = 50000
+
+# Each post keeps only its highest-weighted terms, which keeps the similarity
+# products sparse; the dropped tail barely moves cosine rankings
+TERMS_PER_POST = 40
+
+# Neighbours less similar than this are not stored
+MIN_SIMILARITY = 0.05
+
+
+def term_counts(title, content):
+    counts = Counter(TOKEN_RE.findall(html_to_text(content).lower()))
+    for term in TOKEN_RE.findall(title.lower()):
+        counts[term] += TITLE_WEIGHT
+    return counts
+
+
+def build_tfidf(documents):
+    """
+    TF-IDF matrix for an iterable of (title, content) pairs, one row per
+    document, with sublinear term frequency and smoothed idf. Returns the CSR
+    matrix and the number of terms kept.
+    """
+    vocabulary = {}
+    indices = array('i')
+    counts = array('f')
+    indptr = array('q', [0])
+    for title, content in documents:
+        for term, count in term_counts(title, content).items():
+            indices.append(vocabulary.setdefault(term, len(vocabulary)))
+            counts.append(count)
+        indptr.append(len(indices))
+
+    n_docs = len(indptr) - 1
+    matrix = sparse.csr_matrix(
+        (np.frombuffer(counts, dtype=np.float32),
+         np.frombuffer(indices, dtype=np.int32),
+         np.frombuffer(indptr, dtype=np.int64)),
+        shape=(n_docs, len(vocabulary)),
+    )
+
+    doc_freq = np.bincount(matrix.indices, minlength=matrix.shape[1])
+    keep = np.flatnonzero((doc_freq >= MIN_DF) & (doc_freq <= max(MIN_DF, MAX_DF * n_docs)))
+    if len(keep) > MAX_FEATURES:
+        keep = keep[np.argsort(-doc_freq[keep], kind='stable')[:MAX_FEATURES]]
+    matrix = matrix[:, keep].tocsr()
+
+    matrix.data = 1 + np.log(matrix.data)
+    idf = np.log((1 + n_docs) / (1 + doc_freq[keep])) + 1
+    matrix = matrix @ sparse.diags(idf.astype(np.float32))
+
+    matrix = matrix.tocsr()
+    for row in range(n_docs):
+        begin, end = matrix.indptr[row], matrix.indptr[row + 1]
+        if end - begin > TERMS_PER_POST:
+            weights = matrix.data[begin:end]
+            weights[np.argpartition(weights, end - begin - TERMS_PER_POST)[:end - begin - TERMS_PER_POST]] = 0
+    matrix.eliminate_zeros()
+
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    matrix = sparse.diags((1 / norms).astype(np.float32)) @ matrix
+    return matrix.tocsr(), len(keep)
+
+
+def nearest_neighbours(matrix, rows, k, batch_size=256):
+    """
+    Yield (row, top_rows, top_scores, similar_rows, similar_scores) for each
+    of `rows`: its k nearest neighbours best first, and every row at least
+    MIN_SIMILARITY similar to it. Similarities are computed batch_size rows at
+    a time as one sparse product against the whole matrix.
+    """
+    transposed = matrix.T.tocsr()
+    rows = np.asarray(rows, dtype=np.int64)
+
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        product = (matrix[batch] @ transposed).tocsr()
+
+        for index, row in enumerate(batch):
+            begin, end = product.indptr[index], product.indptr[index + 1]
+            similar_rows = product.indices[begin:end]
+            similar_scores = product.data[begin:end]
+            wanted = (similar_rows != row) & (similar_scores >= MIN_SIMILARITY)
+            similar_rows, similar_scores = similar_rows[wanted], similar_scores[wanted]
+
+            top = np.arange(len(similar_rows))
+            if len(top) > k:
+                top = np.argpartition(-similar_scores, k - 1)[:k]
+            top = top[np.argsort(-similar_scores[top], kind='stable')]
+            yield int(row), similar_rows[top], similar_scores[top], similar_rows, similar_scores
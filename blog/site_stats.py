@@ -0,0 +1,79 @@
+"""
+Site-wide counters for the homepage hero and the about page
+
+SiteStats keeps every counter in one cached row, so a page reads them with a
+single cache lookup. Changes to what it counts (posts created, deleted or
+(un)published, likes, categories and tags created or deleted, like count
+flushes; see blog.signals) bump a version instead of dropping the row. A read
+rebuilds the row with three queries once its version is behind and it is
+older than SITE_STATS_REFRESH_SECONDS, so a busy site recomputes at most
+that often rather than on every like. The version is read before computing
+and stored with the row, so a change landing while the counters are being
+computed leaves the row behind and gets picked up by the next rebuild. The
+row also expires after SITE_STATS_SECONDS, which keeps the rolling "last 7
+days" count current.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+RECENT_DAYS = 7
+
+
+class SiteStats:
+    key = 'site-stats'
+    version_key = 'site-stats-version'
+
+    def compute(self):
+        """Counters straight from the database"""
+        from . models import Category, Post, Tag
+
+        seven_days_ago = timezone.now() - timedelta(days=RECENT_DAYS)
+        stats = Post.objects.published().aggregate(
+            total_posts=Count('id'),
+            total_authors=Count('author', distinct=True),
+            total_likes=Sum('like_count'),
+            recent_posts=Count('id', filter=Q(created_at__gte=seven_days_ago)),
+            liked_posts=Count('id', filter=Q(like_count__gt=0)),
+        )
+        stats['total_likes'] = stats['total_likes'] or 0
+        stats['total_categories'] = Category.objects.count()
+        stats['total_tags'] = Tag.objects.count()
+        return stats
+
+    def version(self):
+        cache.add(self.version_key, 0, None)
+        return cache.get(self.version_key)
+
+    def get(self):
+        """Cached counters, recomputed when missing or behind and due"""
+        entry = cache.get(self.key)
+        if entry is not None:
+            fresh = entry['version'] == self.version()
+            age = time.time() - entry['computed_at']
+            if fresh or age < getattr(settings, 'SITE_STATS_REFRESH_SECONDS', 10):
+                return entry['stats']
+
+        version = self.version()
+        stats = self.compute()
+        cache.set(self.key, {
+            'stats': stats,
+            # Read before computing, so a change made meanwhile is not marked as seen
+            'version': version,
+            'computed_at': time.time(),
+        }, getattr(settings, 'SITE_STATS_SECONDS', 300))
+        return stats
+
+    def invalidate(self):
+        """Mark the counters as behind the database"""
+        try:
+            cache.incr(self.version_key)
+        except ValueError:
+            cache.add(self.version_key, 1, None)
+
+
+site_stats = SiteStats()
@@ -1,6 +1,9 @@
 from django import template
-from django.utils.html import strip_tags
-import html
+from django.utils.html import escape, format_html, format_html_join
+from django.utils.safestring import mark_safe
+from blog.fragment_cache import render_card
+from blog.search import HIGHLIGHT_START, HIGHLIGHT_STOP
+from blog.utils import html_to_text, truncate_words
 
 register = template.Library()
 
@@ -14,18 +17,90 @@ def clean_excerpt(value, word_count=30):
     if not value:
         return ''
     
-    # First decode HTML entities (&nbsp; -> space, &amp; -> &, etc.)
-    decoded = html.unescape(str(value))
-    
-    # Then strip HTML tags
-    stripped = strip_tags(decoded)
-    
-    # Clean up extra whitespace
-    cleaned = ' '.join(stripped.split())
+    return truncate_words(html_to_text(value), word_count)
+
+
+@register.filter(name='truncate_excerpt')
+def truncate_excerpt(value, word_count=30):
+    """
+    Truncate a stored plain-text excerpt without re-parsing any HTML.
+    Usage: {{ post.excerpt|truncate_excerpt:25 }}
+    """
+    if not value:
+        return ''
     
-    # Truncate to word count
-    words = cleaned.split()
-    if len(words) > word_count:
-        return ' '.join(words[:word_count]) + '...'
+    return truncate_words(str(value), word_count)
+
+
+@register.filter(name='highlight_snippet')
+def highlight_snippet(value):
+    """
+    Render a search headline as escaped text with matches wrapped in <mark>.
+    Usage: {{ post.headline|highlight_snippet }}
+    """
+    if not value:
+        return ''
     
-    return cleaned
+    text = escape(html_to_text(value))
+    return mark_safe(text.replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_STOP, '</mark>'))
+
+
+@register.simple_tag(name='responsive_image')
+def responsive_image(image, variants, sizes='100vw', **attrs):
+    """
+    Render an image as a <picture> with WebP and JPEG srcsets built from its
+    stored variants (see core.images), or as a plain <img> of the original
+    when it has none. Keyword arguments become <img> attributes.
+    Usage: {% responsive_image post.image post.image_variants sizes="(max-width: 768px) 100vw, 400px" alt=post.title class="post-card-image" %}
+    """
+    if not image:
+        return ''
+    attributes = format_html_join('', ' {}="{}"', attrs.items())
+
+    variants = variants or {}
+    if variants.get('source') != image.name or not variants.get('webp'):
+        return format_html('<img src="{}"{}>', image.url, attributes)
+
+    storage = image.storage
+    webp = ', '.join(f'{storage.url(name)} {width}w' for width, name in variants['webp'])
+    jpeg = ', '.join(f'{storage.url(name)} {width}w' for width, name in variants['jpeg'])
+    return format_html(
+        '<picture class="responsive-image">'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}"{}>'
+        '</picture>',
+        webp, sizes, storage.url(variants['jpeg'][-1][1]), jpeg, sizes, attributes,
+    )
+
+
+class CardCacheNode(template.Node):
+    def __init__(self, nodelist, variant, post, vary_on):
+        self.nodelist = nodelist
+        self.variant = variant
+        self.post = post
+        self.vary_on = vary_on
+
+    def render(self, context):
+        post = self.post.resolve(context)
+        vary_on = [value.resolve(context) for value in self.vary_on]
+        html = render_card(
+            self.variant.resolve(context), post, vary_on,
+            lambda: self.nodelist.render(context),
+        )
+        return mark_safe(html)
+
+
+@register.tag(name='cardcache')
+def cardcache(parser, token):
+    """
+    Cache a post card fragment, keyed on the post's id, updated_at, like and
+    comment counts plus any extra values.
+    Usage: {% cardcache 'listing' post show_category %}...{% endcardcache %}
+    """
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' tag requires a variant name and a post")
+    nodelist = parser.parse(('endcardcache',))
+    parser.delete_first_token()
+    variant, post, *vary_on = [parser.compile_filter(bit) for bit in bits[1:]]
+    return CardCacheNode(nodelist, variant, post, vary_on)
@@ -1,3 +1,899 @@
-from django.test import TestCase
+import io
+import random
+import threading
+import time
+from unittest import mock, skipIf
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.cache import caches
+from django.db import connection
+from django.db.models import F
+from django.template import Context, Template
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from core.jobs import claim_next, run
+from core.models import Job
+
+from . comments import load_comment_thread
+from . conditional import build_version
+from . fragment_cache import card_stats
+from . like_buffer import like_buffer
+from . models import Category, Comment, Like, Post, RelatedPost, Tag
+from . pagination import LISTING_ORDERING, MOST_LIKED_ORDERING, CursorPaginator, encode_cursor
+from . related import CONTENT, RELATED_POSTS_STORED, TAXONOMY
+from . search import HIGHLIGHT_START, HIGHLIGHT_STOP, search_posts, suggest
+from . similarity import build_tfidf
+from . site_stats import site_stats
+
+
+def clear_caches():
+    """Start from cold page, card and counter caches"""
+    for cache in caches.all():
+        cache.clear()
+
+
+def run_jobs():
+    while (claimed := claim_next()) is not None:
+        run(claimed)
+
+
+def create_posts(author, count, category=None, tags=(), **fields):
+    posts = []
+    for _ in range(count):
+        number = Post.objects.count() + 1
+        post = Post.objects.create(
+            title=f'Post {number}', author=author, content=f'<p>Body of post {number}</p>',
+            status='published', category=category, **fields,
+        )
+        post.tags.add(*tags)
+        posts.append(post)
+    return posts
+
+
+class ListingQueryCountTests(TestCase):
+    """The homepage and listings run a fixed number of queries however many posts exist"""
+
+    def setUp(self):
+        clear_caches()
+        self.author = User.objects.create_user('author', password='pw')
+        self.category = Category.objects.create(name='Python')
+        self.tag = Tag.objects.create(name='django')
+
+    def count_queries(self, url):
+        clear_caches()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_posts(self):
+        urls = {
+            reverse('blog:post_list'): 6,
+            reverse('blog:latest_posts'): 2,
+            reverse('blog:recent_posts'): 2,
+            reverse('blog:most_liked_posts'): 2,
+            reverse('blog:category_detail', args=[self.category.slug]): 3,
+            reverse('blog:tag_detail', args=[self.tag.slug]): 3,
+        }
+        create_posts(self.author, 3, self.category, [self.tag])
+        few = {url: self.count_queries(url) for url in urls}
+
+        create_posts(self.author, 30, self.category, [self.tag])
+        create_posts(self.author, 2, self.category, [self.tag], is_featured=True)
+        for url, limit in urls.items():
+            with self.subTest(url=url):
+                many = self.count_queries(url)
+                self.assertEqual(many, few[url])
+                self.assertLessEqual(many, limit)
+
+
+class CursorPaginationTests(TestCase):
+    def setUp(self):
+        author = User.objects.create_user('author', password='pw')
+        rng = random.Random(9)
+        create_posts(author, 30)
+        # Repeated counts, so pages split runs of equal like_count
+        for post in Post.objects.all():
+            Post.objects.filter(pk=post.pk).update(like_count=rng.randint(0, 2))
+
+    def paginator(self, ordering=MOST_LIKED_ORDERING):
+        return CursorPaginator(Post.objects.order_by(*ordering), 7, ordering)
+
+    def expected_pages(self, ordering=MOST_LIKED_ORDERING):
+        ids = list(Post.objects.order_by(*ordering).values_list('id', flat=True))
+        return [ids[start:start + 7] for start in range(0, len(ids), 7)]
+
+    def ids(self, page):
+        return [post.id for post in page]
+
+    def test_next_and_previous_walk_every_page(self):
+        for ordering in (LISTING_ORDERING, MOST_LIKED_ORDERING):
+            with self.subTest(ordering=ordering):
+                expected = self.expected_pages(ordering)
+                page = self.paginator(ordering).get_page(None)
+                for number, ids in enumerate(expected, 1):
+                    self.assertEqual((page.number, self.ids(page)), (number, ids))
+                    self.assertEqual(page.has_next(), number < len(expected))
+                    self.assertEqual(page.has_previous(), number > 1)
+                    if page.has_next():
+                        page = self.paginator(ordering).get_page(page.next_cursor)
+                for number, ids in reversed(list(enumerate(expected, 1))):
+                    self.assertEqual((page.number, self.ids(page)), (number, ids))
+                    if page.has_previous():
+                        page = self.paginator(ordering).get_page(page.previous_cursor)
+                self.assertEqual((page.start_index(), page.end_index()), (1, 7))
+
+    def test_last_cursor_shows_the_final_partial_page(self):
+        expected = self.expected_pages()
+        page = self.paginator().get_page(self.paginator().get_page(None).last_cursor)
+        self.assertEqual((page.number, self.ids(page)), (5, expected[-1]))
+        self.assertEqual((page.start_index(), page.end_index()), (29, 30))
+        self.assertFalse(page.has_next())
+        page = self.paginator().get_page(page.previous_cursor)
+        self.assertEqual((page.number, self.ids(page)), (4, expected[-2]))
+
+    def test_client_supplied_totals_and_page_numbers_are_not_trusted(self):
+        second = self.paginator().get_page(self.paginator().get_page(None).next_cursor)
+        for payload in [
+            {'d': 'next', 'n': 500, 't': 9999, 'k': second.paginator.key(second[-1])},
+            {'d': 'last', 'n': 2, 't': 3},
+        ]:
+            with self.subTest(payload=payload):
+                page = self.paginator().get_page(encode_cursor(payload))
+                self.assertEqual(page.paginator.count, 30)
+                self.assertLessEqual(page.number, page.paginator.num_pages)
+
+    def test_malformed_cursors_give_the_first_page(self):
+        first = self.expected_pages()[0]
+        tokens = ['', '!!!', 'e30', 'bnVsbA', encode_cursor([]), encode_cursor('next'), '[' * 50000]
+        for payload in [
+            {'d': 'sideways'},
+            {'d': 'next'},
+            {'d': 'next', 'k': [1, 2]},
+            {'d': 'next', 'k': 'abc'},
+            {'d': 'next', 'k': [{'x': 1}, {'dt': '2020-01-01T00:00:00+00:00'}, 3]},
+            {'d': 'next', 'k': [1, {'dt': 'yesterday'}, 3]},
+            {'d': 'next', 'k': ['many', {'dt': '2020-01-01T00:00:00+00:00'}, 3]},
+            {'d': 'next', 'k': [None, None, None]},
+            {'d': 'next', 'k': [0, {'dt': '2020-01-01T00:00:00+00:00'}, 3], 'n': 0},
+            {'d': 'next', 'k': [0, {'dt': '2020-01-01T00:00:00+00:00'}, 3], 'n': True},
+            {'d': 'next', 'k': [0, {'dt': '2020-01-01T00:00:00+00:00'}, 3], 'n': '2'},
+            {'d': 'prev', 'k': [9, {'dt': '2999-01-01T00:00:00+00:00'}, 10 ** 6]},
+            {'d': 'next', 'k': [-1, {'dt': '1970-01-01T00:00:00+00:00'}, 0]},
+        ]:
+            tokens.append(encode_cursor(payload))
+        for token in tokens:
+            with self.subTest(token=token[:80]):
+                page = self.paginator().get_page(token)
+                self.assertEqual((page.number, self.ids(page)), (1, first))
+                self.assertFalse(page.has_previous())
+        for token in tokens:
+            with self.subTest(view=token[:80]):
+                self.assertEqual(self.client.get(reverse('blog:most_liked_posts'), {'cursor': token}).status_code, 200)
+
+
+@skipIf(connection.vendor == 'sqlite', 'SQLite locks whole tables, so concurrent writers fail instead of waiting')
+@override_settings(LIKE_BUFFER_ENABLED=False)
+class ConcurrentLikeTests(TransactionTestCase):
+    """Toggles racing on one post leave like_count equal to its Like rows"""
+
+    def run_concurrently(self, calls):
+        barrier = threading.Barrier(len(calls))
+        errors = []
+
+        def run(call):
+            try:
+                barrier.wait()
+                call()
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=[call]) for call in calls]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_like_count_matches_like_rows(self):
+        author = User.objects.create_user('author', password='pw')
+        post = Post.objects.create(title='Hot', author=author, content='<p>Body</p>', status='published')
+        users = [User.objects.create_user(f'reader{number}', password='pw') for number in range(12)]
+        # Half the readers already like it and will unlike it; the rest like it,
+        # and every reader toggles twice from two requests at once
+        for user in users[:6]:
+            post.toggle_like(user)
+
+        def toggle(user):
+            return lambda: Post.objects.get(pk=post.pk).toggle_like(user)
+
+        self.run_concurrently([toggle(user) for user in users for _ in range(2)])
+        post.refresh_from_db()
+        self.assertEqual(post.like_count, Like.objects.filter(post=post).count())
+
+        self.run_concurrently([toggle(user) for user in users])
+        post.refresh_from_db()
+        self.assertEqual(post.like_count, Like.objects.filter(post=post).count())
+
+
+@override_settings(LIKE_BUFFER_ENABLED=True, LIKE_BUFFER_FLUSH_MS=60000, LIKE_BUFFER_MAX_EVENTS=1000)
+class LikeBufferTests(TestCase):
+    def setUp(self):
+        author = User.objects.create_user('author', password='pw')
+        self.post = Post.objects.create(title='Hot', author=author, content='<p>Body</p>', status='published')
+        self.readers = [User.objects.create_user(f'reader{number}', password='pw') for number in range(4)]
+        self.addCleanup(like_buffer.flush)
+
+    def toggle(self, user):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.post.toggle_like(user)
+
+    def stored_count(self):
+        self.post.refresh_from_db()
+        return self.post.like_count
+
+    def test_flush_writes_buffered_likes_in_one_update(self):
+        for reader in self.readers:
+            self.assertEqual(self.toggle(reader), (True, self.readers.index(reader) + 1))
+        self.assertEqual(self.stored_count(), 0)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(like_buffer.flush(), 1)
+        self.assertEqual([query['sql'].split()[0] for query in queries if 'SAVEPOINT' not in query['sql']], ['UPDATE'])
+        self.assertEqual(self.stored_count(), 4)
+
+    def test_reconcile_while_buffering(self):
+        for reader in self.readers[:3]:
+            self.toggle(reader)
+        Post.objects.filter(pk=self.post.pk).update(like_count=10)
+        call_command('reconcile_like_counts', stdout=io.StringIO())
+        self.assertEqual(self.stored_count(), 3)
+
+        # Another process still holding a delta for a like the recount saw
+        # must not count it again when it flushes
+        self.toggle(self.readers[3])
+        with mock.patch.object(like_buffer, 'flush'):
+            call_command('reconcile_like_counts', stdout=io.StringIO())
+        self.assertEqual(self.stored_count(), 4)
+        like_buffer.flush()
+        self.assertEqual(self.stored_count(), 4)
+
+
+class LatestPerCategoryTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.author = User.objects.create_user('author', password='pw')
+
+    def test_latest_posts_of_every_category_in_one_query(self):
+        categories = [Category.objects.create(name=f'Category {number}') for number in range(4)]
+        expected = {}
+        for count, category in enumerate(categories, start=2):
+            posts = create_posts(self.author, count, category)
+            Post.objects.create(title=f'Draft in {category.name}', author=self.author, content='x', category=category)
+            expected[category.id] = [post.id for post in reversed(posts)][:3]
+        create_posts(self.author, 2)
+
+        with self.assertNumQueries(1):
+            rows = list(Post.objects.published().cards().latest_per_category(3))
+        latest = {}
+        for post in rows:
+            latest.setdefault(post.category_id, []).append(post.id)
+        self.assertEqual(latest, expected)
+
+    def test_category_list_query_count_does_not_grow_with_categories(self):
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse('blog:category_list'))
+            self.assertEqual(response.status_code, 200)
+            return len(queries)
+
+        for number in range(2):
+            create_posts(self.author, 6, Category.objects.create(name=f'Small {number}'))
+        few = count_queries()
+        for number in range(20):
+            create_posts(self.author, 6, Category.objects.create(name=f'Large {number}'))
+        self.assertEqual(count_queries(), few)
+
+
+class CommentThreadQueryCountTests(TestCase):
+    """Post pages and comment pages cost the same with 3 comments as with 1,000"""
+
+    def setUp(self):
+        clear_caches()
+        self.author = User.objects.create_user('author', password='pw')
+        self.readers = [User.objects.create_user(f'reader{number}', password='pw') for number in range(5)]
+        self.post = Post.objects.create(title='Busy', author=self.author, content='<p>Body</p>', status='published')
+
+    def add_comments(self, count):
+        top_level = Comment.objects.bulk_create([
+            Comment(post=self.post, author=self.readers[number % 5], content=f'Comment {number}')
+            for number in range(count)
+        ])
+        # Every other comment gets a reply, and that reply a reply of its own
+        replies = Comment.objects.bulk_create([
+            Comment(post=self.post, author=self.readers[0], parent=comment, content='Reply')
+            for comment in top_level[::2]
+        ])
+        Comment.objects.bulk_create([
+            Comment(post=self.post, author=self.readers[1], parent=reply, content='Nested reply')
+            for reply in replies
+        ])
+        return top_level
+
+    def count_queries(self, url):
+        clear_caches()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_comments(self):
+        detail = reverse('blog:post_detail', args=[self.post.slug])
+        comments = reverse('blog:comment_list', args=[self.post.slug])
+        first = self.add_comments(3)[0]
+        few = [
+            self.count_queries(detail),
+            self.count_queries(comments),
+            self.count_queries(f'{comments}?parent={first.id}'),
+        ]
+
+        first = self.add_comments(1000)[0]
+        many = [
+            self.count_queries(detail),
+            self.count_queries(comments),
+            self.count_queries(f'{comments}?parent={first.id}'),
+        ]
+        self.assertEqual(many, few)
+
+    def test_reply_thread_is_loaded_whole_in_one_query(self):
+        root, other = Comment.objects.bulk_create([
+            Comment(post=self.post, author=self.author, content=content) for content in ('Root', 'Other')
+        ])
+        Comment.objects.create(post=self.post, author=self.author, parent=other, content='Elsewhere')
+        # Each new reply answers one of the earlier comments of the thread
+        thread = [root]
+        for number in range(1000):
+            thread.append(Comment.objects.create(
+                post=self.post, author=self.readers[number % 5], parent=thread[number // 3], content=f'Reply {number}',
+            ))
+
+        with self.assertNumQueries(1):
+            replies = load_comment_thread(root)
+            authors = {reply.author.username for reply in replies}
+        self.assertEqual(authors, {reader.username for reader in self.readers})
+        self.assertCountEqual([reply.id for reply in replies], [reply.id for reply in thread[1:]])
+        # Depth-first: every reply comes after its parent
+        seen = {root.id}
+        for reply in replies:
+            self.assertIn(reply.parent_id, seen)
+            seen.add(reply.id)
+        self.assertEqual([child.id for child in root.children], [reply.id for reply in thread[1:4]])
+
+        response = self.client.get(reverse('blog:comment_list', args=[self.post.slug]), {'parent': root.id})
+        self.assertEqual([data['comment_id'] for data in response.json()['comments']], [reply.id for reply in replies])
+
+
+@override_settings(JOB_WORKER=True)
+class RelatedPostsTests(TestCase):
+    """The incrementally maintained index matches scores computed from scratch"""
+
+    def setUp(self):
+        self.random = random.Random(13)
+        self.author = User.objects.create_user('author', password='pw')
+        self.categories = [Category.objects.create(name=f'Category {number}') for number in range(3)]
+        self.tags = [Tag.objects.create(name=f'tag{number}') for number in range(6)]
+
+    def expected(self, post):
+        tag_ids = set(post.tags.values_list('id', flat=True))
+        scores = []
+        for other in Post.objects.published().exclude(pk=post.pk).prefetch_related('tags'):
+            score = len(tag_ids & {tag.id for tag in other.tags.all()})
+            if post.category_id is not None and other.category_id == post.category_id:
+                score += 1
+            if score:
+                scores.append((score, other.id))
+        return [(other_id, float(score)) for score, other_id in sorted(scores, reverse=True)[:RELATED_POSTS_STORED]]
+
+    def assert_index_accurate(self):
+        run_jobs()
+        for post in Post.objects.all():
+            stored = list(RelatedPost.objects.filter(post=post, kind=TAXONOMY).order_by(
+                '-score', '-related_post_id',
+            ).values_list('related_post_id', 'score'))
+            self.assertEqual(stored, self.expected(post), post.title)
+
+    def create_random_posts(self, count):
+        for number in range(count):
+            post = Post.objects.create(
+                title=f'Post {number}', author=self.author, content='<p>Body</p>',
+                status=self.random.choice(['published', 'published', 'draft']),
+                category=self.random.choice([*self.categories, None]),
+            )
+            post.tags.set(self.random.sample(self.tags, self.random.randint(0, 3)))
+
+    def edit_randomly(self, count):
+        posts = list(Post.objects.all())
+        for _ in range(count):
+            post = self.random.choice(posts)
+            change = self.random.choice(['tags', 'add_tag', 'category', 'status'])
+            if change == 'tags':
+                post.tags.set(self.random.sample(self.tags, self.random.randint(0, 3)))
+            elif change == 'add_tag':
+                self.random.choice(self.tags).posts.add(post)
+            elif change == 'category':
+                post.category = self.random.choice([*self.categories, None])
+                post.save()
+            else:
+                post.status = 'draft' if post.status == 'published' else 'published'
+                post.save()
+
+    def test_index_matches_scores_after_random_edits(self):
+        self.create_random_posts(30)
+        self.assert_index_accurate()
+        self.edit_randomly(40)
+        self.assert_index_accurate()
+
+    @override_settings(JOB_WORKER=False)
+    def test_neighbour_lists_are_updated_inline_without_a_worker(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_random_posts(20)
+            self.edit_randomly(20)
+        self.assertFalse(Job.objects.exists())
+        self.assert_index_accurate()
+
+    def test_saves_without_taxonomy_changes_do_not_rescore(self):
+        post = Post.objects.create(
+            title='Post', author=self.author, content='<p>Body</p>', status='published', category=self.categories[0],
+        )
+        post.tags.set(self.tags[:2])
+        run_jobs()
+
+        post.title = 'Renamed'
+        post.save()
+        post.tags.add(*self.tags[:2])
+        post.save(update_fields=['content'])
+        self.assertFalse(Job.objects.exists())
+
+
+class ContentSimilarityTests(TestCase):
+    TOPICS = {
+        'python': 'python django queryset migration interpreter decorator generator asyncio pytest virtualenv',
+        'cooking': 'recipe oven flour butter simmer garlic roast dough saucepan knead',
+        'astronomy': 'telescope galaxy nebula orbit comet eclipse planet asteroid supernova parallax',
+    }
+
+    def setUp(self):
+        self.random = random.Random(21)
+        self.author = User.objects.create_user('author', password='pw')
+        self.topic_of, self.words = {}, {}
+        for number in range(30):
+            self.create(f'Post {number}', self.random.choice(list(self.TOPICS)))
+
+    def create(self, title, topic, status='published', words=None):
+        words = words or ' '.join(self.random.sample(self.TOPICS[topic].split(), 5))
+        # Words every post shares carry no signal and are pruned
+        post = Post.objects.create(
+            title=title, author=self.author, content=f'<p>Notes for today: {words}</p>', status=status,
+        )
+        self.topic_of[post.id] = topic
+        self.words[post.id] = words
+        return post
+
+    def rebuild(self, *args):
+        call_command('rebuild_content_similarity', *args, stdout=io.StringIO())
+
+    def stored(self):
+        lists = {}
+        for post_id, related_id, score in RelatedPost.objects.filter(kind=CONTENT).order_by(
+            'post_id', '-score', '-related_post_id',
+        ).values_list('post_id', 'related_post_id', 'score'):
+            lists.setdefault(post_id, []).append((related_id, score))
+        return lists
+
+    def test_vectors_are_unit_length_and_skip_rare_and_common_terms(self):
+        matrix, terms = build_tfidf([
+            ('Python', '<p>notes python django</p>'),
+            ('Python', '<p>notes python unique</p>'),
+            ('Cooking', '<p>notes django oven</p>'),
+        ])
+        # "notes" is in every post and "unique" and "oven" in one only
+        self.assertEqual(terms, 2)
+        self.assertEqual(matrix.shape, (3, 2))
+        self.assertTrue(np.allclose(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel(), 1))
+
+    def test_rebuild_stores_the_most_similar_published_posts(self):
+        draft = self.create('Draft', 'python', status='draft')
+        self.rebuild('--top-k', '5')
+
+        ids = list(Post.objects.published().order_by('pk').values_list('pk', flat=True))
+        matrix, _ = build_tfidf(Post.objects.published().order_by('pk').values_list('title', 'content'))
+        similarity = (matrix @ matrix.T).toarray()
+        stored = self.stored()
+        self.assertNotIn(draft.id, stored)
+        self.assertEqual(set(stored), set(ids))
+        for row, post_id in enumerate(ids):
+            with self.subTest(post=post_id):
+                scores = {ids[other]: similarity[row, other] for other in range(len(ids)) if other != row}
+                best = sorted(scores.values(), reverse=True)[:5]
+                self.assertEqual(len(stored[post_id]), 5)
+                for related_id, score in stored[post_id]:
+                    self.assertAlmostEqual(score, scores[related_id], places=5)
+                    self.assertEqual(self.topic_of[related_id], self.topic_of[post_id])
+                self.assertTrue(np.allclose([score for _, score in stored[post_id]], best, atol=1e-5))
+
+    def test_new_posts_are_added_to_existing_lists(self):
+        self.rebuild('--top-k', '3')
+        before = self.stored()
+        original = Post.objects.published().order_by('pk').first()
+        copy = self.create(original.title, self.topic_of[original.id], words=self.words[original.id])
+
+        self.rebuild('--new', '--top-k', '3')
+        after = self.stored()
+        self.assertEqual(after[copy.id][0][0], original.id)
+        self.assertEqual(after[original.id][0][0], copy.id)
+        self.assertTrue(all(len(neighbours) <= 3 for neighbours in after.values()))
+        # Lists the new post did not enter are left alone
+        for post_id, neighbours in before.items():
+            if copy.id not in dict(after[post_id]):
+                self.assertEqual(after[post_id], neighbours)
+
+
+@override_settings(LIKE_BUFFER_ENABLED=False, SITE_STATS_REFRESH_SECONDS=0)
+class SiteStatsTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.random = random.Random(18)
+        self.users = [User.objects.create_user(f'user{number}', password='pw') for number in range(4)]
+
+    def mutate(self, step):
+        posts = list(Post.objects.all())
+        post = self.random.choice(posts) if posts else None
+        change = self.random.choice([
+            'create', 'create', 'like', 'like', 'publish', 'unpublish', 'delete', 'edit',
+            'category', 'delete_category', 'tag', 'delete_tag', 'comment',
+        ])
+        if change == 'create' or post is None:
+            Post.objects.create(
+                title=f'Post {step}', author=self.random.choice(self.users), content='<p>Body</p>',
+                status=self.random.choice(['draft', 'published']),
+            )
+        elif change == 'like':
+            post.toggle_like(self.random.choice(self.users))
+        elif change in ('publish', 'unpublish'):
+            post.status = 'published' if change == 'publish' else 'draft'
+            post.save()
+        elif change == 'delete':
+            post.delete()
+        elif change == 'edit':
+            post.title = f'Edited {step}'
+            post.save()
+        elif change == 'category':
+            Category.objects.create(name=f'Category {step}')
+        elif change == 'tag':
+            Tag.objects.create(name=f'tag{step}')
+        elif change in ('delete_category', 'delete_tag'):
+            model = Category if change == 'delete_category' else Tag
+            existing = list(model.objects.all())
+            if existing:
+                self.random.choice(existing).delete()
+        else:
+            Comment.objects.create(post=post, author=self.random.choice(self.users), content='Nice')
+
+    def test_counters_match_raw_aggregates_after_random_mutations(self):
+        site_stats.get()
+        for step in range(150):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.mutate(step)
+            self.assertEqual(site_stats.get(), site_stats.compute(), f'after step {step}')
+
+    @override_settings(SITE_STATS_REFRESH_SECONDS=60)
+    def test_change_during_compute_is_not_lost(self):
+        compute = site_stats.compute
+
+        def compute_while_publishing():
+            stats = compute()
+            with self.captureOnCommitCallbacks(execute=True):
+                Post.objects.create(title='Late', author=self.users[0], content='x', status='published')
+            return stats
+
+        with mock.patch.object(site_stats, 'compute', compute_while_publishing):
+            self.assertEqual(site_stats.get()['total_posts'], 0)
+        # The row was stored as behind, so the next refresh picks the post up
+        with mock.patch('blog.site_stats.time.time', return_value=time.time() + 61):
+            self.assertEqual(site_stats.get()['total_posts'], 1)
+
+    @override_settings(SITE_STATS_REFRESH_SECONDS=60)
+    def test_changes_are_picked_up_at_most_once_per_refresh_interval(self):
+        post = Post.objects.create(title='Post', author=self.users[0], content='x', status='published')
+        site_stats.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            post.toggle_like(self.users[1])
+        with self.assertNumQueries(0):
+            self.assertEqual(site_stats.get()['total_likes'], 0)
+
+        with mock.patch('blog.site_stats.time.time', return_value=time.time() + 61):
+            self.assertEqual(site_stats.get()['total_likes'], 1)
+
+
+class CardCacheTests(TestCase):
+    TEMPLATE = Template(
+        "{% load blog_extras %}{% cardcache 'listing' post flag %}"
+        "{{ post.title }}|{{ post.author.username }}|{{ post.category.name }}|"
+        "{{ post.like_count }}|{{ post.comment_count }}|{{ flag }}"
+        "{% endcardcache %}"
+    )
+
+    def setUp(self):
+        clear_caches()
+        self.author = User.objects.create_user('author', password='pw')
+        self.category = Category.objects.create(name='Python')
+        self.post, = create_posts(self.author, 1, self.category)
+
+    def render(self, flag=False):
+        post = Post.objects.cards().get(pk=self.post.pk)
+        return self.TEMPLATE.render(Context({'post': post, 'flag': flag}))
+
+    def test_unchanged_cards_are_rendered_once(self):
+        self.assertEqual(self.render(), 'Post 1|author|Python|0|0|False')
+        # A queryset update leaves updated_at, and so the key, as it was
+        Post.objects.filter(pk=self.post.pk).update(title='Renamed')
+        post = Post.objects.cards().get(pk=self.post.pk)
+        hits = card_stats.snapshot()['hits']
+        with self.assertNumQueries(0):
+            html = self.TEMPLATE.render(Context({'post': post, 'flag': False}))
+        self.assertEqual(html, 'Post 1|author|Python|0|0|False')
+        self.assertEqual(card_stats.snapshot()['hits'], hits + 1)
+
+    def test_every_value_a_card_shows_changes_its_key(self):
+        def edit():
+            post = Post.objects.get(pk=self.post.pk)
+            post.excerpt = 'Edited'
+            post.save()
+
+        def rename(obj, **fields):
+            for name, value in fields.items():
+                setattr(obj, name, value)
+            obj.save()
+
+        changes = {
+            'edit': edit,
+            'like': lambda: Post.objects.filter(pk=self.post.pk).update(like_count=F('like_count') + 1),
+            'comment': lambda: Comment.objects.create(post=self.post, author=self.author, content='Hi'),
+            'author': lambda: rename(self.author, username='writer'),
+            'category': lambda: rename(self.category, name='Django'),
+            'category slug': lambda: rename(self.category, slug='django'),
+            'image variants': lambda: Post.objects.filter(pk=self.post.pk).update(
+                image_variants={'source': 'posts/new.jpg'},
+            ),
+        }
+        self.render()
+        for number, (change, apply) in enumerate(changes.items()):
+            with self.subTest(change=change):
+                # Only a changed key shows this title
+                Post.objects.filter(pk=self.post.pk).update(title=f'Title {number}')
+                apply()
+                self.assertTrue(self.render().startswith(f'Title {number}|'))
+        Post.objects.filter(pk=self.post.pk).update(title='Flagged')
+        self.assertEqual(self.render(flag=True), 'Flagged|writer|Django|1|1|True')
+
+
+class PageCacheTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        author = User.objects.create_user('author', password='pw')
+        self.post, = create_posts(author, 1)
+        self.url = reverse('blog:post_detail', args=[self.post.slug])
+
+    def test_purge_from_another_worker_is_seen_at_once(self):
+        self.assertContains(self.client.get(self.url), 'Post 1')
+        self.assertContains(self.client.get(self.url), 'Post 1')
+        # Another worker changes the post and purges its pages; this worker
+        # still holds local copies of the entry
+        Post.objects.filter(pk=self.post.pk).update(title='Renamed')
+        caches['shared'].delete(f'page-tag:post:{self.post.pk}')
+        self.assertContains(self.client.get(self.url), 'Renamed')
+
+
+@override_settings(JOB_WORKER=True)
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.author = User.objects.create_user('author', password='pw')
+        self.reader = User.objects.create_user('reader', password='pw')
+        self.category = Category.objects.create(name='Python')
+        self.post, self.other = create_posts(self.author, 2, self.category)
+
+    def revalidate(self, url, response):
+        clear_caches()
+        return self.client.get(url, headers={'if-none-match': response['ETag']})
+
+    def test_post_detail(self):
+        url = reverse('blog:post_detail', args=[self.post.slug])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.revalidate(url, response).status_code, 304)
+
+        Comment.objects.create(post=self.post, author=self.reader, content='First')
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+        response = self.client.get(url)
+        Like.objects.create(post=self.post, user=self.reader)
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+        # A related post's card changes without touching this post
+        run_jobs()
+        response = self.client.get(url)
+        self.assertEqual(self.revalidate(url, response).status_code, 304)
+        self.other.toggle_like(self.reader)
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+    def test_listings(self):
+        for url in [
+            reverse('blog:latest_posts'),
+            reverse('blog:most_liked_posts'),
+            reverse('blog:category_detail', args=[self.category.slug]),
+        ]:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(self.revalidate(url, response).status_code, 304)
+                self.post.toggle_like(self.reader)
+                self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+    def test_taxonomy_and_author_renames(self):
+        tag = Tag.objects.create(name='django')
+        self.post.tags.add(tag)
+
+        def rename_category():
+            self.category.name += ' 2'
+            self.category.description = 'Renamed'
+            self.category.save()
+
+        def rename_tag():
+            tag.name += ' 2'
+            tag.save()
+
+        def rename_author():
+            self.author.username += '2'
+            self.author.save()
+
+        for url, renames in [
+            (reverse('blog:post_detail', args=[self.post.slug]), [rename_category, rename_tag, rename_author]),
+            (reverse('blog:category_detail', args=[self.category.slug]), [rename_category, rename_author]),
+            (reverse('blog:tag_detail', args=[tag.slug]), [rename_tag, rename_category, rename_author]),
+            (reverse('blog:latest_posts'), [rename_category, rename_author]),
+        ]:
+            for rename in renames:
+                with self.subTest(url=url, rename=rename.__name__):
+                    response = self.client.get(url)
+                    self.assertNotIn('Last-Modified', response)
+                    self.assertEqual(self.revalidate(url, response).status_code, 304)
+                    rename()
+                    self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+    def test_deploys_change_every_etag(self):
+        url = reverse('blog:post_detail', args=[self.post.slug])
+        response = self.client.get(url)
+        self.addCleanup(build_version.cache_clear)
+        with override_settings(RELEASE_VERSION='next'):
+            build_version.cache_clear()
+            self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+    def test_listing_page_is_built_once(self):
+        create_posts(self.author, 15)
+        url = reverse('blog:latest_posts')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        # The validators' COUNT and page query serve the view as well
+        self.assertEqual(len(queries), 2)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.author = User.objects.create_user('author', password='pw')
+        self.category = Category.objects.create(name='Databases')
+        self.tag = Tag.objects.create(name='orm')
+
+    def create(self, title, content, **fields):
+        return Post.objects.create(title=title, author=self.author, content=content, status='published', **fields)
+
+    def search(self, query):
+        return list(search_posts(query))
+
+    @skipIf(connection.vendor == 'sqlite', 'Ranked full-text search needs PostgreSQL')
+    def test_title_matches_outrank_newer_body_matches(self):
+        in_title = self.create('Caching querysets', '<p>Notes on memoizing.</p>')
+        in_tag = self.create('Notes', '<p>Nothing relevant here.</p>')
+        in_tag.tags.add(Tag.objects.create(name='caching'))
+        in_body = self.create('Weekly notes', '<p>Some thoughts on caching pages.</p>')
+        self.create('Unrelated', '<p>Nothing to see.</p>')
+
+        results = self.search('caching')
+        self.assertEqual(results, [in_title, in_tag, in_body])
+        self.assertIn(HIGHLIGHT_START + 'caching' + HIGHLIGHT_STOP, results[2].headline)
+
+    @skipIf(connection.vendor == 'sqlite', 'Ranked full-text search needs PostgreSQL')
+    def test_renaming_a_tag_or_category_reindexes_its_posts(self):
+        post = self.create('Notes', '<p>Nothing relevant here.</p>', category=self.category)
+        post.tags.add(self.tag)
+        self.assertEqual(self.search('orm'), [post])
+
+        self.tag.name = 'querysets'
+        self.tag.save()
+        self.category.name = 'Storage'
+        self.category.save()
+        self.assertEqual(self.search('orm'), [])
+        self.assertEqual(self.search('querysets'), [post])
+        self.assertEqual(self.search('storage'), [post])
+
+    def test_fallback_matches_substrings_newest_first(self):
+        in_title = self.create('Caching querysets', '<p>Notes.</p>')
+        in_category = self.create('Notes', '<p>Nothing.</p>', category=Category.objects.create(name='Cache design'))
+        in_tags = self.create('More notes', '<p>Nothing.</p>')
+        in_tags.tags.add(Tag.objects.create(name='caches'), Tag.objects.create(name='cache-busting'))
+        in_body = self.create('Weekly notes', '<p>Thoughts on CACHING pages.</p>')
+        self.create('Unrelated', '<p>Nothing to see.</p>')
+
+        with mock.patch('blog.search.full_text_enabled', return_value=False):
+            results = self.search('cach')
+        # Each post once, however many of its fields or tags match
+        self.assertEqual(results, [in_body, in_tags, in_category, in_title])
+
+    def test_search_page_counts_results(self):
+        self.create('Caching querysets', '<p>Notes.</p>')
+        self.create('Unrelated', '<p>Nothing to see.</p>')
+        response = self.client.get(reverse('blog:search'), {'q': 'querysets'})
+        self.assertEqual(response.context['count'], 1)
+        self.assertContains(response, 'Caching querysets')
+
+
+class SuggestTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        author = User.objects.create_user('author', password='pw')
+        self.post = Post.objects.create(title='Caching querysets', author=author, content='x', status='published')
+        Post.objects.create(title='Cache drafts', author=author, content='x', status='draft')
+        Tag.objects.create(name='cache')
+        Category.objects.create(name='Databases')
+
+    def labels(self, suggestions):
+        return sorted((item['type'], item['label']) for item in suggestions)
+
+    def test_prefix_matches_published_titles_tags_and_categories(self):
+        self.assertEqual(
+            self.labels(suggest('cach')),
+            [('post', 'Caching querysets'), ('tag', 'cache')],
+        )
+        self.assertEqual(self.labels(suggest('DATA')), [('category', 'Databases')])
+        self.assertEqual(suggest('c'), [])
+
+    def test_results_are_cached_per_normalized_query(self):
+        first = suggest('Cach')
+        self.post.delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(suggest('  cACH '), first)
+        clear_caches()
+        self.assertEqual(self.labels(suggest('cach')), [('tag', 'cache')])
+
+    @override_settings(SEARCH_SUGGEST_CACHE_SECONDS=0)
+    def test_cache_lifetime_follows_the_setting(self):
+        suggest('cach')
+        self.post.delete()
+        self.assertEqual(self.labels(suggest('cach')), [('tag', 'cache')])
+
+    @skipIf(connection.vendor == 'sqlite', 'Trigram matching needs PostgreSQL')
+    def test_search_without_results_offers_the_closest_title(self):
+        response = self.client.get(reverse('blog:search'), {'q': 'quersets'})
+        self.assertEqual(response.context['count'], 0)
+        self.assertEqual(response.context['did_you_mean']['label'], 'Caching querysets')
+
+    def test_suggest_view_returns_json(self):
+        response = self.client.get(reverse('blog:search_suggest'), {'q': 'cach'})
+        self.assertEqual(
+            self.labels(response.json()['suggestions']),
+            [('post', 'Caching querysets'), ('tag', 'cache')],
+        )
@@ -12,13 +12,16 @@ urlpatterns = [
     path('post/<slug:slug>/delete/', views.post_delete, name='post_delete'),
     path('post/<slug:slug>/like/', views.like_toggle, name='like_toggle'),
     path('post/<slug:slug>/comment/', views.comment_create, name='comment_create'),
+    path('post/<slug:slug>/comments/', views.comment_list, name='comment_list'),
     path('post/<slug:slug>/comment/<int:comment_id>/edit/', views.comment_edit, name='comment_edit'),
     path('categories/', views.category_list, name='category_list'),
     path('category/<slug:slug>/', views.category_detail, name='category_detail'),
     path('tag/<slug:slug>/', views.tag_detail, name='tag_detail'),
     path('search/', views.search, name='search'),
+    path('search/suggest/', views.search_suggest, name='search_suggest'),
     path('latest/', views.latest_posts_view, name='latest_posts'),
     path('recent/', views.recent_posts_view, name='recent_posts'),
     path('most-liked/', views.most_liked_posts_view, name='most_liked_posts'),
     path('about/', views.about_view, name='about'),
+    path('cache-stats/', views.cache_stats, name='cache_stats'),
 ]
\ No newline at end of file
@@ -0,0 +1,40 @@
+import html
+import re
+from django.utils.html import strip_tags
+
+WORDS_PER_MINUTE = 220
+
+# Stored excerpts keep more words than any card shows, so truncating them
+# in a template still knows whether to append an ellipsis.
+EXCERPT_WORDS = 50
+
+TAG_RE = re.compile(r'<[^>]+>')
+
+
+def html_to_text(value):
+    """Decode HTML entities, strip tags and collapse whitespace"""
+    if not value:
+        return ''
+    # First decode HTML entities (&nbsp; -> space, &amp; -> &, etc.)
+    decoded = html.unescape(str(value))
+    # Then strip HTML tags and clean up extra whitespace
+    return ' '.join(strip_tags(decoded).split())
+
+
+def truncate_words(text, word_count):
+    """Truncate plain text to word_count words, adding '...' when cut"""
+    words = text.split()
+    if len(words) > word_count:
+        return ' '.join(words[:word_count]) + '...'
+    return ' '.join(words)
+
+
+def summarize_html(content):
+    """
+    Return (word_count, read_time_minutes, excerpt) for a post body.
+    Reading time assumes 220 words per minute, with a minimum of 1 minute.
+    """
+    words = len(TAG_RE.sub('', content or '').split())
+    read_time = max(1, round(words / WORDS_PER_MINUTE))
+    excerpt = ' '.join(html_to_text(content).split()[:EXCERPT_WORDS])
+    return words, read_time, excerpt
@@ -1,94 +1,43 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.urls import reverse
-from django.http import HttpResponseRedirect
+from django.http import Http404, HttpResponseRedirect
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.core.cache import cache
 from django.http import JsonResponse
-from django.core.paginator import Paginator
-from django.db.models import Q, Sum, Count
 from django.utils.text import slugify
 from django.utils import timezone
+from collections import defaultdict
 from datetime import timedelta
 from . models import Post, Comment, Category, Tag, Like
 from . forms import PostForm, CommentForm
-from django.contrib.auth.models import User
+from . comments import comment_page, comment_payload, load_comment_thread
+from . conditional import (
+    category_validators, conditional_page, latest_validators, listing_subject, most_liked_validators,
+    post_validators, recent_validators, tag_validators,
+)
+from . fragment_cache import card_stats
+from . homepage import build_homepage_context
+from . page_cache import SITE, add_page_tags, cache_anonymous_page, page_stats, page_tag
+from . pagination import CursorPaginator, LISTING_ORDERING, MOST_LIKED_ORDERING, listing_page
+from . related import related_posts
+from . search import search_ordering, search_posts, suggest
+from . site_stats import site_stats
+from core.upload_handlers import limit_image_uploads, reject_skipped_uploads
+from core.uploads import queue_upload, take_upload
 from django.views.decorators.http import require_http_methods
 
 
+@cache_anonymous_page
 def post_list(request):
     """Display homepage with featured, latest, recent, and most liked posts"""
-    
-    # Featured posts (admin selected, published only)
-    featured_posts_qs = Post.objects.filter(
-        status='published',
-        is_featured=True
-    ).select_related('author').order_by('-created_at')[:5]
-    
-    # Check if we have explicitly featured posts
-    has_explicit_featured = featured_posts_qs.exists()
-    
-    # Get featured post IDs to exclude them from other sections (only if explicitly featured)
-    if has_explicit_featured:
-        featured_posts_list = list(featured_posts_qs)
-        featured_ids = [post.id for post in featured_posts_list]
-    else:
-        # If no explicit featured posts, show most liked as featured but don't exclude from other sections
-        featured_posts_list = list(Post.objects.filter(
-            status='published'
-        ).select_related('author').order_by('-like_count', '-created_at')[:5])
-        # Don't exclude from other sections if auto-selected
-        featured_ids = []
-    
-    # Latest posts (most recent, published, excluding explicitly featured only)
-    latest_posts_qs = Post.objects.filter(
-        status='published'
-    ).exclude(id__in=featured_ids).select_related('author').order_by('-created_at')
-    latest_posts = latest_posts_qs[:6]
-    latest_posts_count = latest_posts_qs.count()
-    
-    # Recently uploaded (posts from last 7 days, excluding explicitly featured only)
-    seven_days_ago = timezone.now() - timedelta(days=7)
-    recent_posts_qs = Post.objects.filter(
-        status='published',
-        created_at__gte=seven_days_ago
-    ).exclude(id__in=featured_ids).select_related('author').order_by('-created_at')
-    recent_posts = recent_posts_qs[:6]
-    recent_posts_count = recent_posts_qs.count()
-    
-    # Most liked posts (order by like_count, excluding explicitly featured only)
-    from django.db.models import Count
-
-    most_liked_posts_qs = (
-        Post.objects.filter(status='published')
-        
-        .select_related('author')
-        .annotate(likes_total=Count('likes'))
-        .filter(likes_total__gt=0)
-        .order_by('-likes_total', '-created_at')
-    )
-    most_liked_posts = most_liked_posts_qs[:6]
-    most_liked_posts_count = most_liked_posts_qs.count()
-    
-    # Stats for hero section
-    total_posts = Post.objects.filter(status='published').count()
-    total_authors = User.objects.filter(post__status='published').distinct().count()
-    total_likes = Post.objects.filter(status='published').aggregate(Sum('like_count'))['like_count__sum'] or 0
-    
-    return render(request, 'blog/post_list.html', {
-        'featured_posts': featured_posts_list,
-        'has_explicit_featured': has_explicit_featured,
-        'latest_posts': latest_posts,
-        'latest_posts_count': latest_posts_count,
-        'recent_posts': recent_posts,
-        'recent_posts_count': recent_posts_count,
-        'most_liked_posts': most_liked_posts,
-        'most_liked_posts_count': most_liked_posts_count,
-        'total_posts': total_posts,
-        'total_authors': total_authors,
-        'total_likes': total_likes,
-    })
+    add_page_tags(request, SITE)
+    return render(request, 'blog/post_list.html', build_homepage_context())
 
 
+@conditional_page(post_validators)
+@cache_anonymous_page
 def post_detail(request, slug):
     """Display a single blog post"""
     post = get_object_or_404(Post, slug=slug)
@@ -103,41 +52,33 @@ def post_detail(request, slug):
         from django.http import Http404
         raise Http404("Post not found")
     
-    comments = post.comments.filter(parent__isnull=True).order_by('-created_at')
+    # First page of top-level comments; later pages and replies load on demand
+    comments = comment_page(post)
     
     # Check if user has liked this post
     user_liked = False
     if request.user.is_authenticated:
         user_liked = Like.objects.filter(user=request.user, post=post).exists()
     
-    # Get related posts (same category or tags) - only published
-    related_posts = Post.objects.filter(
-        status='published'
-    ).exclude(id=post.id)
-    
-    # Prioritize same category, then same tags
-    if post.category:
-        related_posts = related_posts.filter(
-            Q(category=post.category) | Q(tags__in=post.tags.all())
-        ).distinct()[:6]
-    else:
-        related_posts = related_posts.filter(
-            tags__in=post.tags.all()
-        ).distinct()[:6]
+    # Top related posts from the precomputed index
+    related = related_posts(post)
+    add_page_tags(request, *(page_tag('post', p.id) for p in [post, *related]))
     
     return render(request, 'blog/post_detail.html', {
         'post': post,
         'comments': comments,
         'user_liked': user_liked,
-        'related_posts': related_posts
+        'related_posts': related
     })
 
 
 @login_required
+@limit_image_uploads
 def post_create(request):
     """Create a new blog post"""
     if request.method == 'POST': 
         form = PostForm(request.POST, request.FILES)
+        reject_skipped_uploads(request, form)
         if form.is_valid():
             post = form.save(commit=False)
             post.author = request.user
@@ -152,7 +93,11 @@ def post_create(request):
                     'title': 'Create New Post'
                 })
             
+            # A new image is stored by the job worker, not in this request
+            upload = take_upload(post, 'image')
             post.save()
+            if upload:
+                queue_upload(post, 'image', upload)
             
             # Handle tags from comma-separated input
             tags_input = form.cleaned_data.get('tags_input', '').strip()
@@ -180,7 +125,7 @@ def post_create(request):
                 
                 post.tags.set(tag_objects)
             
-            messages.success(request, 'Post created successfully!')
+            messages.success(request, 'Post created successfully!' + (' Your image will appear shortly.' if upload else ''))
             # Redirect based on status
             if post.status == 'published':
                 return redirect('blog:post_detail', slug=post.slug)
@@ -204,6 +149,7 @@ def post_create(request):
 
 
 @login_required
+@limit_image_uploads
 def post_edit(request, slug):
     """Edit an existing blog post"""
     post = get_object_or_404(Post, slug=slug)
@@ -215,6 +161,7 @@ def post_edit(request, slug):
     
     if request.method == 'POST': 
         form = PostForm(request.POST, request.FILES, instance=post)
+        reject_skipped_uploads(request, form)
         if form.is_valid():
             # Ensure content is not empty
             content = form.cleaned_data.get('content', '').strip()
@@ -227,7 +174,11 @@ def post_edit(request, slug):
                     'post': post
                 })
             
-            form.save()
+            post = form.save(commit=False)
+            upload = take_upload(post, 'image')
+            post.save()
+            if upload:
+                queue_upload(post, 'image', upload)
             
             # Handle tags from comma-separated input
             tags_input = form.cleaned_data.get('tags_input', '').strip()
@@ -258,7 +209,7 @@ def post_edit(request, slug):
                 # Clear tags if input is empty
                 post.tags.clear()
             
-            messages.success(request, 'Post updated successfully!')
+            messages.success(request, 'Post updated successfully!' + (' Your image will appear shortly.' if upload else ''))
             return redirect('blog:post_detail', slug=post.slug)
         else:
             # Form is invalid - show errors
@@ -300,12 +251,12 @@ def my_posts(request):
     published_posts = Post.objects.filter(
         author=request.user,
         status='published'
-    ).select_related('category').prefetch_related('tags').order_by('-created_at')
+    ).cards().order_by('-created_at')
     
     draft_posts = Post.objects.filter(
         author=request.user,
         status='draft'
-    ).select_related('category').prefetch_related('tags').order_by('-created_at')
+    ).cards().order_by('-created_at')
     
     return render(request, 'blog/my_posts.html', {
         'published_posts': published_posts,
@@ -318,16 +269,16 @@ def category_list(request):
     # Show ALL categories, not just those with published posts
     categories = Category.objects.all().order_by('name')
     
-    # Get latest posts for each category
+    # Latest 5 posts of every category in one windowed query
+    latest_by_category = defaultdict(list)
+    for post in Post.objects.published().cards().latest_per_category(5):
+        latest_by_category[post.category_id].append(post)
+    
     category_data = []
     for category in categories:
-        latest_posts = category.posts.filter(
-            status='published'
-        ).select_related('author').prefetch_related('tags')[:5]
-        
         category_data.append({
             'category': category,
-            'latest_posts': latest_posts
+            'latest_posts': latest_by_category.get(category.id, [])
         })
     
     return render(request, 'blog/categories.html', {
@@ -335,18 +286,20 @@ def category_list(request):
     })
 
 
+@conditional_page(category_validators)
+@cache_anonymous_page
 def category_detail(request, slug):
     """Display posts in a specific category"""
-    category = get_object_or_404(Category, slug=slug)
-    posts = Post.objects.filter(
-        category=category,
-        status='published'
-    ).select_related('author', 'category').prefetch_related('tags').order_by('-created_at')
+    category = listing_subject(request, Category, slug)
+    if category is None:
+        raise Http404('Category not found')
+    posts = Post.objects.published().filter(
+        category=category
+    ).cards().order_by(*LISTING_ORDERING)
     
-    # Pagination
-    paginator = Paginator(posts, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Keyset pagination; the page is usually built by the view's validators
+    page_obj = listing_page(request, posts, LISTING_ORDERING)
+    add_page_tags(request, page_tag('category', category.id), *(page_tag('post', p.id) for p in page_obj))
     
     return render(request, 'blog/category_detail.html', {
         'category': category,
@@ -355,18 +308,20 @@ def category_detail(request, slug):
     })
 
 
+@conditional_page(tag_validators)
+@cache_anonymous_page
 def tag_detail(request, slug):
     """Display posts with a specific tag"""
-    tag = get_object_or_404(Tag, slug=slug)
-    posts = Post.objects.filter(
-        tags=tag,
-        status='published'
-    ).select_related('author', 'category').prefetch_related('tags').order_by('-created_at')
+    tag = listing_subject(request, Tag, slug)
+    if tag is None:
+        raise Http404('Tag not found')
+    posts = Post.objects.published().filter(
+        tags=tag
+    ).cards().order_by(*LISTING_ORDERING)
     
-    # Pagination
-    paginator = Paginator(posts, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Keyset pagination; the page is usually built by the view's validators
+    page_obj = listing_page(request, posts, LISTING_ORDERING)
+    add_page_tags(request, page_tag('tag', tag.id), *(page_tag('post', p.id) for p in page_obj))
     
     return render(request, 'blog/tag_detail.html', {
         'tag': tag,
@@ -382,48 +337,60 @@ def search(request):
     count = 0
     
     if query:
-        # Search in title, content, category name, and tag names
-        posts = Post.objects.filter(
-            status='published'
-        ).filter(
-            Q(title__icontains=query) |
-            Q(content__icontains=query) |
-            Q(category__name__icontains=query) |
-            Q(tags__name__icontains=query)
-        ).select_related('author', 'category').prefetch_related('tags').distinct().order_by('-created_at')
-        
-        count = posts.count()
+        # Ranked full-text search on PostgreSQL, icontains elsewhere
+        posts = search_posts(query)
         
-        # Pagination
-        paginator = Paginator(posts, 12)
-        page_number = request.GET.get('page')
-        page_obj = paginator.get_page(page_number)
+        # Keyset pagination (the paginator's count doubles as the result count)
+        paginator = CursorPaginator(posts, 12, search_ordering())
+        page_obj = paginator.get_page(request.GET.get('cursor'))
+        count = paginator.count
     else:
         page_obj = None
     
+    # Offer the closest title, tag or category when nothing matched
+    did_you_mean = None
+    if query and not count:
+        suggestions = suggest(query, limit=1)
+        if suggestions:
+            did_you_mean = suggestions[0]
+    
     return render(request, 'blog/search_results.html', {
         'query': query,
         'page_obj': page_obj,
-        'count': count
+        'count': count,
+        'did_you_mean': did_you_mean
     })
 
 
+def search_suggest(request):
+    """Autocomplete / did-you-mean suggestions for the search box (JSON)"""
+    query = request.GET.get('q', '').strip()
+    return JsonResponse({
+        'query': query,
+        'suggestions': suggest(query)
+    })
+
+
+@staff_member_required
+def cache_stats(request):
+    """Hit/miss counters of this process's caches (JSON, staff only)"""
+    stats = {
+        'card_fragments': card_stats.snapshot(),
+        'pages': page_stats.snapshot(),
+    }
+    # Per-tier hit ratios when the default cache is core.cache.TieredCache
+    if hasattr(cache, 'stats'):
+        stats['cache_tiers'] = cache.stats()
+    return JsonResponse(stats)
+
+
+@conditional_page(latest_validators)
 def latest_posts_view(request):
     """Display all latest posts with pagination"""
-    # Get featured post IDs to exclude
-    featured_ids = list(Post.objects.filter(
-        status='published',
-        is_featured=True
-    ).values_list('id', flat=True))
-    
-    posts = Post.objects.filter(
-        status='published'
-    ).exclude(id__in=featured_ids).select_related('author', 'category').prefetch_related('tags').order_by('-created_at')
+    posts = Post.objects.published().exclude(is_featured=True).cards().order_by(*LISTING_ORDERING)
     
-    # Pagination
-    paginator = Paginator(posts, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Keyset pagination; the page is usually built by the view's validators
+    page_obj = listing_page(request, posts, LISTING_ORDERING)
     
     return render(request, 'blog/posts_list.html', {
         'page_obj': page_obj,
@@ -434,24 +401,16 @@ def latest_posts_view(request):
     })
 
 
+@conditional_page(recent_validators)
 def recent_posts_view(request):
     """Display all recent posts (last 7 days) with pagination"""
-    # Get featured post IDs to exclude
-    featured_ids = list(Post.objects.filter(
-        status='published',
-        is_featured=True
-    ).values_list('id', flat=True))
-    
     seven_days_ago = timezone.now() - timedelta(days=7)
-    posts = Post.objects.filter(
-        status='published',
+    posts = Post.objects.published().filter(
         created_at__gte=seven_days_ago
-    ).exclude(id__in=featured_ids).select_related('author', 'category').prefetch_related('tags').order_by('-created_at')
+    ).exclude(is_featured=True).cards().order_by(*LISTING_ORDERING)
     
-    # Pagination
-    paginator = Paginator(posts, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Keyset pagination; the page is usually built by the view's validators
+    page_obj = listing_page(request, posts, LISTING_ORDERING)
     
     return render(request, 'blog/posts_list.html', {
         'page_obj': page_obj,
@@ -462,22 +421,13 @@ def recent_posts_view(request):
     })
 
 
+@conditional_page(most_liked_validators)
 def most_liked_posts_view(request):
     """Display all most liked posts with pagination"""
-    # Get featured post IDs to exclude
-    featured_ids = list(Post.objects.filter(
-        status='published',
-        is_featured=True
-    ).values_list('id', flat=True))
-    
-    posts = Post.objects.filter(
-        status='published'
-    ).exclude(id__in=featured_ids).select_related('author', 'category').prefetch_related('tags').order_by('-like_count', '-created_at')
+    posts = Post.objects.published().exclude(is_featured=True).cards().order_by(*MOST_LIKED_ORDERING)
     
-    # Pagination
-    paginator = Paginator(posts, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Keyset pagination; the page is usually built by the view's validators
+    page_obj = listing_page(request, posts, MOST_LIKED_ORDERING)
     
     return render(request, 'blog/posts_list.html', {
         'page_obj': page_obj,
@@ -488,19 +438,18 @@ def most_liked_posts_view(request):
     })
 
 
+@cache_anonymous_page
 def about_view(request):
     """Display about page with website information and features"""
-    # Get some stats for the about page
-    total_posts = Post.objects.filter(status='published').count()
-    total_authors = User.objects.filter(post__status='published').distinct().count()
-    total_categories = Category.objects.count()
-    total_tags = Tag.objects.count()
+    # Site-wide counters from the cached stats row
+    stats = site_stats.get()
+    add_page_tags(request, SITE)
     
     return render(request, 'blog/about.html', {
-        'total_posts': total_posts,
-        'total_authors': total_authors,
-        'total_categories': total_categories,
-        'total_tags': total_tags,
+        'total_posts': stats['total_posts'],
+        'total_authors': stats['total_authors'],
+        'total_categories': stats['total_categories'],
+        'total_tags': stats['total_tags'],
     })
 
 
@@ -529,27 +478,13 @@ def like_toggle(request, slug):
         messages.error(request, 'Cannot like this post.')
         return redirect('blog:post_list')
     
-    like, created = Like.objects.get_or_create(user=request.user, post=post)
-    
-    if not created:
-        # Unlike
-        like.delete()
-        liked = False
-        # Update like_count
-        post.like_count = max(0, post.like_count - 1)
-        post.save(update_fields=['like_count'])
-    else:
-        # Like
-        liked = True
-        # Update like_count
-        post.like_count += 1
-        post.save(update_fields=['like_count'])
+    liked, like_count = post.toggle_like(request.user)
     
     # Return JSON for AJAX requests
     if is_ajax:
         return JsonResponse({
             'liked': liked,
-            'like_count': post.likes.count()
+            'like_count': like_count
         })
     
     # Otherwise redirect back
@@ -588,17 +523,7 @@ def comment_create(request, slug):
             
             # Return JSON for AJAX requests
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-                from django.utils.html import escape
-                from django.template.defaultfilters import linebreaksbr
-                return JsonResponse({
-                    'success': True,
-                    'comment_id': comment.id,
-                    'author': comment.author.username,
-                    'content': comment.content,
-                    'created_at': comment.created_at.strftime('%B %d, %Y'),
-                    'is_reply': comment.parent is not None,
-                    'parent_id': comment.parent.id if comment.parent else None
-                })
+                return JsonResponse({'success': True, **comment_payload(comment)})
             
             messages.success(request, 'Comment added successfully!')
             return HttpResponseRedirect(f"{reverse('blog:post_detail', kwargs={'slug': post.slug})}#comments")
@@ -610,6 +535,35 @@ def comment_create(request, slug):
     return redirect('blog:post_detail', slug=post.slug)
 
 
+@require_http_methods(["GET"])
+def comment_list(request, slug):
+    """A page of a post's top-level comments, or one comment's whole reply thread (JSON)"""
+    post = get_object_or_404(Post, slug=slug)
+    
+    # Same visibility as post_detail: drafts only for their author
+    if post.status != 'published' and post.author != request.user:
+        return JsonResponse({'error': 'Post not found.'}, status=404)
+    
+    parent_id = request.GET.get('parent')
+    if parent_id:
+        if not parent_id.isdigit():
+            return JsonResponse({'error': 'Invalid comment.'}, status=400)
+        parent = get_object_or_404(Comment, id=parent_id, post=post)
+        # The whole thread under the comment, depth-first, in one query
+        return JsonResponse({
+            'comments': [comment_payload(reply) for reply in load_comment_thread(parent)],
+            'has_next': False,
+            'next_cursor': None
+        })
+    
+    page = comment_page(post, request.GET.get('cursor'))
+    return JsonResponse({
+        'comments': [comment_payload(comment) for comment in page],
+        'has_next': page.has_next(),
+        'next_cursor': page.next_cursor
+    })
+
+
 @login_required
 def comment_edit(request, slug, comment_id):
     """Edit a comment"""
@@ -0,0 +1,187 @@
+"""
+Two-tier cache backend
+
+TieredCache keeps a small per-process LRU (Django's LocMemCache) in front of
+a shared backend every worker sees, named by the cache's LOCATION in
+settings.CACHES. Reads try the local tier first and fill it from the shared
+tier; writes and deletes go to both. A local copy lives at most
+LOCAL_TIMEOUT seconds, which bounds how long a worker can keep serving a
+value another worker has since changed or deleted. Values that must always
+be current, like invalidation versions, are read and written through the
+`shared` property instead.
+
+Hits and misses are counted per tier and per process; stats() reports them
+for sizing the tiers.
+
+LockingFileBasedCache is the file-based shared tier. Django's FileBasedCache
+implements add() and incr() as a read followed by a write, so two workers
+can both "add" a key or lose an increment; the page cache purge counter and
+the site stats version depend on neither happening.
+"""
+import os
+import threading
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.files import locks
+
+_MISSING = object()
+
+
+class TierStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {'local': [0, 0], 'shared': [0, 0]}
+
+    def record(self, tier, hits, misses):
+        with self._lock:
+            counts = self._counts[tier]
+            counts[0] += hits
+            counts[1] += misses
+
+    def snapshot(self):
+        with self._lock:
+            counts = {tier: tuple(values) for tier, values in self._counts.items()}
+        report = {}
+        for tier, (hits, misses) in counts.items():
+            total = hits + misses
+            report[tier] = {
+                'hits': hits,
+                'misses': misses,
+                'hit_ratio': round(hits / total, 4) if total else None,
+            }
+        # Every lookup reaches the local tier; a local miss is a shared lookup
+        lookups = sum(counts['local'])
+        hits = counts['local'][0] + counts['shared'][0]
+        report['overall_hit_ratio'] = round(hits / lookups, 4) if lookups else None
+        return report
+
+
+class LockingFileBasedCache(FileBasedCache):
+    """FileBasedCache whose add() and incr() hold an exclusive lock on a file in its directory"""
+
+    lock_filename = 'atomic.lock'
+
+    @contextmanager
+    def _exclusive(self):
+        self._createdir()
+        with open(os.path.join(self._dir, self.lock_filename), 'ab') as lock_file:
+            locks.lock(lock_file, locks.LOCK_EX)
+            try:
+                yield
+            finally:
+                locks.unlock(lock_file)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._exclusive():
+            return super().add(key, value, timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        with self._exclusive():
+            return super().incr(key, delta, version=version)
+
+
+class TieredCache(BaseCache):
+    """Per-process LRU in front of the shared cache alias given as LOCATION"""
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = location
+        self._local_timeout = options.get('LOCAL_TIMEOUT', 5)
+        self._local = LocMemCache(f'tiered-{location}', {
+            'TIMEOUT': self._local_timeout,
+            'OPTIONS': {'MAX_ENTRIES': options.get('LOCAL_MAX_ENTRIES', 1000)},
+        })
+        self._stats = TierStats()
+
+    @property
+    def shared(self):
+        """The shared tier alone, for values that must never come from a local copy"""
+        return caches[self._shared_alias]
+
+    def _local_expiry(self, timeout):
+        if timeout is DEFAULT_TIMEOUT or timeout is None:
+            return self._local_timeout
+        return min(timeout, self._local_timeout)
+
+    def stats(self):
+        return self._stats.snapshot()
+
+    def get(self, key, default=None, version=None):
+        value = self._local.get(key, _MISSING, version=version)
+        self._stats.record('local', value is not _MISSING, value is _MISSING)
+        if value is not _MISSING:
+            return value
+        value = self.shared.get(key, _MISSING, version=version)
+        self._stats.record('shared', value is not _MISSING, value is _MISSING)
+        if value is _MISSING:
+            return default
+        self._local.set(key, value, version=version)
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = self._local.get_many(keys, version=version)
+        self._stats.record('local', len(found), len(keys) - len(found))
+        remaining = [key for key in keys if key not in found]
+        if remaining:
+            fetched = self.shared.get_many(remaining, version=version)
+            self._stats.record('shared', len(fetched), len(remaining) - len(fetched))
+            if fetched:
+                self._local.set_many(fetched, version=version)
+                found.update(fetched)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version=version)
+        self._local.set(key, value, self._local_expiry(timeout), version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version=version)
+        self._local.set_many(
+            {key: value for key, value in data.items() if key not in failed},
+            self._local_expiry(timeout),
+            version=version,
+        )
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout, version=version)
+        if added:
+            self._local.set(key, value, self._local_expiry(timeout), version=version)
+        else:
+            # Another worker's value wins; don't keep a stale local copy
+            self._local.delete(key, version=version)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self._local.touch(key, self._local_expiry(timeout), version=version)
+        return self.shared.touch(key, timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        value = self.shared.incr(key, delta, version=version)
+        self._local.set(key, value, version=version)
+        return value
+
+    def has_key(self, key, version=None):
+        return self._local.has_key(key, version=version) or self.shared.has_key(key, version=version)
+
+    def delete(self, key, version=None):
+        self._local.delete(key, version=version)
+        return self.shared.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        self._local.delete_many(keys, version=version)
+        self.shared.delete_many(keys, version=version)
+
+    def clear(self):
+        self._local.clear()
+        self.shared.clear()
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
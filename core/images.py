@@ -0,0 +1,154 @@
+"""
+Responsive image variants
+
+Uploads (Post.image, Profile.avatar) are kept as they were uploaded, and
+resized WebP and JPEG copies at a few widths are saved next to them in the
+same storage ("posts/cover.jpg" -> "posts/cover-640w.webp"). Each model
+records its copies in a JSON field:
+
+    {"source": "posts/cover.jpg", "width": 2400, "height": 1600,
+     "webp": [[320, "posts/cover-320w.webp"], ...],
+     "jpeg": [[320, "posts/cover-320w.jpg"], ...]}
+
+so templates can build srcset attributes without touching storage (see the
+responsive_image tag in blog_extras). Variants are never wider than the
+original. "source" tells whether they still match the current upload;
+refresh_variants regenerates them when it does not.
+
+The original's own dimensions and byte size are recorded on the model when
+it is uploaded (image_metadata), so nothing has to fetch the file from
+storage to learn them.
+"""
+import logging
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import ExifTags, Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Widths generated per kind of image
+POST_IMAGE_WIDTHS = (320, 640, 960, 1440)
+AVATAR_WIDTHS = (64, 128, 256)
+
+# (key in the variants record, file extension, Pillow format, save options)
+VARIANT_FORMATS = (
+    ('webp', 'webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpeg', 'jpg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+
+
+# EXIF orientations that rotate the image by 90 degrees
+ROTATED_ORIENTATIONS = {5, 6, 7, 8}
+
+
+def image_metadata(file):
+    """
+    (width, height, size in bytes) of an upload that is not yet in storage,
+    read from the local upload; width and height are as displayed (EXIF
+    rotation applied) and None if Pillow can't read the image. Returns
+    (None, None, None) for a cleared field, and None when the field holds an
+    already stored file, whose metadata is left as recorded.
+    """
+    if not file:
+        return None, None, None
+    if file._committed:
+        return None
+
+    upload = file.file
+    position = upload.tell()
+    width = height = None
+    try:
+        upload.seek(0)
+        image = Image.open(upload)
+        width, height = image.size
+        if image.getexif().get(ExifTags.Base.Orientation) in ROTATED_ORIENTATIONS:
+            width, height = height, width
+    except (OSError, ValueError, Image.DecompressionBombError):
+        pass
+    finally:
+        upload.seek(position)
+    return width, height, file.size
+
+
+def variant_widths(widths, source_width):
+    """Requested widths narrower than the source, plus the source width as a cap"""
+    kept = [width for width in widths if width < source_width]
+    if not kept or kept[-1] < min(widths[-1], source_width):
+        kept.append(min(widths[-1], source_width))
+    return kept
+
+
+def _encode(image, pillow_format, options):
+    if pillow_format == 'JPEG' and image.mode != 'RGB':
+        # JPEG has no alpha channel; flatten onto white
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.convert('RGBA').getchannel('A'))
+        image = background
+    buffer = BytesIO()
+    image.save(buffer, pillow_format, **options)
+    return buffer.getvalue()
+
+
+def build_variants(storage, name, widths, square=False):
+    """Save resized copies of the image `name` and return its variants record"""
+    with storage.open(name, 'rb') as source:
+        image = Image.open(source)
+        image.load()
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+    if square:
+        side = min(image.size)
+        image = ImageOps.fit(image, (side, side), Image.LANCZOS)
+
+    width, height = image.size
+    record = {'source': name, 'width': width, 'height': height}
+    root = os.path.splitext(name)[0]
+    for key, _, _, _ in VARIANT_FORMATS:
+        record[key] = []
+
+    for target in variant_widths(widths, width):
+        size = (target, max(1, round(height * target / width)))
+        resized = image if size == image.size else image.resize(size, Image.LANCZOS)
+        for key, extension, pillow_format, options in VARIANT_FORMATS:
+            saved = storage.save(
+                f'{root}-{target}w.{extension}',
+                ContentFile(_encode(resized, pillow_format, options)),
+            )
+            record[key].append([target, saved])
+    return record
+
+
+def delete_variants(storage, record):
+    for key, _, _, _ in VARIANT_FORMATS:
+        for _, name in (record or {}).get(key, ()):
+            storage.delete(name)
+
+
+def refresh_variants(instance, field_name, variants_field, widths, square=False):
+    """
+    Rebuild instance's variants if its image changed since they were made,
+    storing the record with an UPDATE so no save signals fire again.
+    Returns True if anything changed.
+    """
+    file = getattr(instance, field_name)
+    name = file.name if file else ''
+    record = getattr(instance, variants_field) or {}
+    if record.get('source', '') == name:
+        return False
+
+    delete_variants(file.storage, record)
+    record = {}
+    if name:
+        try:
+            record = build_variants(file.storage, name, widths, square=square)
+        except (OSError, ValueError, Image.DecompressionBombError):
+            # Keep serving the original; don't retry on every save
+            logger.exception('Could not build image variants for %s', name)
+            record = {'source': name}
+
+    type(instance)._default_manager.filter(pk=instance.pk).update(**{variants_field: record})
+    setattr(instance, variants_field, record)
+    return True
@@ -0,0 +1,100 @@
+"""
+Database-backed job queue
+
+Work that should not hold up a request is stored as a Job row with enqueue()
+and run by the run_jobs management command. Handlers are plain functions
+registered under a name with @job; their keyword arguments are the job's
+JSON payload. enqueue_once() skips a job identical to one still queued, for
+work that only needs to run once however often it is requested.
+
+Deployments without a worker process set JOB_WORKER off. run_later() is for
+work that may run inline then: it queues the job when a worker is deployed
+and otherwise calls the handler in-process once the transaction commits.
+
+Workers claim the oldest runnable job with SELECT ... FOR UPDATE SKIP
+LOCKED, so any number of them can poll the same table. A finished job is
+deleted. A failing job is retried with exponential backoff until
+JOB_MAX_ATTEMPTS, then left as "failed" with its traceback for the admin.
+A job still "running" after JOB_TIMEOUT_SECONDS (its worker died) is
+claimed again.
+"""
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . models import Job
+
+logger = logging.getLogger(__name__)
+
+HANDLERS = {}
+
+
+def job(kind):
+    """Register the decorated function as the handler for jobs of `kind`"""
+    def register(func):
+        HANDLERS[kind] = func
+        return func
+    return register
+
+
+def enqueue(kind, **payload):
+    if kind not in HANDLERS:
+        raise ValueError(f'No job handler registered for {kind!r}')
+    return Job.objects.create(kind=kind, payload=payload)
+
+
+def enqueue_once(kind, **payload):
+    """enqueue() unless the same job is already waiting to run"""
+    queued = Job.objects.filter(kind=kind, payload=payload, status='queued').first()
+    return queued or enqueue(kind, **payload)
+
+
+def run_later(kind, **payload):
+    """enqueue_once() with a worker deployed, else run the handler after commit"""
+    if getattr(settings, 'JOB_WORKER', False):
+        return enqueue_once(kind, **payload)
+    if kind not in HANDLERS:
+        raise ValueError(f'No job handler registered for {kind!r}')
+    # Errors are logged rather than failing a request that already committed
+    transaction.on_commit(lambda: HANDLERS[kind](**payload), robust=True)
+    return None
+
+
+def claim_next():
+    """Mark the oldest runnable job as running and return it, or None"""
+    now = timezone.now()
+    timeout = timedelta(seconds=getattr(settings, 'JOB_TIMEOUT_SECONDS', 600))
+    with transaction.atomic():
+        claimed = Job.objects.select_for_update(skip_locked=True).filter(
+            Q(status='queued', run_after__lte=now) | Q(status='running', updated_at__lt=now - timeout)
+        ).order_by('id').first()
+        if claimed is not None:
+            claimed.status = 'running'
+            claimed.attempts += 1
+            claimed.save(update_fields=['status', 'attempts', 'updated_at'])
+    return claimed
+
+
+def run(claimed):
+    """Run a claimed job; returns True if it succeeded"""
+    try:
+        HANDLERS[claimed.kind](**claimed.payload)
+    except Exception:
+        error = traceback.format_exc()
+        logger.exception('Job %s failed (attempt %s)', claimed, claimed.attempts)
+        claimed.last_error = error
+        if claimed.attempts >= getattr(settings, 'JOB_MAX_ATTEMPTS', 5):
+            claimed.status = 'failed'
+        else:
+            claimed.status = 'queued'
+            claimed.run_after = timezone.now() + timedelta(seconds=10 * 2 ** (claimed.attempts - 1))
+        claimed.save(update_fields=['status', 'run_after', 'last_error', 'updated_at'])
+        return False
+
+    claimed.delete()
+    return True
@@ -0,0 +1,112 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import connections
+from blog.page_cache import purge_post_pages
+from core.images import AVATAR_WIDTHS, POST_IMAGE_WIDTHS, build_variants, delete_variants
+
+# name: (model label, image field, variants field, widths, square crop)
+TARGETS = {
+    'posts': ('blog.Post', 'image', 'image_variants', POST_IMAGE_WIDTHS, False),
+    'avatars': ('accounts.Profile', 'avatar', 'avatar_variants', AVATAR_WIDTHS, True),
+}
+
+
+def _init_worker():
+    # Needed when the pool spawns instead of forking
+    django.setup()
+
+
+def _build(target, pk, name, old_record):
+    """Runs in a worker process: storage and Pillow only, no database access"""
+    label, field_name, _, widths, square = TARGETS[target]
+    storage = apps.get_model(label)._meta.get_field(field_name).storage
+    delete_variants(storage, old_record)
+    try:
+        return pk, build_variants(storage, name, widths, square=square), None
+    except Exception as exc:
+        return pk, {'source': name}, f'{name}: {exc}'
+
+
+class Command(BaseCommand):
+    help = 'Build resized WebP/JPEG variants of post images and avatars that lack them'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--only',
+            choices=sorted(TARGETS),
+            help='Only process post images or avatars',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Rebuild variants even when they match the current image',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Worker processes resizing images (default: number of CPUs)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Images handed to the pool and saved per batch (default: 100)',
+        )
+
+    def handle(self, *args, **options):
+        targets = [options['only']] if options['only'] else sorted(TARGETS)
+        for target in targets:
+            self._process(target, options)
+
+    def _process(self, target, options):
+        label, field_name, variants_field, _, _ = TARGETS[target]
+        model = apps.get_model(label)
+        started = time.monotonic()
+
+        pending = [
+            (pk, name, record)
+            for pk, name, record in model.objects.exclude(**{field_name: ''}).exclude(
+                **{f'{field_name}__isnull': True}
+            ).values_list('pk', field_name, variants_field).iterator()
+            if options['force'] or (record or {}).get('source') != name
+        ]
+        if not pending:
+            self.stdout.write(f'No {target} need variants.')
+            return
+
+        # Forked workers must not inherit open database connections
+        connections.close_all()
+
+        built = failed = 0
+        batch_size = options['batch_size']
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as pool:
+            for start in range(0, len(pending), batch_size):
+                batch = pending[start:start + batch_size]
+                results = pool.map(
+                    _build,
+                    [target] * len(batch),
+                    *zip(*[(pk, name, record) for pk, name, record in batch]),
+                )
+                rows = []
+                for pk, record, error in results:
+                    if error:
+                        failed += 1
+                        self.stderr.write(f'Could not process {error}')
+                    else:
+                        built += 1
+                    rows.append(model(pk=pk, **{variants_field: record}))
+                model.objects.bulk_update(rows, [variants_field])
+                if target == 'posts':
+                    purge_post_pages([row.pk for row in rows])
+                self.stdout.write(f'Processed {start + len(batch)}/{len(pending)} {target}...')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Built variants for {built} {target} in {time.monotonic() - started:.1f}s'
+            + (f' ({failed} failed).' if failed else '.')
+        ))
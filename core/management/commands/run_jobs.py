@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from core.jobs import claim_next, run
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs, such as storing uploads (see core.jobs)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit when no job is ready instead of waiting for more',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=2,
+            help='Seconds to wait before polling again when the queue is empty (default: 2)',
+        )
+        parser.add_argument(
+            '--max-jobs',
+            type=int,
+            default=0,
+            help='Exit after running this many jobs (default: no limit)',
+        )
+
+    def handle(self, *args, **options):
+        done = failed = 0
+        try:
+            while not options['max_jobs'] or done + failed < options['max_jobs']:
+                # Long-running process: drop connections past CONN_MAX_AGE or broken
+                close_old_connections()
+                claimed = claim_next()
+                if claimed is None:
+                    if options['once']:
+                        break
+                    time.sleep(options['sleep'])
+                    continue
+
+                if run(claimed):
+                    done += 1
+                else:
+                    failed += 1
+                    self.stderr.write(f'Job {claimed} failed; see its last_error.')
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Ran {done + failed} jobs'
+            + (f' ({failed} failed).' if failed else '.')
+        ))
@@ -0,0 +1,71 @@
+import os
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management.base import BaseCommand, CommandError
+from core.static_pipeline import critical_name
+
+
+def _size(path):
+    return os.path.getsize(path) if path and os.path.exists(path) else None
+
+
+def _format(size):
+    return '-' if size is None else f'{size / 1024:.1f} KB'
+
+
+class Command(BaseCommand):
+    help = 'Compare bundles and WebP images built by collectstatic with their source files'
+
+    def handle(self, *args, **options):
+        if not os.path.isdir(settings.STATIC_ROOT):
+            raise CommandError('Run collectstatic first.')
+
+        rows = []
+        for bundle, sources in settings.STATIC_BUNDLES.items():
+            source_size = sum(os.path.getsize(finders.find(source)) for source in sources)
+            built = self._built_path(bundle)
+            if _size(built) is None:
+                raise CommandError(f'{bundle} has not been built; run collectstatic with bundling storage.')
+            rows.append((bundle, source_size, _size(built), _size(built + '.gz'), _size(built + '.br')))
+
+        for image in settings.STATIC_RESPONSIVE_IMAGES:
+            directory, root = os.path.split(image.rsplit('.', 1)[0])
+            source_size = os.path.getsize(finders.find(image))
+            variant = re.compile(rf'{re.escape(root)}-\d+w\.webp$')
+            for file_name in sorted(os.listdir(staticfiles_storage.path(directory))):
+                if variant.match(file_name):
+                    name = f'{directory}/{file_name}'
+                    rows.append((name, source_size, _size(self._built_path(name)), None, None))
+
+        self.stdout.write(f'{"File":<32}{"Sources":>12}{"Built":>12}{"Gzip":>12}{"Brotli":>12}{"Saved":>8}')
+        total_source = total_served = 0
+        for name, source_size, size, gzip_size, brotli_size in rows:
+            served = min(s for s in (size, gzip_size, brotli_size) if s is not None)
+            total_source += source_size
+            total_served += served
+            self.stdout.write(
+                f'{name:<32}{_format(source_size):>12}{_format(size):>12}{_format(gzip_size):>12}'
+                f'{_format(brotli_size):>12}{1 - served / source_size:>8.0%}'
+            )
+
+        for bundle in [name for name in settings.STATIC_BUNDLES if name.endswith('.css')]:
+            critical = _size(staticfiles_storage.path(critical_name(bundle)))
+            if critical is not None:
+                self.stdout.write(f'Critical CSS inlined for {bundle}: {_format(critical)}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Sources {_format(total_source)}, served {_format(total_served)} '
+            f'(best encoding): {_format(total_source - total_served)} saved.'
+        ))
+
+    def _built_path(self, name):
+        # Manifest storage serves the hashed copy
+        if hasattr(staticfiles_storage, 'stored_name'):
+            try:
+                name = staticfiles_storage.stored_name(name)
+            except ValueError:
+                return None
+        return staticfiles_storage.path(name)
@@ -0,0 +1,168 @@
+"""
+Static asset pipeline run by collectstatic
+
+BundlingStaticFilesStorage is WhiteNoise's CompressedManifestStaticFilesStorage
+with a build step in front of its post-processing:
+
+- each STATIC_BUNDLES entry is built by minifying its source files (rcssmin,
+  rjsmin) and concatenating them, so a page loads one stylesheet and one
+  script instead of one per file;
+- for CSS bundles, the rules that style the top of the page (CRITICAL_SELECTOR)
+  are saved next to the bundle as "<bundle>.critical.css", which the
+  {% bundle %} tag inlines (see core.templatetags.bundles);
+- each STATIC_RESPONSIVE_IMAGES entry gets resized WebP copies
+  ("images/logo.jpg" -> "images/logo-256w.webp").
+
+The generated files then go through the usual manifest hashing and WhiteNoise
+compression, which writes .br (with the Brotli package installed) and .gz
+copies that WhiteNoise serves to clients accepting them. manage.py
+static_report compares the results with the source files.
+"""
+import logging
+import re
+from io import BytesIO
+
+import rcssmin
+import rjsmin
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+from . images import VARIANT_FORMATS, variant_widths
+
+logger = logging.getLogger(__name__)
+
+# Selectors for the page chrome and headers visible before scrolling
+CRITICAL_SELECTOR = re.compile(
+    r'(?::root|\*|html|body|h[1-6]|p|a|\.container|\.main-content|\.navbar[\w-]*'
+    r'|\.nav-[\w-]+|\.dropdown[\w-]*|\.messages-container|\.alert[\w-]*|\.btn[\w-]*'
+    r'|\.hero-[\w-]+|\.gradient-text|\.search-[\w-]+|\.post-detail-(?:header|title|meta))'
+    r'(?![\w-])'
+)
+# At-rules whose blocks hold ordinary rules to filter
+GROUPING_AT_RULES = ('@media', '@supports')
+
+WEBP_OPTIONS = next(options for key, _, _, options in VARIANT_FORMATS if key == 'webp')
+
+
+def minify(name, content):
+    if name.endswith('.css'):
+        return rcssmin.cssmin(content)
+    if name.endswith('.js'):
+        return rjsmin.jsmin(content)
+    return content
+
+
+def critical_name(bundle):
+    """'css/blog.bundle.css' -> 'css/blog.bundle.critical.css'"""
+    return re.sub(r'\.css$', '.critical.css', bundle)
+
+
+def _statements(css):
+    """Split a stylesheet into (prelude, block) pairs; block is None for statements like @import"""
+    statements = []
+    depth = start = prelude_end = 0
+    quote = None
+    for index, char in enumerate(css):
+        if quote:
+            if char == quote and css[index - 1] != '\\':
+                quote = None
+        elif char in '"\'':
+            quote = char
+        elif char == '{':
+            if depth == 0:
+                prelude_end = index
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                statements.append((css[start:prelude_end].strip(), css[prelude_end + 1:index]))
+                start = index + 1
+        elif char == ';' and depth == 0:
+            statements.append((css[start:index].strip(), None))
+            start = index + 1
+    return statements
+
+
+def _critical_rules(css):
+    kept = []
+    for prelude, block in _statements(css):
+        if block is None or prelude.startswith('@keyframes'):
+            continue
+        if prelude.startswith(GROUPING_AT_RULES):
+            inner = _critical_rules(block)
+            if inner:
+                kept.append(f'{prelude}{{{inner}}}')
+        elif prelude.startswith('@font-face') or any(
+            CRITICAL_SELECTOR.match(selector.strip()) for selector in prelude.split(',')
+        ):
+            kept.append(f'{prelude}{{{block}}}')
+    return ''.join(kept)
+
+
+def critical_css(css):
+    """The rules of a minified stylesheet needed to render the top of a page, plus the keyframes they use"""
+    critical = _critical_rules(css)
+    for prelude, block in _statements(css):
+        if prelude.startswith('@keyframes') and re.search(rf'\b{re.escape(prelude.split()[-1])}\b', critical):
+            critical += f'{prelude}{{{block}}}'
+    return critical
+
+
+class BundlingStaticFilesStorage(CompressedManifestStaticFilesStorage):
+    def post_process(self, paths, dry_run=False, **options):
+        if not dry_run:
+            for name in self.build_bundles(paths):
+                paths[name] = (self, name)
+            for name in self.build_image_variants(paths):
+                paths[name] = (self, name)
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+
+    def build_bundles(self, paths):
+        built = []
+        for bundle, sources in settings.STATIC_BUNDLES.items():
+            parts = []
+            for source in sources:
+                if source not in paths:
+                    raise ValueError(f'Bundle {bundle} includes {source}, which was not collected')
+                storage, path = paths[source]
+                with storage.open(path) as file:
+                    parts.append(minify(source, file.read().decode('utf-8')))
+            # ";" keeps one script's last statement from running into the next
+            content = '\n'.join(parts) if bundle.endswith('.css') else ';\n'.join(parts)
+            self._replace(bundle, content.encode('utf-8'))
+            built.append(bundle)
+            if bundle.endswith('.css'):
+                # Read by the template tag, never served, so not hashed
+                self._replace(critical_name(bundle), critical_css(content).encode('utf-8'))
+        return built
+
+    def build_image_variants(self, paths):
+        built = []
+        for name, widths in settings.STATIC_RESPONSIVE_IMAGES.items():
+            storage, path = paths[name]
+            try:
+                with storage.open(path) as file:
+                    image = Image.open(file)
+                    image.load()
+            except (OSError, ValueError, Image.DecompressionBombError) as exc:
+                logger.warning('Skipping WebP copies of %s: %s', name, exc)
+                continue
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA')
+            root = name.rsplit('.', 1)[0]
+            for width in variant_widths(widths, image.width):
+                size = (width, max(1, round(image.height * width / image.width)))
+                resized = image if size == image.size else image.resize(size, Image.LANCZOS)
+                buffer = BytesIO()
+                resized.save(buffer, 'WEBP', **WEBP_OPTIONS)
+                self._replace(f'{root}-{width}w.webp', buffer.getvalue())
+                built.append(f'{root}-{width}w.webp')
+        return built
+
+    def _replace(self, name, data):
+        # Built files keep their names across runs instead of getting a suffix
+        if self.exists(name):
+            self.delete(name)
+        self._save(name, ContentFile(data))
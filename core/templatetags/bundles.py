@@ -0,0 +1,51 @@
+from django import template
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+from django.utils.safestring import mark_safe
+from core.static_pipeline import critical_name
+
+register = template.Library()
+
+# Critical CSS per bundle; only changes with a deploy, which restarts the process
+_critical = {}
+
+
+def _critical_css(bundle):
+    if bundle not in _critical:
+        try:
+            with staticfiles_storage.open(critical_name(bundle)) as file:
+                _critical[bundle] = file.read().decode('utf-8').replace('</', '<\\/')
+        except FileNotFoundError:
+            _critical[bundle] = ''
+    return _critical[bundle]
+
+
+@register.simple_tag(name='bundle')
+def bundle(name):
+    """
+    Link a CSS or JS bundle from STATIC_BUNDLES. When collectstatic has built
+    it (STATIC_BUNDLES_ENABLED) that is one minified file, and for CSS its
+    critical rules are inlined while the whole stylesheet loads without
+    blocking rendering (see core.static_pipeline). Otherwise, as in
+    development, each source file is linked on its own.
+    Usage: {% bundle 'css/blog.bundle.css' %}
+    """
+    stylesheet = name.endswith('.css')
+    if not settings.STATIC_BUNDLES_ENABLED:
+        tag = '<link rel="stylesheet" href="{}">\n' if stylesheet else '<script src="{}"></script>\n'
+        return format_html_join('', tag, ((static(source),) for source in settings.STATIC_BUNDLES[name]))
+
+    url = static(name)
+    if not stylesheet:
+        return format_html('<script src="{}"></script>', url)
+    critical = _critical_css(name)
+    if not critical:
+        return format_html('<link rel="stylesheet" href="{}">', url)
+    return format_html(
+        '<style>{}</style>\n'
+        '<link rel="stylesheet" href="{}" media="print" onload="this.media=\'all\'">\n'
+        '<noscript><link rel="stylesheet" href="{}"></noscript>',
+        mark_safe(critical), url, url,
+    )
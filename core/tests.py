@@ -1,3 +1,615 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock, skipIf
 
-# Create your tests here.
+from botocore.awsrequest import AWSResponse
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.staticfiles import finders
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from django.core.handlers.wsgi import WSGIRequest
+from django.core.management import call_command
+from django.db import connection
+from django.template import Context, Template
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.urls import reverse
+from django.utils import timezone
+from PIL import ExifTags, Image
+
+from blog.models import Post
+from core.cache import LockingFileBasedCache
+from core.images import AVATAR_WIDTHS, POST_IMAGE_WIDTHS, build_variants, variant_widths
+from core.jobs import HANDLERS, claim_next, enqueue, enqueue_once, run
+from core.models import Job
+from core.static_pipeline import critical_css, critical_name, minify
+from core.templatetags import bundles
+from core.upload_handlers import ImageUploadLimitHandler
+from core.uploads import queue_upload, take_upload
+from devblog.storage_backends import MediaStorage
+
+
+class StubBody:
+    def __init__(self, data=b''):
+        self.data = io.BytesIO(data)
+
+    def stream(self, **kwargs):
+        yield self.data.read()
+
+    def read(self, *args, **kwargs):
+        return self.data.read(*args)
+
+
+def counting_media_storage():
+    """MediaStorage whose requests are answered locally and recorded as (method, path)"""
+    storage = MediaStorage(
+        access_key='test', secret_key='test', bucket_name='media-bucket', region_name='eu-north-1',
+    )
+    storage.remote_calls = []
+
+    def answer(request, **kwargs):
+        storage.remote_calls.append((request.method, request.url.split('amazonaws.com')[-1]))
+        status = 404 if request.method == 'HEAD' else 200
+        return AWSResponse(request.url, status, {'ETag': '"stub"'}, StubBody())
+
+    storage.connection.meta.client.meta.events.register('before-send', answer)
+    return storage
+
+
+def run_in_threads(call, count=8):
+    barrier = threading.Barrier(count)
+    results = []
+
+    def run():
+        barrier.wait()
+        results.append(call())
+
+    threads = [threading.Thread(target=run) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class LockingFileBasedCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache = LockingFileBasedCache(directory.name, {})
+
+    def test_concurrent_increments_are_not_lost(self):
+        self.cache.add('counter', 0, None)
+
+        def increment():
+            for _ in range(25):
+                self.cache.incr('counter')
+
+        run_in_threads(increment)
+        self.assertEqual(self.cache.get('counter'), 200)
+
+    def test_only_one_concurrent_add_wins(self):
+        results = run_in_threads(lambda: self.cache.add('key', threading.get_ident(), None))
+        self.assertEqual(results.count(True), 1)
+
+
+class MediaStorageTests(TestCase):
+    def test_saves_never_ask_whether_a_name_is_taken(self):
+        storage = counting_media_storage()
+        names = {storage.save('posts/cover.jpg', ContentFile(b'image'), max_length=100) for _ in range(3)}
+        self.assertEqual(len(names), 3)
+        self.assertEqual([method for method, _ in storage.remote_calls], ['PUT'] * 3)
+
+    def test_urls_are_memoized(self):
+        storage = counting_media_storage()
+        urls = [storage.url(f'posts/cover-{width}w.webp') for width in (320, 640) for _ in range(50)]
+        self.assertEqual(len(set(urls)), 2)
+        self.assertEqual(storage._cached_url.cache_info().misses, 2)
+        self.assertEqual(storage.remote_calls, [])
+        # Signed or parameterised URLs are never cached
+        self.assertIn('x-id=GetObject', storage.url('posts/cover.jpg', parameters={'x-id': 'GetObject'}))
+
+
+class ListingStorageCallTests(TestCase):
+    """Listings render image URLs from stored names and metadata alone"""
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        author = User.objects.create_user('author', password='pw')
+        for number in range(15):
+            name = f'posts/cover{number}.jpg'
+            Post.objects.create(
+                title=f'Post {number}', author=author, content='<p>Body</p>', status='published',
+                image=name, image_width=1600, image_height=900, image_size=250000,
+                image_variants={
+                    'source': name, 'width': 1600, 'height': 900,
+                    'webp': [[width, f'posts/cover{number}-{width}w.webp'] for width in (320, 640)],
+                    'jpeg': [[width, f'posts/cover{number}-{width}w.jpg'] for width in (320, 640)],
+                },
+            )
+
+    def test_rendering_listings_makes_no_storage_calls(self):
+        storage = counting_media_storage()
+        with mock.patch.object(Post._meta.get_field('image'), 'storage', storage):
+            for url in [reverse('blog:post_list'), reverse('blog:latest_posts'), reverse('blog:most_liked_posts')]:
+                with self.subTest(url=url):
+                    response = self.client.get(url)
+                    self.assertEqual(response.status_code, 200)
+                    self.assertContains(response, 'cover14-640w.webp')
+        # The URLs came from the stub storage, without a request each
+        self.assertGreater(storage._cached_url.cache_info().hits, 0)
+        self.assertEqual(storage.remote_calls, [])
+
+
+def image_bytes(size, image_format='PNG', noise=False):
+    if noise:
+        image = Image.frombytes('RGB', size, os.urandom(size[0] * size[1] * 3))
+    else:
+        image = Image.new('RGB', size, 'blue')
+    buffer = io.BytesIO()
+    image.save(buffer, image_format)
+    return buffer.getvalue()
+
+
+class CountingStream(io.BytesIO):
+    """Request body that counts how much of it has been read"""
+
+    def read(self, *args):
+        data = super().read(*args)
+        self.bytes_read = getattr(self, 'bytes_read', 0) + len(data)
+        return data
+
+
+class RecordingHandler(FileUploadHandler):
+    """Stands in for Django's buffering handlers and records what reaches them"""
+
+    def receive_data_chunk(self, raw_data, start):
+        self.request.buffered_bytes = getattr(self.request, 'buffered_bytes', 0) + len(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        return SimpleUploadedFile(self.file_name, b'')
+
+
+@override_settings(MAX_IMAGE_UPLOAD_SIZE=200 * 1024, MAX_IMAGE_DIMENSION=1000)
+class ImageUploadLimitHandlerTests(SimpleTestCase):
+    def upload(self, data):
+        """Parse a multipart POST with data as its "image" file through the handler"""
+        body = CountingStream(encode_multipart(BOUNDARY, {
+            'title': 'Post', 'image': SimpleUploadedFile('image.png', data),
+        }))
+        request = WSGIRequest({
+            'REQUEST_METHOD': 'POST', 'PATH_INFO': '/', 'SERVER_NAME': 'testserver', 'SERVER_PORT': '80',
+            'wsgi.url_scheme': 'http', 'wsgi.input': body,
+            'CONTENT_TYPE': MULTIPART_CONTENT, 'CONTENT_LENGTH': str(len(body.getvalue())),
+        })
+        request.upload_handlers = [ImageUploadLimitHandler(request), RecordingHandler(request)]
+        rejected_at = []
+        reject = ImageUploadLimitHandler.reject
+
+        def record_rejection(handler, message):
+            rejected_at.append(body.bytes_read)
+            reject(handler, message)
+
+        with mock.patch.object(ImageUploadLimitHandler, 'reject', record_rejection):
+            files, post = request.FILES, request.POST
+        return request, files, post, rejected_at, len(body.getvalue())
+
+    def test_oversized_upload_is_dropped_before_it_is_read(self):
+        request, files, post, rejected_at, body_size = self.upload(image_bytes((900, 900), noise=True))
+        self.assertNotIn('image', files)
+        self.assertEqual(post['title'], 'Post')
+        self.assertEqual(request.rejected_uploads, {'image': 'Images may be at most 200.0\xa0KB.'})
+        # Rejected about a chunk past the limit, well before the end of the body
+        self.assertLess(rejected_at[0], 200 * 1024 + 2 * 64 * 1024)
+        self.assertLess(rejected_at[0], body_size / 2)
+        # Nothing past the limit was handed on to be buffered
+        self.assertLessEqual(request.buffered_bytes, 200 * 1024)
+
+    def test_announced_oversized_part_is_dropped_at_once(self):
+        handler = ImageUploadLimitHandler(RequestFactory().post('/'))
+        with self.assertRaises(SkipFile):
+            handler.new_file('image', 'image.png', 'image/png', 300 * 1024)
+
+    def test_image_header_is_checked_while_streaming(self):
+        for data, message in [
+            (image_bytes((2000, 10)), 'Images may be at most 1000 pixels wide and 1000 pixels tall.'),
+            (image_bytes((50, 50), 'BMP'), 'Upload a valid image (JPEG, PNG, GIF or WebP).'),
+        ]:
+            with self.subTest(message=message):
+                request, files, _, _, _ = self.upload(data)
+                self.assertNotIn('image', files)
+                self.assertEqual(request.rejected_uploads, {'image': message})
+
+    def test_valid_image_is_passed_on_whole(self):
+        data = image_bytes((800, 600))
+        request, files, _, rejected_at, _ = self.upload(data)
+        self.assertIn('image', files)
+        self.assertEqual(rejected_at, [])
+        self.assertEqual(request.buffered_bytes, len(data))
+
+
+class LimitImageUploadsViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('author', password='pw')
+        self.post = Post.objects.create(title='Post', author=self.user, content='<p>Body</p>', status='published')
+        self.client = self.client_class(enforce_csrf_checks=True)
+        self.client.force_login(self.user)
+        self.urls = [
+            reverse('blog:post_create'),
+            reverse('blog:post_edit', args=[self.post.slug]),
+            reverse('accounts:profile_edit'),
+        ]
+
+    def test_csrf_is_still_enforced(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.post(url, {'title': 'Forged'}).status_code, 403)
+                token = self.client.get(url).context['csrf_token']
+                self.assertNotEqual(self.client.post(url, {'csrfmiddlewaretoken': token}).status_code, 403)
+
+    @override_settings(MAX_IMAGE_UPLOAD_SIZE=200 * 1024)
+    def test_oversized_upload_is_reported_on_the_form(self):
+        token = self.client.get(self.urls[0]).context['csrf_token']
+        response = self.client.post(self.urls[0], {
+            'csrfmiddlewaretoken': token, 'title': 'New', 'content': '<p>Body</p>', 'status': 'published',
+            'image': SimpleUploadedFile('image.png', image_bytes((1200, 1200), noise=True)),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['form'].errors['image'], ['Images may be at most 200.0\xa0KB.'])
+        self.assertFalse(Post.objects.filter(title='New').exists())
+
+
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.storage = FileSystemStorage(location=directory.name)
+
+    def save_image(self, name, image, image_format='PNG', **options):
+        buffer = io.BytesIO()
+        image.save(buffer, image_format, **options)
+        return self.storage.save(name, ContentFile(buffer.getvalue()))
+
+    def open_variant(self, name):
+        with self.storage.open(name, 'rb') as file:
+            image = Image.open(file)
+            image.load()
+        return image
+
+    def test_widths_are_capped_at_the_original(self):
+        self.assertEqual(variant_widths(POST_IMAGE_WIDTHS, 5000), [320, 640, 960, 1440])
+        self.assertEqual(variant_widths(POST_IMAGE_WIDTHS, 1000), [320, 640, 960, 1000])
+        self.assertEqual(variant_widths(POST_IMAGE_WIDTHS, 640), [320, 640])
+        self.assertEqual(variant_widths(POST_IMAGE_WIDTHS, 100), [100])
+
+    def test_variants_are_resized_webp_and_jpeg_copies(self):
+        name = self.save_image('posts/cover.png', Image.new('RGB', (1000, 500), 'blue'))
+        record = build_variants(self.storage, name, POST_IMAGE_WIDTHS)
+
+        self.assertEqual((record['source'], record['width'], record['height']), (name, 1000, 500))
+        for key, extension, pillow_format in [('webp', 'webp', 'WEBP'), ('jpeg', 'jpg', 'JPEG')]:
+            with self.subTest(key=key):
+                self.assertEqual(
+                    record[key],
+                    [[width, f'posts/cover-{width}w.{extension}'] for width in (320, 640, 960, 1000)],
+                )
+                for width, variant in record[key]:
+                    image = self.open_variant(variant)
+                    self.assertEqual((image.format, image.size), (pillow_format, (width, width // 2)))
+
+    def test_transparency_is_kept_in_webp_and_flattened_onto_white_in_jpeg(self):
+        name = self.save_image('posts/logo.png', Image.new('RGBA', (400, 400), (255, 0, 0, 0)))
+        record = build_variants(self.storage, name, POST_IMAGE_WIDTHS)
+        webp = self.open_variant(record['webp'][0][1])
+        jpeg = self.open_variant(record['jpeg'][0][1])
+        self.assertEqual(webp.mode, 'RGBA')
+        self.assertEqual(webp.getpixel((10, 10))[3], 0)
+        self.assertEqual(jpeg.mode, 'RGB')
+        self.assertTrue(all(channel > 250 for channel in jpeg.getpixel((10, 10))))
+
+    def test_exif_rotation_is_applied_and_avatars_are_cropped_square(self):
+        exif = Image.Exif()
+        exif[ExifTags.Base.Orientation] = 6
+        name = self.save_image('avatars/me.jpg', Image.new('RGB', (400, 200), 'green'), 'JPEG', exif=exif)
+
+        record = build_variants(self.storage, name, POST_IMAGE_WIDTHS)
+        self.assertEqual((record['width'], record['height']), (200, 400))
+        self.assertEqual(self.open_variant(record['jpeg'][-1][1]).size, (200, 400))
+
+        record = build_variants(self.storage, name, AVATAR_WIDTHS, square=True)
+        self.assertEqual([width for width, _ in record['webp']], [64, 128, 200])
+        self.assertEqual(self.open_variant(record['webp'][-1][1]).size, (200, 200))
+
+    def test_post_variants_follow_the_uploaded_image(self):
+        author = User.objects.create_user('author', password='pw')
+        with mock.patch.object(Post._meta.get_field('image'), 'storage', self.storage):
+            post = Post.objects.create(
+                title='Post', author=author, content='<p>Body</p>', status='published',
+                image=SimpleUploadedFile('first.png', image_bytes((800, 400))),
+            )
+            first = post.image_variants
+            self.assertEqual(first['source'], post.image.name)
+            self.assertEqual(Post.objects.get(pk=post.pk).image_variants, first)
+
+            # Saves that keep the image keep its variants
+            post.title = 'Renamed'
+            post.save()
+            self.assertIs(post.image_variants, first)
+
+            post.image = SimpleUploadedFile('second.png', image_bytes((300, 300)))
+            post.save()
+            self.assertEqual(post.image_variants['webp'], [[300, 'posts/second-300w.webp']])
+            for _, name in first['webp'] + first['jpeg']:
+                self.assertFalse(self.storage.exists(name))
+
+            post.delete()
+            self.assertFalse(self.storage.exists('posts/second-300w.webp'))
+            self.assertTrue(self.storage.exists('posts/second.png'))
+
+    def test_unreadable_images_keep_the_original(self):
+        author = User.objects.create_user('author', password='pw')
+        with mock.patch.object(Post._meta.get_field('image'), 'storage', self.storage):
+            with self.assertLogs('core.images', 'ERROR'):
+                post = Post.objects.create(
+                    title='Post', author=author, content='<p>Body</p>', status='published',
+                    image=SimpleUploadedFile('broken.png', b'not an image'),
+                )
+        self.assertEqual(post.image_variants, {'source': 'posts/broken.png'})
+
+
+def flaky(fail):
+    if fail:
+        raise RuntimeError('try again')
+
+
+@mock.patch.dict(HANDLERS, {'test.flaky': flaky})
+class JobQueueTests(TestCase):
+    def test_jobs_are_claimed_oldest_first_and_deleted_when_done(self):
+        first, second = enqueue('test.flaky', fail=False), enqueue('test.flaky', fail=False)
+        claimed = claim_next()
+        self.assertEqual((claimed.pk, claimed.status, claimed.attempts), (first.pk, 'running', 1))
+        # A running job is not handed to another worker
+        self.assertEqual(claim_next().pk, second.pk)
+        self.assertIsNone(claim_next())
+
+        self.assertTrue(run(claimed))
+        self.assertFalse(Job.objects.filter(pk=first.pk).exists())
+
+    def test_unknown_kinds_are_refused(self):
+        with self.assertRaises(ValueError):
+            enqueue('test.missing')
+        self.assertFalse(Job.objects.exists())
+
+    @override_settings(JOB_MAX_ATTEMPTS=3)
+    def test_failures_are_retried_with_backoff_then_kept(self):
+        queued = enqueue('test.flaky', fail=True)
+        for attempt, delay in [(1, 10), (2, 20)]:
+            with self.subTest(attempt=attempt), self.assertLogs('core.jobs', 'ERROR'):
+                before = timezone.now()
+                self.assertFalse(run(claim_next()))
+                queued.refresh_from_db()
+                self.assertEqual((queued.status, queued.attempts), ('queued', attempt))
+                self.assertIn('RuntimeError: try again', queued.last_error)
+                self.assertGreaterEqual(queued.run_after, before + timedelta(seconds=delay))
+                self.assertLessEqual(queued.run_after, timezone.now() + timedelta(seconds=delay))
+                # Not runnable until its backoff has passed
+                self.assertIsNone(claim_next())
+                Job.objects.update(run_after=timezone.now())
+
+        with self.assertLogs('core.jobs', 'ERROR'):
+            self.assertFalse(run(claim_next()))
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('failed', 3))
+        self.assertIsNone(claim_next())
+
+    @override_settings(JOB_TIMEOUT_SECONDS=600)
+    def test_jobs_of_dead_workers_are_claimed_again(self):
+        queued = enqueue('test.flaky', fail=False)
+        claim_next()
+        Job.objects.update(updated_at=timezone.now() - timedelta(seconds=599))
+        self.assertIsNone(claim_next())
+        Job.objects.update(updated_at=timezone.now() - timedelta(seconds=601))
+        claimed = claim_next()
+        self.assertEqual((claimed.pk, claimed.attempts), (queued.pk, 2))
+
+    def test_enqueue_once_skips_identical_queued_jobs(self):
+        queued = enqueue_once('test.flaky', fail=False)
+        self.assertEqual(enqueue_once('test.flaky', fail=False), queued)
+        other = enqueue_once('test.flaky', fail=True)
+        self.assertNotEqual(other, queued)
+        self.assertEqual(Job.objects.count(), 2)
+
+        # Once it is running, a new request queues a new run
+        claim_next()
+        self.assertNotEqual(enqueue_once('test.flaky', fail=False), queued)
+        self.assertEqual(Job.objects.count(), 3)
+
+    def test_run_jobs_reports_failures(self):
+        enqueue('test.flaky', fail=False)
+        enqueue('test.flaky', fail=True)
+        stdout, stderr = io.StringIO(), io.StringIO()
+        # The test's transaction makes the connection look broken to the worker
+        with self.assertLogs('core.jobs', 'ERROR'), \
+                mock.patch('core.management.commands.run_jobs.close_old_connections'):
+            call_command('run_jobs', '--once', stdout=stdout, stderr=stderr)
+        self.assertIn('Ran 2 jobs (1 failed).', stdout.getvalue())
+        self.assertIn('failed; see its last_error', stderr.getvalue())
+        self.assertEqual(list(Job.objects.values_list('status', flat=True)), ['queued'])
+
+    def test_deferred_uploads_are_stored_by_the_job(self):
+        author = User.objects.create_user('author', password='pw')
+        staging, media = tempfile.TemporaryDirectory(), tempfile.TemporaryDirectory()
+        self.addCleanup(staging.cleanup)
+        self.addCleanup(media.cleanup)
+        storage = FileSystemStorage(location=media.name)
+        post = Post(title='Post', author=author, content='<p>Body</p>', status='published')
+        post.image = SimpleUploadedFile('cover.png', image_bytes((400, 200)))
+
+        with override_settings(ASYNC_UPLOADS=True, UPLOAD_STAGING_DIR=staging.name), \
+                mock.patch.object(Post._meta.get_field('image'), 'storage', storage):
+            upload = take_upload(post, 'image')
+            post.save()
+            queue_upload(post, 'image', upload)
+            self.assertFalse(Post.objects.get(pk=post.pk).image)
+            self.assertEqual(os.listdir(staging.name), [upload['staged']])
+
+            self.assertTrue(run(claim_next()))
+        post.refresh_from_db()
+        self.assertEqual(post.image.name, 'posts/cover.png')
+        self.assertEqual((post.image_width, post.image_height), (400, 200))
+        self.assertEqual(post.image_variants['source'], 'posts/cover.png')
+        self.assertTrue(storage.exists('posts/cover.png'))
+        self.assertEqual(os.listdir(staging.name), [])
+
+
+@skipIf(connection.vendor == 'sqlite', 'SQLite has no SELECT ... FOR UPDATE SKIP LOCKED')
+@mock.patch.dict(HANDLERS, {'test.flaky': flaky})
+class ConcurrentJobClaimTests(TransactionTestCase):
+    def test_each_job_is_claimed_by_one_worker(self):
+        for _ in range(40):
+            enqueue('test.flaky', fail=False)
+
+        def claim_all():
+            claimed = []
+            try:
+                # Bounded, so a job handed out twice fails the test instead of hanging it
+                for _ in range(40):
+                    job = claim_next()
+                    if job is None:
+                        break
+                    claimed.append(job.pk)
+            finally:
+                connection.close()
+            return claimed
+
+        claims = [pk for claimed in run_in_threads(claim_all, count=4) for pk in claimed]
+        self.assertEqual(sorted(claims), list(Job.objects.values_list('pk', flat=True)))
+
+
+class CriticalCssTests(SimpleTestCase):
+    def test_keeps_above_the_fold_rules_and_the_keyframes_they_use(self):
+        css = (
+            'body{margin:0}.post-card{color:red}'
+            '.navbar,.footer{display:flex}'
+            '@media (max-width:600px){.hero-title{font-size:2rem}.comments{display:none}}'
+            '@media print{.sidebar{display:none}}'
+            '@keyframes fadeIn{from{opacity:0}}@keyframes spin{to{transform:rotate(1turn)}}'
+            '.hero-section{animation:fadeIn 1s}.loader{animation:spin 1s}'
+            '@import url("x.css");'
+        )
+        self.assertEqual(
+            critical_css(css),
+            'body{margin:0}.navbar,.footer{display:flex}'
+            '@media (max-width:600px){.hero-title{font-size:2rem}}'
+            '.hero-section{animation:fadeIn 1s}'
+            '@keyframes fadeIn{from{opacity:0}}',
+        )
+
+    def test_braces_in_strings_do_not_split_rules(self):
+        css = 'a[title="}"]{color:red}.footer{content:"{"}h1{margin:0}'
+        self.assertEqual(critical_css(css), 'a[title="}"]{color:red}h1{margin:0}')
+
+
+class StaticPipelineTests(SimpleTestCase):
+    """collectstatic output with the bundling storage, on the repo's own assets"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        root, sources = tempfile.TemporaryDirectory(), tempfile.TemporaryDirectory()
+        cls.addClassCleanup(root.cleanup)
+        cls.addClassCleanup(sources.cleanup)
+        cls.root = root.name
+        Image.new('RGB', (600, 300), 'orange').save(os.path.join(sources.name, 'photo.png'))
+        with open(os.path.join(sources.name, 'broken.png'), 'wb') as file:
+            file.write(b'not an image')
+
+        cls.enterClassContext(override_settings(
+            STATIC_ROOT=cls.root,
+            STATICFILES_DIRS=[*settings.STATICFILES_DIRS, ('fixtures', sources.name)],
+            STORAGES={**settings.STORAGES, 'staticfiles': {'BACKEND': 'core.static_pipeline.BundlingStaticFilesStorage'}},
+            STATIC_RESPONSIVE_IMAGES={'fixtures/photo.png': (128, 256, 1024), 'fixtures/broken.png': (128,)},
+            STATIC_BUNDLES_ENABLED=True,
+        ))
+        with mock.patch('core.static_pipeline.logger') as logger:
+            call_command('collectstatic', '--noinput', verbosity=0, ignore_patterns=['admin'])
+        cls.warnings = [call.args[1] for call in logger.warning.call_args_list]
+        with open(os.path.join(cls.root, 'staticfiles.json')) as file:
+            cls.manifest = json.load(file)['paths']
+
+    def setUp(self):
+        bundles._critical.clear()
+        self.addCleanup(bundles._critical.clear)
+
+    def read(self, name):
+        with open(os.path.join(self.root, name), 'rb') as file:
+            return file.read()
+
+    def test_bundles_are_minified_sources_hashed_and_compressed(self):
+        for bundle, sources in settings.STATIC_BUNDLES.items():
+            with self.subTest(bundle=bundle):
+                parts = []
+                for source in sources:
+                    with open(finders.find(source), encoding='utf-8') as file:
+                        parts.append(minify(source, file.read()))
+                separator = '\n' if bundle.endswith('.css') else ';\n'
+
+                hashed = self.manifest[bundle]
+                self.assertRegex(hashed, r'\.[0-9a-f]{12}\.(css|js)$')
+                content = self.read(hashed)
+                self.assertEqual(content.decode('utf-8'), separator.join(parts))
+                self.assertLess(len(content), sum(os.path.getsize(finders.find(source)) for source in sources))
+                self.assertEqual(gzip.decompress(self.read(hashed + '.gz')), content)
+
+    def test_critical_css_is_saved_unhashed_and_inlined(self):
+        critical = self.read(critical_name('css/blog.bundle.css')).decode('utf-8')
+        self.assertIn(':root{', critical)
+        self.assertNotIn('.post-card{', critical)
+        self.assertNotIn(critical_name('css/blog.bundle.css'), self.manifest)
+
+        html = Template("{% load bundles %}{% bundle 'css/blog.bundle.css' %}").render(Context())
+        url = f'{settings.STATIC_URL}{self.manifest["css/blog.bundle.css"]}'
+        self.assertEqual(
+            html,
+            f'<style>{critical}</style>\n'
+            f'<link rel="stylesheet" href="{url}" media="print" onload="this.media=\'all\'">\n'
+            f'<noscript><link rel="stylesheet" href="{url}"></noscript>',
+        )
+        html = Template("{% load bundles %}{% bundle 'js/blog.bundle.js' %}").render(Context())
+        self.assertEqual(html, f'<script src="{settings.STATIC_URL}{self.manifest["js/blog.bundle.js"]}"></script>')
+
+    @override_settings(STATIC_BUNDLES_ENABLED=False)
+    def test_sources_are_linked_one_by_one_when_bundling_is_off(self):
+        html = Template("{% load bundles %}{% bundle 'css/blog.bundle.css' %}").render(Context())
+        self.assertEqual(html, ''.join(
+            f'<link rel="stylesheet" href="{settings.STATIC_URL}{self.manifest[source]}">\n'
+            for source in settings.STATIC_BUNDLES['css/blog.bundle.css']
+        ))
+
+    def test_static_images_get_webp_copies(self):
+        for width, height in [(128, 64), (256, 128), (600, 300)]:
+            with self.subTest(width=width):
+                with Image.open(io.BytesIO(self.read(self.manifest[f'fixtures/photo-{width}w.webp']))) as image:
+                    self.assertEqual((image.format, image.size), ('WEBP', (width, height)))
+        self.assertNotIn('fixtures/photo-1024w.webp', self.manifest)
+        self.assertFalse(any(name.startswith('fixtures/broken-') for name in self.manifest))
+        self.assertIn('fixtures/broken.png', self.warnings)
+
+    def test_static_report_compares_built_files_with_sources(self):
+        stdout = io.StringIO()
+        call_command('static_report', stdout=stdout)
+        report = stdout.getvalue()
+        for name in [*settings.STATIC_BUNDLES, 'fixtures/photo-128w.webp', 'fixtures/photo-600w.webp']:
+            self.assertIn(name, report)
+        self.assertIn('Critical CSS inlined for css/blog.bundle.css', report)
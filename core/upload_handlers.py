@@ -0,0 +1,112 @@
+"""
+Early checks on image uploads
+
+Views taking image uploads are wrapped in limit_image_uploads, which puts
+ImageUploadLimitHandler ahead of the request's default upload handlers; other
+uploads are untouched. It hands every chunk on unchanged to Django's memory
+and temporary-file handlers, which buffer an accepted upload exactly as
+before: in memory when small, in a temporary file otherwise, so memory use
+stays bounded by the chunk size. While a file streams in it:
+
+- counts its bytes and drops it as soon as it passes MAX_IMAGE_UPLOAD_SIZE
+  (or at once when the part announces a larger Content-Length);
+- parses the image header from the first chunks (Pillow reads only the
+  header, never the pixels) and drops the file if it is not a JPEG, PNG,
+  GIF or WebP, or is wider or taller than MAX_IMAGE_DIMENSION.
+
+The rest of a dropped file is read off the request and discarded without
+being written anywhere. Views call reject_skipped_uploads() to show the
+reason on the form. A small file whose header can't be read is left to the
+form's ImageField, which reports it as not an image.
+"""
+from functools import wraps
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from django.template.defaultfilters import filesizeformat
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from PIL import Image
+
+ALLOWED_FORMATS = {'JPEG', 'PNG', 'GIF', 'WEBP'}
+# How much of the start of a file may be buffered to find its header
+HEADER_BYTES = 256 * 1024
+
+
+class ImageUploadLimitHandler(FileUploadHandler):
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        self.received = 0
+        # Start of the file until its header has been checked, then None
+        self.header = bytearray()
+        if content_length is not None and content_length > settings.MAX_IMAGE_UPLOAD_SIZE:
+            self.reject_too_large()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.MAX_IMAGE_UPLOAD_SIZE:
+            self.reject_too_large()
+        if self.header is not None:
+            self.header += raw_data
+            self.check_header()
+        return raw_data
+
+    def file_complete(self, file_size):
+        # The next handler builds the uploaded file
+        return None
+
+    def check_header(self):
+        try:
+            image = Image.open(BytesIO(self.header))
+        except Image.DecompressionBombError:
+            self.reject_too_large_image()
+        except Exception:
+            # Header not complete yet, or not an image
+            if len(self.header) >= HEADER_BYTES:
+                self.reject('Upload a valid image (JPEG, PNG, GIF or WebP).')
+            return
+
+        self.header = None
+        if image.format not in ALLOWED_FORMATS:
+            self.reject('Upload a valid image (JPEG, PNG, GIF or WebP).')
+        if max(image.size) > settings.MAX_IMAGE_DIMENSION:
+            self.reject_too_large_image()
+
+    def reject_too_large(self):
+        self.reject(f'Images may be at most {filesizeformat(settings.MAX_IMAGE_UPLOAD_SIZE)}.')
+
+    def reject_too_large_image(self):
+        limit = settings.MAX_IMAGE_DIMENSION
+        self.reject(f'Images may be at most {limit} pixels wide and {limit} pixels tall.')
+
+    def reject(self, message):
+        """Drop the current file, remembering why for reject_skipped_uploads"""
+        if not hasattr(self.request, 'rejected_uploads'):
+            self.request.rejected_uploads = {}
+        self.request.rejected_uploads[self.field_name] = message
+        self.header = None
+        raise SkipFile(message)
+
+
+def reject_skipped_uploads(request, form):
+    """Add the reasons uploads for form's fields were dropped as field errors"""
+    rejected = getattr(request, 'rejected_uploads', {})
+    for name in form.fields:
+        if form.add_prefix(name) in rejected:
+            form.add_error(name, rejected[form.add_prefix(name)])
+
+
+def limit_image_uploads(view):
+    """
+    Check the view's uploads with ImageUploadLimitHandler. Handlers can only
+    be added before the body is read, which CsrfViewMiddleware does for POST
+    requests, so the CSRF check runs inside the wrapper instead.
+    """
+    protected = csrf_protect(view)
+
+    @csrf_exempt
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.upload_handlers.insert(0, ImageUploadLimitHandler(request))
+        return protected(request, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,74 @@
+"""
+Uploads stored in the background
+
+With ASYNC_UPLOADS on, a view saving a model with a new file calls
+take_upload() before saving it: the upload is copied to local disk
+(UPLOAD_STAGING_DIR) and the field keeps its stored value, so the save
+uploads nothing and the request returns at once, pages showing their usual
+no-image placeholder meanwhile. queue_upload() then enqueues a store_upload
+job, which a run_jobs worker picks up to save the file through the field's
+storage (S3 in production, the local filesystem in development) and save
+the field, firing the usual post_save processing such as image variants.
+
+The worker reads the staged copy from disk, so it must run where
+UPLOAD_STAGING_DIR is shared with the web processes; ASYNC_UPLOADS is off
+by default for that reason, and uploads are then stored by the request as
+before.
+"""
+import os
+import uuid
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+from . jobs import enqueue, job
+
+
+def staging_storage():
+    return FileSystemStorage(location=settings.UPLOAD_STAGING_DIR)
+
+
+def take_upload(instance, field_name):
+    """
+    Stage a new, not yet stored upload held by instance.field_name and put
+    the field back to its stored value. Returns what queue_upload needs, or
+    None when there is nothing to defer.
+    """
+    file = getattr(instance, field_name)
+    if not getattr(settings, 'ASYNC_UPLOADS', False) or not file or file._committed:
+        return None
+
+    name = os.path.basename(file.name)
+    staged = staging_storage().save(f'{uuid.uuid4().hex}{os.path.splitext(name)[1]}', file.file)
+
+    stored = None
+    if instance.pk is not None:
+        stored = type(instance)._default_manager.filter(pk=instance.pk).values_list(field_name, flat=True).first()
+    setattr(instance, field_name, stored or None)
+    return {'staged': staged, 'name': name}
+
+
+def queue_upload(instance, field_name, upload):
+    """Enqueue the store_upload job for an upload staged by take_upload"""
+    enqueue('store_upload', model=instance._meta.label, pk=instance.pk, field=field_name, **upload)
+
+
+@job('store_upload')
+def store_upload(model, pk, field, staged, name):
+    storage = staging_storage()
+    instance = apps.get_model(model)._default_manager.filter(pk=pk).first()
+    if instance is None:
+        # Deleted while queued
+        storage.delete(staged)
+        return
+
+    update_fields = [field]
+    if any(model_field.name == 'updated_at' for model_field in instance._meta.concrete_fields):
+        update_fields.append('updated_at')
+    with storage.open(staged, 'rb') as content:
+        # Stored by the save, which also reads its metadata from the local copy
+        setattr(instance, field, File(content, name=name))
+        instance.save(update_fields=update_fields)
+    storage.delete(staged)
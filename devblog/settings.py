@@ -5,6 +5,7 @@ Django settings for devblog project.
 from pathlib import Path
 from decouple import config
 import os
+import tempfile
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'. 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -38,6 +39,7 @@ INSTALLED_APPS = [
     "django.contrib.messages",
     "django.contrib.staticfiles",
     'django.contrib.sites',
+    'django.contrib.postgres',
 
     'storages',
     
@@ -89,6 +91,23 @@ DATABASES = {
     }
 }
 
+# Database connection reuse. By default each worker keeps its connection open for
+# DB_CONN_MAX_AGE seconds (0 closes it after every request) and checks it is still
+# alive before reusing it. DB_POOL=True switches to Django's native connection pool
+# instead (psycopg 3 with psycopg-pool, both in requirements.txt).
+DB_POOL = config('DB_POOL', default=False, cast=bool)
+if DB_POOL:
+    DATABASES["default"]["OPTIONS"] = {
+        "pool": {
+            "min_size": config('DB_POOL_MIN_SIZE', default=2, cast=int),
+            "max_size": config('DB_POOL_MAX_SIZE', default=10, cast=int),
+            "timeout": config('DB_POOL_TIMEOUT', default=10, cast=int),
+        },
+    }
+else:
+    DATABASES["default"]["CONN_MAX_AGE"] = config('DB_CONN_MAX_AGE', default=60, cast=int)
+    DATABASES["default"]["CONN_HEALTH_CHECKS"] = config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool)
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -139,6 +158,108 @@ EMAIL_USE_SSL = config('EMAIL_USE_SSL', default=False, cast=bool)
 EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
 
+# Like counter write-behind buffer (see blog/like_buffer.py)
+LIKE_BUFFER_ENABLED = config('LIKE_BUFFER_ENABLED', default=False, cast=bool)
+LIKE_BUFFER_FLUSH_MS = config('LIKE_BUFFER_FLUSH_MS', default=500, cast=int)
+LIKE_BUFFER_MAX_EVENTS = config('LIKE_BUFFER_MAX_EVENTS', default=100, cast=int)
+
+# Caches: a per-process LRU in front of a shared tier every worker sees (see core/cache.py).
+# CACHE_SHARED_BACKEND is "file", "redis" (needs the redis package) or "locmem", a
+# single-process stand-in for tests and local development. "file" is only shared by
+# processes on one machine; deployments running workers on several machines need "redis". Local copies live at most
+# CACHE_LOCAL_TIMEOUT seconds, bounding how stale one worker's copy of a shared value
+# can be; page cache purges bypass them (see blog.page_cache).
+CACHE_SHARED_BACKEND = config('CACHE_SHARED_BACKEND', default='file')
+CACHE_SHARED_TIMEOUT = config('CACHE_SHARED_TIMEOUT', default=300, cast=int)
+CACHE_SHARED_MAX_ENTRIES = config('CACHE_SHARED_MAX_ENTRIES', default=10000, cast=int)
+CACHE_LOCAL_TIMEOUT = config('CACHE_LOCAL_TIMEOUT', default=5, cast=int)
+CACHE_LOCAL_MAX_ENTRIES = config('CACHE_LOCAL_MAX_ENTRIES', default=1000, cast=int)
+
+if CACHE_SHARED_BACKEND == 'redis':
+    SHARED_CACHE = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': config('CACHE_REDIS_URL', default='redis://127.0.0.1:6379/0'),
+    }
+elif CACHE_SHARED_BACKEND == 'locmem':
+    SHARED_CACHE = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {'MAX_ENTRIES': CACHE_SHARED_MAX_ENTRIES},
+    }
+else:
+    SHARED_CACHE = {
+        'BACKEND': 'core.cache.LockingFileBasedCache',
+        'LOCATION': config('CACHE_FILE_DIR', default=os.path.join(tempfile.gettempdir(), 'devblog-cache')),
+        'OPTIONS': {'MAX_ENTRIES': CACHE_SHARED_MAX_ENTRIES},
+    }
+
+CACHES = {
+    'default': {
+        'BACKEND': 'core.cache.TieredCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {
+            'LOCAL_TIMEOUT': CACHE_LOCAL_TIMEOUT,
+            'LOCAL_MAX_ENTRIES': CACHE_LOCAL_MAX_ENTRIES,
+        },
+    },
+    'shared': {**SHARED_CACHE, 'TIMEOUT': CACHE_SHARED_TIMEOUT},
+}
+
+# Full-text search configuration used for post search vectors (PostgreSQL)
+SEARCH_CONFIG = config('SEARCH_CONFIG', default='english')
+# How long search-box suggestions are cached per normalized prefix
+SEARCH_SUGGEST_CACHE_SECONDS = config('SEARCH_SUGGEST_CACHE_SECONDS', default=300, cast=int)
+
+# Rendered post cards are cached per post version (see blog.fragment_cache)
+CARD_CACHE_SECONDS = config('CARD_CACHE_SECONDS', default=86400, cast=int)
+
+# Anonymous full-page cache lifetime; signals purge affected pages sooner (see blog.page_cache)
+PAGE_CACHE_SECONDS = config('PAGE_CACHE_SECONDS', default=300, cast=int)
+
+# Mixed into every page ETag with the static manifest, so a deploy never answers
+# 304 for HTML built by the previous release (see blog.conditional)
+RELEASE_VERSION = config('RELEASE_VERSION', default=config('RAILWAY_GIT_COMMIT_SHA', default=''))
+
+# Cached homepage/about counters are rebuilt at least this often (see blog.site_stats)
+SITE_STATS_SECONDS = config('SITE_STATS_SECONDS', default=300, cast=int)
+# ...and, after a change to what they count, at most this often
+SITE_STATS_REFRESH_SECONDS = config('SITE_STATS_REFRESH_SECONDS', default=10, cast=int)
+
+# Image uploads to views using core.upload_handlers.limit_image_uploads are
+# checked while they stream in and dropped as soon as they break a limit
+MAX_IMAGE_UPLOAD_SIZE = config('MAX_IMAGE_UPLOAD_SIZE', default=10 * 1024 * 1024, cast=int)
+MAX_IMAGE_DIMENSION = config('MAX_IMAGE_DIMENSION', default=8000, cast=int)
+
+# Uploads are staged here and stored by the run_jobs worker (see core.uploads).
+# Off by default: only turn it on where the web and worker processes share
+# UPLOAD_STAGING_DIR, which the default per-machine temp directory is not
+ASYNC_UPLOADS = config('ASYNC_UPLOADS', default=False, cast=bool)
+UPLOAD_STAGING_DIR = config('UPLOAD_STAGING_DIR', default=os.path.join(tempfile.gettempdir(), 'devblog-uploads'))
+# Whether a run_jobs worker (the Procfile's "worker" process) is deployed. Without
+# one, follow-up work such as updating other posts' related lists runs in the web
+# process after the request's transaction commits (see core.jobs.run_later)
+JOB_WORKER = config('JOB_WORKER', default=ASYNC_UPLOADS, cast=bool)
+# Background jobs: retries before a job is left failed, and how long a running
+# job may go without finishing before another worker claims it (see core.jobs)
+JOB_MAX_ATTEMPTS = config('JOB_MAX_ATTEMPTS', default=5, cast=int)
+JOB_TIMEOUT_SECONDS = config('JOB_TIMEOUT_SECONDS', default=600, cast=int)
+
+# Per-page CSS/JS bundles, minified and compressed by collectstatic in production
+# and linked with {% bundle %} (see core.static_pipeline)
+STATIC_BUNDLES = {
+    'css/base.bundle.css': ['css/main.css'],
+    'css/blog.bundle.css': ['css/main.css', 'css/blog.css'],
+    'css/home.bundle.css': ['css/main.css', 'css/home.css'],
+    'js/base.bundle.js': ['js/main.js'],
+    'js/blog.bundle.js': ['js/main.js', 'js/blog.js'],
+    'js/home.bundle.js': ['js/main.js', 'js/home.js'],
+}
+STATIC_BUNDLES_ENABLED = config('STATIC_BUNDLES_ENABLED', default=not DEBUG, cast=bool)
+# Static images given resized WebP copies by collectstatic, and their widths
+STATIC_RESPONSIVE_IMAGES = {
+    'images/logo.jpg': (128, 256, 512),
+}
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -196,7 +317,7 @@ if not DEBUG:
             "BACKEND": "devblog.storage_backends.MediaStorage",
         },
         "staticfiles": {  # This is for static files
-            "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
+            "BACKEND": "core.static_pipeline.BundlingStaticFilesStorage",
         },
     }
     MEDIA_URL = f'https://{AWS_S3_CUSTOM_DOMAIN}/media/'
@@ -1,12 +1,56 @@
 """
 Custom S3 storage backend for media files
 """
+import os
+import uuid
+from functools import lru_cache
+
+from django.core.exceptions import SuspiciousFileOperation
 from storages.backends.s3boto3 import S3Boto3Storage
 
 
 class MediaStorage(S3Boto3Storage):
-    """S3 storage backend for user-uploaded media files"""
+    """
+    S3 storage backend for user-uploaded media files
+
+    Pages render many image URLs, so url() is memoized: without querystring
+    auth a name always maps to the same URL. New files get a random suffix
+    instead of the default HEAD request per candidate name to find a free
+    one, so uploads never overwrite each other without asking S3.
+    """
     location = 'media'
     default_acl = None
     file_overwrite = False
-    querystring_auth = False
\ No newline at end of file
+    querystring_auth = False
+    url_cache_size = 4096
+    # Hex digits of random suffix; 64 bits makes a clash practically impossible
+    name_suffix_length = 16
+
+    def __init__(self, **settings):
+        super().__init__(**settings)
+        self._cached_url = lru_cache(maxsize=self.url_cache_size)(super().url)
+
+    def url(self, name, parameters=None, expire=None, http_method=None):
+        if self.querystring_auth or parameters or expire or http_method:
+            return super().url(name, parameters, expire, http_method)
+        return self._cached_url(name)
+
+    def get_available_name(self, name, max_length=None):
+        if self.file_overwrite:
+            return super().get_available_name(name, max_length)
+
+        dir_name, file_name = os.path.split(str(name).replace('\\', '/'))
+        file_root, file_ext = os.path.splitext(file_name)
+        suffix = f'-{uuid.uuid4().hex[:self.name_suffix_length]}{file_ext}'
+        if max_length is not None:
+            # Shorten the original name rather than the suffix
+            overflow = len(os.path.join(dir_name, file_root + suffix)) - max_length
+            if overflow > 0:
+                file_root = file_root[:-overflow]
+                if not file_root:
+                    raise SuspiciousFileOperation(
+                        f'Storage can not find an available filename for "{name}". '
+                        'Please make sure that the corresponding file field '
+                        'allows sufficient "max_length".'
+                    )
+        return os.path.join(dir_name, file_root + suffix)
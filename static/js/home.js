@@ -57,6 +57,35 @@
             }
         });
 
+        // Autocomplete suggestions (titles, tags, categories)
+        const suggestUrl = searchForm && searchForm.dataset.suggestUrl;
+        const suggestionList = document.getElementById('searchSuggestions');
+        if (suggestUrl && suggestionList) {
+            let debounceTimer;
+            let lastQuery = '';
+            searchInput.addEventListener('input', function() {
+                clearTimeout(debounceTimer);
+                const query = searchInput.value.trim();
+                if (query.length < 2 || query === lastQuery) return;
+                debounceTimer = setTimeout(function() {
+                    lastQuery = query;
+                    fetch(suggestUrl + '?q=' + encodeURIComponent(query), {
+                        headers: { 'X-Requested-With': 'XMLHttpRequest' }
+                    })
+                        .then(response => response.ok ? response.json() : { suggestions: [] })
+                        .then(data => {
+                            suggestionList.innerHTML = '';
+                            data.suggestions.forEach(item => {
+                                const option = document.createElement('option');
+                                option.value = item.label;
+                                suggestionList.appendChild(option);
+                            });
+                        })
+                        .catch(() => {});
+                }, 150);
+            });
+        }
+
         // Handle form submission (can be extended for actual search)
         if (searchForm) {
             searchForm.addEventListener('submit', function(e) {